@@ -14,8 +14,103 @@ EMBED_MODEL = "nomic-embed-text"   # Embedding model via Ollama
 
 
 
-# Local FAISS index directory
+# Local FAISS index directory (versioned snapshots + CURRENT pointer, see service/index_registry.py)
 INDEX_DIR = Path("./edmonton_backyard_faiss")
+INDEX_KEEP_VERSIONS = 3       # published snapshots kept on disk; older ones are garbage-collected
+INDEX_POLL_INTERVAL_S = 5.0   # how often long-running processes check for a newly published snapshot
+
+# Compressed index storage (service/quantization.py): None (float32 flat), "fp16", "int8" or "pq".
+# Switching an already-compressed index to another mode needs `jobs/refresh.py --rebuild`.
+INDEX_QUANTIZATION = None
+INDEX_PQ_M = 96               # PQ sub-quantizers (bytes/vector); must divide the dimension (768, 1536)
+INDEX_RERANK_K_FACTOR = 0     # >0: re-score k*factor compressed candidates exactly (keeps float32 copy)
+
+# Matryoshka truncation (service/matryoshka.py): index only the first INDEX_OUTPUT_DIM components
+# of each embedding (re-normalized); full vectors are kept in the snapshot for re-scoring.
+# None keeps full width. Changing it needs `jobs/refresh.py --rebuild`.
+INDEX_OUTPUT_DIM = None
+INDEX_TWO_STAGE_FACTOR = 4    # >0 with INDEX_OUTPUT_DIM: coarse top k*factor, exact re-score with full vectors
+
+# Local embedding service (service/embedding_gen_service.py, QwenInstruct over HTTP)
+EMBED_SERVICE_URL = "http://localhost:4098"
+
+# Embeddings used for the index and retrievers (service/rag_store.make_embeddings):
+# "ollama" (EMBED_MODEL via Ollama) or "service" (the embedding service above).
+# The two produce different vectors, so switching needs `jobs/refresh.py --rebuild`.
+EMBED_PROVIDER = "ollama"
+EMBED_SERVICE_BATCH_SIZE = 64   # texts per HTTP request
+EMBED_SERVICE_WORKERS = 4       # concurrent requests (and pooled keep-alive connections)
+
+# ---------- Chunking (service/chunker.py) ----------
+CHUNK_MAX_TOKENS = 300       # tokens per chunk (cl100k_base)
+CHUNK_OVERLAP_TOKENS = 40    # overlap when a long paragraph must be split
+CHUNK_CACHE_PATH = PROJECT_ROOT / "data" / "chunk_cache.json"  # splits keyed by source content hash
+CHUNK_CACHE_MAX_AGE_S = 30 * 24 * 3600  # splits no refresh / crawl run has used for this long are evicted
+
+# ---------- Embedding / checkpointed refresh (service/checkpoint.py) ----------
+EMBED_BATCH_SIZE = 32                 # chunks per embed_documents call
+CHECKPOINT_DIR = PROJECT_ROOT / "data" / "refresh_checkpoint"
+CHECKPOINT_EVERY_BATCHES = 10         # persist embedded vectors every N batches
+
+# ---------- Streaming ingestion (rag_store.ingest, service/pipeline.py) ----------
+PIPELINE_DOC_BUFFER = 32      # loaded documents waiting to be split
+PIPELINE_BATCH_BUFFER = 4     # chunk batches waiting for the embedder
+PIPELINE_HTML_GROUP = 8       # web pages loaded per WebBaseLoader call
+
+# ---------- Re-embedding migration (jobs/migrate_embeddings.py) ----------
+MIGRATE_CHECKPOINT_DIR = PROJECT_ROOT / "data" / "migrate_checkpoint"
+MIGRATE_RATE = 20.0                   # chunks/s sent to the new embedding model (0 = unlimited)
+
+# ---------- Near-duplicate chunk elimination (service/dedup.py) ----------
+DEDUP_ENABLED = True
+DEDUP_THRESHOLD = 0.85     # estimated Jaccard similarity at which a chunk counts as a duplicate
+DEDUP_NUM_PERM = 128       # MinHash permutations
+DEDUP_BANDS = 16           # LSH bands (rows per band = NUM_PERM / BANDS)
+DEDUP_SHINGLE_SIZE = 5     # words per shingle
+
+# ---------- Discovery (jobs/search_first.py) ----------
+SEARCH_RATE = 1.0            # web search queries per second
+FETCH_RATE_PER_HOST = 2.0    # page scrapes / PDF downloads per second, per host
+SEARCH_WORKERS = 4
+SCRAPE_WORKERS = 8
+DOWNLOAD_WORKERS = 4
+SEARCH_CACHE_PATH = LOGS_DIR / "search_cache.json"   # (query, k) -> result URLs (service/search_cache.py)
+SEARCH_CACHE_TTL_S = 7 * 24 * 3600
+INDEX_DOWNLOADED_PDFS = True # refresh also indexes the PDFs search_first stored in data/raw/objects/ (PdfStore.downloaded_paths)
+
+# ---------- Site crawler (service/crawler.py, jobs/crawl.py) ----------
+# Hosts -> path prefixes the crawler may follow. ALLOWED (below) is checked too when it is non-empty.
+CRAWL_SCOPE = {
+    "zoningbylaw.edmonton.ca": ("/",),
+    "www.edmonton.ca": ("/residential_neighbourhoods", "/residential-neighbourhoods"),
+}
+CRAWL_STATE_PATH = PROJECT_ROOT / "data" / "crawl_state.json"   # validators + frontier, for resume
+CRAWL_CHECKPOINT_DIR = PROJECT_ROOT / "data" / "crawl_checkpoint"  # vectors embedded by an unpublished crawl
+CRAWL_CONCURRENCY = 16          # requests in flight overall
+CRAWL_HOST_CONCURRENCY = 2      # requests in flight per host
+CRAWL_RATE_PER_HOST = FETCH_RATE_PER_HOST   # requests/s per host (robots.txt Crawl-delay can lower it)
+CRAWL_MAX_PAGES = 5000
+CRAWL_USER_AGENT = "YEGGardenSuite-RAG/1.0"
+
+# ---------- Logging (service/logging_helper.py) ----------
+LOG_QUEUE = True                      # handlers run on a QueueListener thread; callers only enqueue
+LOG_JSON = False                      # logs/<script>.jsonl (one JSON object per line) instead of text
+LOG_LEVELS = {                        # per-logger level overrides
+    "httpx": "WARNING",               # one INFO line per Ollama request otherwise
+    "urllib3": "WARNING",
+}
+LOG_SAMPLING = {}                     # e.g. {"service.rag_store": 0.1}: keep 10% of its DEBUG/INFO records
+
+# ---------- CLI startup (jobs/check_import_time.py) ----------
+IMPORT_TIME_BUDGET_MS = 1800          # `python -X importtime -c "import main"`, cumulative, best of N runs
+                                      # measured 0.98-1.17 s (1.66 s cold cache), langchain 0.3 / 1 vCPU
+IMPORT_TIME_FORBIDDEN = (             # must stay lazy: only imported once a crawl / render / local model needs them
+    "playwright", "sentence_transformers", "torch", "langchain_community.document_loaders", "tqdm", "loguru",
+)
+
+# ---------- QA latency tracing (service/tracing.py) ----------
+TRACE_ENABLED = True                  # per-question spans -> logs/traces.jsonl + p50/p95/p99 reports
+TRACE_EXPORT_PATH = None              # e.g. LOGS_DIR / "traces.otlp.jsonl" for OTLP/JSON span export
 
 # Allowed hostnames for scraping / loading (set to empty {} to allow all)
 # ALLOWED = {"zoningbylaw.edmonton.ca", "www.edmonton.ca"}
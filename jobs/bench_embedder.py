@@ -0,0 +1,116 @@
+"""Parity and throughput check for QwenInstruct inference backends.
+
+Embeds the same texts with a reference configuration (torch, full precision)
+and with a candidate configuration (e.g. CPU + ONNX Runtime + int8), then
+reports cosine similarity between the two sets of vectors and texts/second
+for each. Exits non-zero if the minimum cosine is below --min-cosine.
+
+Texts come from the chunk cache written by the refresh (data/chunk_cache.json)
+when it exists, otherwise from a few built-in bylaw-style sentences.
+
+Usage:
+    python jobs/bench_embedder.py --model ./local_models/gte-Qwen2-1.5B-instruct --backend onnx --quantize int8 --threads 8
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from config import CHUNK_CACHE_PATH, LOGS_DIR
+from service.logging_helper import configure_logging
+from service.embeder import BACKENDS, QwenInstruct
+
+FALLBACK_TEXTS = [
+    "Backyard Housing must be located in the rear yard of a site with a Single Detached House.",
+    "The maximum height of a Backyard House is 6.5 m.",
+    "A hard-surfaced pathway of at least 0.9 m must connect the Backyard House to the street.",
+    "Vehicle access to a garage may be from an abutting lane.",
+    "Secondary Suites require a development permit and a building permit.",
+]
+
+
+def _sample_texts(n: int):
+    try:
+        with open(CHUNK_CACHE_PATH, "r", encoding="utf-8") as f:
+            docs = json.load(f).get("docs", {})
+        texts = [c["text"] for chunks in docs.values() for c in chunks]
+        if texts:
+            return texts[:n]
+    except Exception:
+        pass
+    return (FALLBACK_TEXTS * (n // len(FALLBACK_TEXTS) + 1))[:n]
+
+
+def _run(embedder, texts, repeats):
+    embedder.embed_documents(texts[:2])  # warm-up
+    best = None
+    vecs = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        vecs = np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return vecs, len(texts) / best
+
+
+def _normalize(x):
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare a QwenInstruct backend against the torch reference")
+    ap.add_argument("--model", required=True, help="path to the SentenceTransformer model directory")
+    ap.add_argument("--n", type=int, default=64, help="number of texts")
+    ap.add_argument("--repeats", type=int, default=3, help="timed runs per configuration (best is kept)")
+    ap.add_argument("--device", default=None, help="candidate device (default: auto-detect)")
+    ap.add_argument("--backend", default="onnx", choices=BACKENDS)
+    ap.add_argument("--quantize", default=None, choices=["int8"])
+    ap.add_argument("--threads", type=int, default=None)
+    ap.add_argument("--reference-device", default="cpu")
+    ap.add_argument("--min-cosine", type=float, default=0.99)
+    args = ap.parse_args()
+
+    logger = configure_logging(level=logging.INFO)
+    texts = _sample_texts(args.n)
+
+    ref = QwenInstruct(args.model, device=args.reference_device, backend="torch", num_threads=args.threads)
+    ref_vecs, ref_tps = _run(ref, texts, args.repeats)
+    del ref
+
+    cand = QwenInstruct(args.model, device=args.device, backend=args.backend, quantize=args.quantize, num_threads=args.threads)
+    cand_vecs, cand_tps = _run(cand, texts, args.repeats)
+
+    cos = np.sum(_normalize(ref_vecs) * _normalize(cand_vecs), axis=1)
+    report = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "texts": len(texts),
+        "reference": {"device": args.reference_device, "backend": "torch", "texts_per_s": round(ref_tps, 2)},
+        "candidate": {
+            "device": cand.device,
+            "backend": cand.backend,
+            "quantize": cand.quantize,
+            "threads": args.threads,
+            "texts_per_s": round(cand_tps, 2),
+        },
+        "speedup": round(cand_tps / ref_tps, 3),
+        "cosine_min": round(float(cos.min()), 5),
+        "cosine_mean": round(float(cos.mean()), 5),
+        "parity_ok": bool(cos.min() >= args.min_cosine),
+    }
+    out_path = LOGS_DIR / "bench_embedder.json"
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Saved report to {out_path}")
+    print(json.dumps(report))
+    if not report["parity_ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Compare compressed index modes against the current flat FAISS index.
+
+For each mode (flat, fp16, int8, pq, and the same with exact re-scoring) it
+reports serialized size, build time, per-query search latency (p50/p95) and
+recall@k against exact flat search. Queries are stored vectors perturbed with
+a little Gaussian noise, so no embedding model needs to run.
+
+--output-dims adds Matryoshka variants (INDEX_OUTPUT_DIM): a flat index over the
+first N components (re-normalized), alone and with two-stage re-scoring of
+k * --two-stage candidates against the full vectors.
+
+Usage:
+    python jobs/bench_index.py                 # current published snapshot
+    python jobs/bench_index.py -k 4 --queries 200 --rerank 4
+    python jobs/bench_index.py --output-dims 128,256,512 --two-stage 4
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from config import LOGS_DIR, INDEX_PQ_M
+from service.logging_helper import configure_logging
+from service.rag_store import load_store
+from service.quantization import compress_index, index_nbytes, is_flat
+from service.matryoshka import truncate
+
+
+def _percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3) if samples else None
+
+
+def _bench(index, queries, k, truth=None):
+    lat = []
+    found = []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        lat.append(time.perf_counter() - t0)
+        found.append(ids[0])
+    found = np.vstack(found)
+    out = {
+        "bytes": index_nbytes(index),
+        "latency_ms_p50": _percentile_ms(lat, 50),
+        "latency_ms_p95": _percentile_ms(lat, 95),
+    }
+    if truth is not None:
+        hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+        out["recall_at_k"] = round(hits / float(truth.size), 4)
+    return out, found
+
+
+def _bench_truncated(xb, queries, k, dim, factor, truth, metric):
+    """Matryoshka variants: short-vector search alone, and + exact re-scoring with full vectors."""
+    import faiss
+
+    short = faiss.IndexFlat(dim, metric)
+    t0 = time.perf_counter()
+    short.add(truncate(xb, dim))
+    build_s = time.perf_counter() - t0
+    q_short = truncate(queries, dim)
+    coarse, _ = _bench(short, q_short, k, truth)
+    coarse["build_s"] = round(build_s, 3)
+    out = {f"dim{dim}": coarse}
+    if factor > 0:
+        lat, hits = [], 0
+        for q_full, q in zip(queries, q_short):
+            t0 = time.perf_counter()
+            _, cand = short.search(q[None, :], k * factor)
+            cand = cand[0][cand[0] >= 0]
+            full = xb[cand]
+            if metric == faiss.METRIC_INNER_PRODUCT:
+                scores = -(full @ q_full)
+            else:
+                scores = ((full - q_full) ** 2).sum(axis=1)
+            top = cand[np.argsort(scores)[:k]]
+            lat.append(time.perf_counter() - t0)
+            hits += len(set(top) & set(truth[len(lat) - 1]))
+        # the full vectors kept for re-scoring add xb.nbytes on top of the short index
+        out[f"dim{dim}+two_stage{factor}"] = {
+            "bytes": index_nbytes(short) + int(xb.nbytes),
+            "latency_ms_p50": _percentile_ms(lat, 50),
+            "latency_ms_p95": _percentile_ms(lat, 95),
+            "recall_at_k": round(hits / float(truth.size), 4),
+        }
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Memory / latency / recall@k report for compressed index modes")
+    ap.add_argument("-k", type=int, default=4, help="neighbours per query (default: 4, same as make_qa)")
+    ap.add_argument("--queries", type=int, default=200, help="number of sampled queries")
+    ap.add_argument("--noise", type=float, default=0.01, help="std of Gaussian noise added to sampled vectors")
+    ap.add_argument("--pq-m", type=int, default=INDEX_PQ_M, help="PQ sub-quantizers")
+    ap.add_argument("--rerank", type=int, default=4, help="k_factor for the exact re-scoring variants (0 to skip)")
+    ap.add_argument("--output-dims", default="", help="comma-separated Matryoshka dims to compare, e.g. 128,256,512")
+    ap.add_argument("--two-stage", type=int, default=4, help="candidate factor for two-stage re-scoring with full vectors (0 to skip)")
+    args = ap.parse_args()
+
+    logger = configure_logging(level=logging.INFO)
+    vs = load_store()
+    if vs is None:
+        raise SystemExit("No published index; run jobs/refresh.py first")
+    if not is_flat(vs.index):
+        raise SystemExit("Current index is already compressed; benchmark against a flat snapshot (INDEX_QUANTIZATION=None)")
+    if getattr(vs, "full_vectors", None) is not None:
+        raise SystemExit("Current index is truncated; benchmark against a full-width snapshot (INDEX_OUTPUT_DIM=None)")
+
+    flat = vs.index
+    xb = flat.reconstruct_n(0, flat.ntotal)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(flat.ntotal, size=min(args.queries, flat.ntotal), replace=False)
+    queries = (xb[sample] + rng.normal(0, args.noise, size=(len(sample), flat.d))).astype(np.float32)
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "ntotal": int(flat.ntotal),
+        "dim": int(flat.d),
+        "k": args.k,
+        "queries": len(queries),
+        "modes": {},
+    }
+    flat_stats, truth = _bench(flat, queries, args.k)
+    flat_stats["recall_at_k"] = 1.0
+    flat_stats["build_s"] = 0.0
+    report["modes"]["flat"] = flat_stats
+
+    variants = [(m, 0) for m in ("fp16", "int8", "pq")]
+    if args.rerank > 0:
+        variants += [("int8", args.rerank), ("pq", args.rerank)]
+    for mode, k_factor in variants:
+        name = mode if not k_factor else f"{mode}+rerank{k_factor}"
+        try:
+            t0 = time.perf_counter()
+            idx = compress_index(flat, mode, pq_m=args.pq_m, rerank_k_factor=k_factor)
+            build_s = time.perf_counter() - t0
+            stats, _ = _bench(idx, queries, args.k, truth)
+            stats["build_s"] = round(build_s, 3)
+            stats["bytes_vs_flat"] = round(stats["bytes"] / float(flat_stats["bytes"]), 4)
+            report["modes"][name] = stats
+        except Exception as e:
+            logger.exception(f"mode {name} failed: {e}")
+            report["modes"][name] = {"error": str(e)}
+        logger.info(f"{name}: {report['modes'][name]}")
+
+    for dim in [int(d) for d in args.output_dims.split(",") if d.strip()]:
+        try:
+            variants = _bench_truncated(xb, queries, args.k, dim, args.two_stage, truth, flat.metric_type)
+        except Exception as e:
+            logger.exception(f"dim {dim} failed: {e}")
+            variants = {f"dim{dim}": {"error": str(e)}}
+        for name, stats in variants.items():
+            if "bytes" in stats:
+                stats["bytes_vs_flat"] = round(stats["bytes"] / float(flat_stats["bytes"]), 4)
+            report["modes"][name] = stats
+            logger.info(f"{name}: {stats}")
+
+    out_path = LOGS_DIR / "bench_index.json"
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Saved report to {out_path}")
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
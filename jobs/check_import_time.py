@@ -0,0 +1,103 @@
+"""Check that importing the CLI stays fast and does not pull in heavy dependencies.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters, takes the
+best cumulative import time of main over --runs and fails (exit 1) when it
+exceeds IMPORT_TIME_BUDGET_MS or when any module in IMPORT_TIME_FORBIDDEN
+(Playwright, sentence_transformers/torch, langchain_community loaders, ...)
+was imported. Prints the slowest top-level packages to show where the time went.
+
+Usage:
+    python jobs/check_import_time.py
+    python jobs/check_import_time.py --runs 5 --budget-ms 1200
+    python jobs/check_import_time.py --module service.answer_modes
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+from config import IMPORT_TIME_BUDGET_MS, IMPORT_TIME_FORBIDDEN
+
+
+def parse_importtime(stderr: str):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((name.strip(), int(self_us), int(cum_us), (len(name) - len(name.lstrip()) - 1) // 2))
+        except ValueError:
+            continue
+    return rows
+
+
+def measure(module: str):
+    """One fresh-interpreter import of module: (cumulative ms, importtime rows, modules loaded)."""
+    code = f"import json, sys; import {module}; print(json.dumps(sorted(sys.modules)))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = parse_importtime(proc.stderr)
+    total_us = next((cum for name, _, cum, _ in reversed(rows) if name == module), 0)
+    return total_us / 1000, rows, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def by_package(rows, top: int):
+    """Self time summed per top-level package, slowest first."""
+    totals = {}
+    for name, self_us, _, _ in rows:
+        pkg = name.split(".")[0]
+        totals[pkg] = totals.get(pkg, 0) + self_us
+    return [{"package": k, "self_ms": round(v / 1000, 1)} for k, v in sorted(totals.items(), key=lambda kv: -kv[1])[:top]]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Import-time budget for the CLI")
+    ap.add_argument("--module", default="main", help="module to import (default: main)")
+    ap.add_argument("--runs", type=int, default=3, help="fresh interpreters; the fastest counts (default: 3)")
+    ap.add_argument("--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS)
+    ap.add_argument("--top", type=int, default=15, help="slowest packages to list")
+    args = ap.parse_args()
+
+    best = None
+    for _ in range(max(1, args.runs)):
+        ms, rows, modules = measure(args.module)
+        if best is None or ms < best[0]:
+            best = (ms, rows, modules)
+    ms, rows, modules = best
+
+    forbidden = sorted(f for f in IMPORT_TIME_FORBIDDEN if any(m == f or m.startswith(f + ".") for m in modules))
+    ok = ms <= args.budget_ms and not forbidden
+    summary = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "module": args.module,
+        "runs": args.runs,
+        "import_ms": round(ms, 1),
+        "budget_ms": args.budget_ms,
+        "forbidden_imported": forbidden,
+        "slowest_packages": by_package(rows, args.top),
+        "ok": ok,
+    }
+    print(json.dumps(summary, indent=2))
+    if not ok:
+        reasons = []
+        if ms > args.budget_ms:
+            reasons.append(f"import {args.module} took {ms:.0f}ms > budget {args.budget_ms:.0f}ms")
+        if forbidden:
+            reasons.append(f"heavy modules imported eagerly: {', '.join(forbidden)}")
+        print("[fail] " + "; ".join(reasons), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
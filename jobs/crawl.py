@@ -0,0 +1,135 @@
+"""Crawl the sites in CRAWL_SCOPE and index new or changed pages as they arrive.
+
+Seeds are config.URLS (those in scope) plus each host's sitemaps. Pages are
+streamed from the crawler (service/crawler.py) through rag_store.ingest
+(load -> split -> dedup -> embed), so embedding starts long before the crawl
+ends. The snapshot is published once at the end and only then are
+the crawled pages committed to the crawl state; the next crawl re-checks them
+with conditional requests and skips everything unchanged.
+
+Usage:
+    python jobs/crawl.py
+    python jobs/crawl.py --max-pages 200 --dry-run
+    python jobs/crawl.py --resume          # continue an interrupted crawl
+    python jobs/crawl.py --rebuild         # re-crawl every page, replacing all crawl-sourced chunks
+
+A changed page's old chunks are removed from the index, and every page's
+chunk ids are kept in the crawl state. A page whose chunks have gone missing
+from the index (e.g. after `jobs/refresh.py --rebuild`) is fetched and
+indexed again. Pages that refresh.py loads (URLS / PDF_URLS) are only
+followed for links; their chunks stay owned by refresh.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import (
+    CRAWL_CHECKPOINT_DIR, CRAWL_CONCURRENCY, CRAWL_HOST_CONCURRENCY, CRAWL_MAX_PAGES, CRAWL_RATE_PER_HOST, CRAWL_SCOPE, INDEX_DIR,
+)
+from service.checkpoint import EmbeddingCheckpoint
+from service.crawler import Crawler
+from service.index_registry import current_version
+from service.instrumentation import StageTimer
+from service.logging_helper import configure_logging
+from service.rag_store import embed_model_id, ingest, iter_sources, load_store, make_embeddings, remove_chunks, save_store
+
+
+def crawl_sourced(vs, crawler):
+    """Chunk ids in vs that came from crawled pages (recorded in the crawl state, or cited by a crawled URL
+    that refresh.py does not load itself)."""
+    ids = crawler.state.chunk_ids()
+    ids.update(cid for cid, doc in vs.docstore._dict.items() if crawler.owns(doc.metadata.get("source")))
+    return [cid for cid in ids if cid in vs.docstore._dict]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Crawl CRAWL_SCOPE and add new or changed pages to the FAISS index.")
+    ap.add_argument("--max-pages", type=int, default=CRAWL_MAX_PAGES)
+    ap.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY, help="requests in flight overall")
+    ap.add_argument("--host-concurrency", type=int, default=CRAWL_HOST_CONCURRENCY, help="requests in flight per host")
+    ap.add_argument("--rate", type=float, default=CRAWL_RATE_PER_HOST, help="requests per second per host")
+    ap.add_argument("--batch-size", type=int, default=None, help="chunks per embed call (default: rag_store.embed_batch_size)")
+    ap.add_argument("--no-sitemaps", action="store_true", help="seed from config.URLS only")
+    ap.add_argument("--resume", action="store_true", help="continue the last interrupted crawl")
+    ap.add_argument("--rebuild", action="store_true", help="drop the crawl-sourced chunks of the current snapshot and re-index every page")
+    ap.add_argument("--dry-run", action="store_true", help="crawl, load and split, but do not embed, publish or commit")
+    args = ap.parse_args()
+
+    logger = configure_logging(level=logging.INFO)
+    start_ts = time.time()
+    logger.info(f"=== crawl start === scope={CRAWL_SCOPE} rebuild={args.rebuild} resume={args.resume} dry_run={args.dry_run}")
+
+    embeddings = None if args.dry_run else make_embeddings()
+    vs = None if args.dry_run else load_store(embeddings)
+    before = int(vs.index.ntotal) if vs is not None else 0
+    checkpoint = None
+    if not args.dry_run:
+        checkpoint = EmbeddingCheckpoint(CRAWL_CHECKPOINT_DIR, embed_model=embed_model_id(embeddings))
+        if args.resume:
+            logger.info(f"resuming: {checkpoint.load()} chunks already embedded")
+        else:
+            checkpoint.clear()
+
+    crawler = Crawler(
+        concurrency=args.concurrency,
+        host_concurrency=args.host_concurrency,
+        rate_per_host=args.rate,
+        max_pages=args.max_pages,
+        changed_only=not args.rebuild,
+        resume=args.resume,
+        sitemaps=not args.no_sitemaps,
+    )
+    stats = {}
+    removed = 0
+    if args.rebuild and vs is not None:
+        # keep what refresh.py indexed from URLS / PDF_URLS / LOCAL_PDF_PATHS; only crawled chunks are redone
+        removed = remove_chunks(vs, crawl_sourced(vs, crawler))
+        logger.info(f"rebuild: removed {removed} crawl-sourced chunks")
+    if not args.dry_run:
+        crawler.indexed = set(vs.docstore._dict) if vs is not None else set()
+    timer = StageTimer()
+    sources = {}
+    docs = iter_sources(pages=crawler.iter_pages(), stats=stats, timer=timer)
+    vs = ingest(vs, docs, embeddings, batch_size=args.batch_size, checkpoint=checkpoint, stats=stats, timer=timer, sources=sources)
+
+    version = None
+    if not args.dry_run:
+        # chunks of changed pages that ingest() could not match by source (e.g. pages that are now noindex)
+        removed += remove_chunks(vs, crawler.superseded(sources))
+        stats["chunks_removed_crawl"] = removed
+        if (stats.get("chunks_new") or stats.get("chunks_removed") or removed) and vs is not None:
+            version = save_store(vs)
+            logger.info(f"published version={version}")
+        indexed = vs.docstore._dict if vs is not None else {}
+        crawler.commit(
+            {url: [cid for cid in ids if cid in indexed] for url, ids in sources.items()},
+            index_version=version or current_version(INDEX_DIR),
+        )
+        checkpoint.clear()
+
+    elapsed = round(time.time() - start_ts, 3)
+    timer.log(logger)
+    logger.info(f"=== crawl end === elapsed_s={elapsed}")
+    summary = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "rebuild": args.rebuild,
+        "dry_run": args.dry_run,
+        "resume": args.resume,
+        "crawl": crawler.stats,
+        **stats,
+        "index_size_before": before,
+        "index_size_after": int(vs.index.ntotal) if vs is not None else before,
+        "published_version": version,
+        "elapsed_s": elapsed,
+        **timer.summary(top=10),
+    }
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
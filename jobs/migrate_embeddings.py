@@ -0,0 +1,118 @@
+"""Re-embed the published index with the configured embeddings, without downtime.
+
+Run after changing EMBED_PROVIDER / EMBED_MODEL / INDEX_OUTPUT_DIM in config.py.
+The chunks stored in the current snapshot are re-embedded into a shadow index
+at a bounded rate (MIGRATE_RATE chunks/s), checkpointed so an interrupted run
+can --resume, and published as a new snapshot with one atomic CURRENT swap.
+Until then every reader keeps using the old snapshot; processes on
+load_live_store then switch to the new one and its query embeddings.
+
+Usage:
+    python jobs/migrate_embeddings.py
+    python jobs/migrate_embeddings.py --rate 50 --resume
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain.schema import Document
+
+from config import MIGRATE_CHECKPOINT_DIR, MIGRATE_RATE
+from service.checkpoint import EmbeddingCheckpoint
+from service.index_registry import current_version, read_meta
+from service.logging_helper import configure_logging
+from service.rate_limit import RateLimiter
+from service.rag_store import (
+    embed_chunks, embed_model_id, embedding_signature, load_store, make_embeddings, remove_chunks, save_store,
+)
+
+
+def stored_chunks(vs, skip=()):
+    """Documents in vs's docstore (chunk_id set from the docstore id), minus ids in skip."""
+    docs = []
+    for doc_id, doc in vs.docstore._dict.items():
+        if doc_id in skip:
+            continue
+        docs.append(Document(page_content=doc.page_content, metadata=dict(doc.metadata, chunk_id=doc_id)))
+    return docs
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-embed the current FAISS snapshot with the configured embedding model.")
+    ap.add_argument("--rate", type=float, default=MIGRATE_RATE, help="chunks per second sent to the embedding model (0 = unlimited)")
+    ap.add_argument("--batch-size", type=int, default=None, help="chunks per embed call (default: rag_store.embed_batch_size)")
+    ap.add_argument("--resume", action="store_true", help="continue from the migration checkpoint")
+    ap.add_argument("--force", action="store_true", help="re-embed even if the snapshot already matches the configured model")
+    args = ap.parse_args()
+
+    logger = configure_logging(level=logging.INFO)
+    start_ts = time.time()
+    source = current_version()
+    if source is None:
+        raise SystemExit("No published index; run jobs/refresh.py first")
+
+    embeddings = make_embeddings()
+    target = embedding_signature(embeddings)
+    meta = read_meta(source) or {}
+    logger.info(f"=== migrate start === source={source} from={meta.get('embed_provider')}:{meta.get('embed_model')} to={target}")
+    if not args.force and all(meta.get(k) == target.get(k) for k in ("embed_provider", "embed_model", "output_dim")):
+        logger.info("snapshot already uses the configured embeddings; nothing to do (use --force to re-embed)")
+        return
+
+    # the old vectors are not used, only the stored chunks, so skip the embeddings check
+    old = load_store(embeddings, source, check=False)
+    chunks = stored_chunks(old)
+    checkpoint = EmbeddingCheckpoint(MIGRATE_CHECKPOINT_DIR, embed_model=embed_model_id(embeddings))
+    if args.resume:
+        logger.info(f"resuming: {checkpoint.load()} chunks already embedded")
+    else:
+        checkpoint.clear()
+    limiter = RateLimiter(args.rate)
+    stats = {}
+    shadow = embed_chunks(None, chunks, embeddings, batch_size=args.batch_size, checkpoint=checkpoint, stats=stats, throttle=limiter.acquire)
+
+    # a refresh may have published new chunks (or removed superseded ones) while we were embedding;
+    # catch up before the swap
+    caught_up = dropped = 0
+    latest = current_version()
+    if latest not in (None, source):
+        newer = load_store(embeddings, latest, check=False)
+        dropped = remove_chunks(shadow, [cid for cid in shadow.docstore._dict if cid not in newer.docstore._dict])
+        if dropped:
+            logger.info(f"version {latest} was published during the migration; dropping {dropped} chunks it removed")
+        extra = stored_chunks(newer, skip=set(shadow.docstore._dict))
+        if extra:
+            logger.info(f"version {latest} was published during the migration; embedding {len(extra)} new chunks")
+            shadow = embed_chunks(shadow, extra, embeddings, batch_size=args.batch_size, checkpoint=checkpoint, throttle=limiter.acquire)
+            caught_up = len(extra)
+
+    version = save_store(shadow)
+    checkpoint.clear()
+    elapsed = round(time.time() - start_ts, 3)
+    logger.info(f"published version={version} vectors={shadow.index.ntotal} elapsed_s={elapsed}")
+    logger.info("=== migrate end ===")
+
+    summary = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "source_version": source,
+        "published_version": version,
+        "from": {k: meta.get(k) for k in ("embed_provider", "embed_model", "output_dim")},
+        "to": target,
+        "chunks": len(chunks),
+        "chunks_resumed": stats.get("chunks_resumed", 0),
+        "chunks_embedded": stats.get("chunks_embedded", 0),
+        "chunks_caught_up": caught_up,
+        "chunks_dropped": dropped,
+        "rate": args.rate,
+        "elapsed_s": elapsed,
+    }
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,16 +7,10 @@ import time
 from datetime import datetime
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from config import URLS, PDF_URLS, LOCAL_PDF_PATHS, INDEX_DIR
+from config import URLS, PDF_URLS, LOCAL_PDF_PATHS, INDEX_DIR, LOGS_DIR
+from service.instrumentation import StageTimer, profile_run
 from service.logging_helper import configure_logging
-from service.rag_store import (
-    build_or_load_store,
-    refresh_store,
-    load_pages,
-    load_pdf_urls,
-    load_local_pdfs,
-    split_docs,
-)
+from service.rag_store import load_store, refresh_store
 
 # -------------------------------
 # Helpers
@@ -33,74 +27,50 @@ def index_size(vs) -> int:
 def main():
     parser = argparse.ArgumentParser(description="Refresh FAISS vector store with latest City of Edmonton pages & PDFs.")
     parser.add_argument("--dry-run", action="store_true", help="Load and count sources, but do NOT write to FAISS")
-    parser.add_argument("--rebuild", action="store_true", help="Delete existing index and rebuild from scratch")
+    parser.add_argument("--rebuild", action="store_true", help="Build a fresh index snapshot from scratch (published atomically; old snapshots are GC'd)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last embedding checkpoint instead of starting over")
+    parser.add_argument("--profile", action="store_true", help="Write a cProfile dump of the run to logs/refresh.prof")
     args = parser.parse_args()
 
     # Configure logging via helper (logs/refresh.log inferred from script name)
     logger = configure_logging(level=logging.INFO)
     start_ts = time.time()
     logger.info("=== refresh start ===")
-    logger.info(f"rebuild={args.rebuild} dry_run={args.dry_run}")
+    logger.info(f"rebuild={args.rebuild} dry_run={args.dry_run} resume={args.resume}")
     logger.info(f"urls={len(URLS)} pdf_urls={len(PDF_URLS)} local_pdf_paths={len(LOCAL_PDF_PATHS)}")
 
-    # Optionally rebuild index from scratch
-    if args.rebuild and INDEX_DIR.exists():
-        logger.warning(f"Deleting existing index at {INDEX_DIR.resolve()}")
-        for p in INDEX_DIR.iterdir():
-            try:
-                if p.is_file():
-                    p.unlink()
-                else:
-                    import shutil
-                    shutil.rmtree(p, ignore_errors=True)
-            except Exception as e:
-                logger.error(f"Failed to remove {p}: {e}")
-        try:
-            INDEX_DIR.rmdir()
-        except Exception:
-            pass
-
-    # Build/load store
-    vs = build_or_load_store(URLS, PDF_URLS, LOCAL_PDF_PATHS)
-    before_size = index_size(vs)
+    # Load the current snapshot; --rebuild (or no index yet) builds a new one from scratch.
+    # Nothing is deleted in place: the new snapshot is published atomically and old ones are GC'd.
+    if args.rebuild:
+        logger.warning(f"Rebuilding index from scratch; current snapshot at {INDEX_DIR.resolve()} stays live until publish")
+        vs = None
+    else:
+        vs = load_store()
+    before_size = index_size(vs) if vs is not None else 0
     logger.info(f"index size (before): {before_size}")
 
-    # Pre-load sources to compute counts
-    try:
-        web_docs = load_pages(URLS or [])
-    except Exception as e:
-        logger.exception(f"load_pages failed: {e}")
-        web_docs = []
-    try:
-        pdf_web_docs = load_pdf_urls(PDF_URLS or [])
-    except Exception as e:
-        logger.exception(f"load_pdf_urls failed: {e}")
-        pdf_web_docs = []
-    try:
-        pdf_local_docs = load_local_pdfs(LOCAL_PDF_PATHS or [])
-    except Exception as e:
-        logger.exception(f"load_local_pdfs failed: {e}")
-        pdf_local_docs = []
-
-    all_docs = (web_docs or []) + (pdf_web_docs or []) + (pdf_local_docs or [])
-    try:
-        chunks = split_docs(all_docs)
-        chunk_count = len(chunks)
-    except Exception as e:
-        logger.exception(f"split_docs failed: {e}")
-        chunk_count = -1
-
-    logger.info(f"fetched docs: web={len(web_docs)} pdf_web={len(pdf_web_docs)} pdf_local={len(pdf_local_docs)} total={len(all_docs)}")
-    logger.info(f"chunk_count (pre-split estimate): {chunk_count}")
-
-    # Write to FAISS (unless dry-run)
-    if not args.dry_run:
-        vs = refresh_store(vs, URLS, PDF_URLS, LOCAL_PDF_PATHS)
+    # One streaming pass: load -> split -> dedup -> embed -> index (stages overlap, memory stays bounded).
+    # --dry-run runs the same pass without embedding or publishing, to get the counts.
+    stats = {}
+    timer = StageTimer()
+    if args.profile:
+        with profile_run(LOGS_DIR / "refresh.prof", logger):
+            vs = refresh_store(vs, URLS, PDF_URLS, LOCAL_PDF_PATHS, stats=stats, resume=args.resume, dry_run=args.dry_run, timer=timer)
+    else:
+        vs = refresh_store(vs, URLS, PDF_URLS, LOCAL_PDF_PATHS, stats=stats, resume=args.resume, dry_run=args.dry_run, timer=timer)
+    docs_total = sum(stats.get(k, 0) for k in ("docs_web", "docs_pdf_web", "docs_pdf_local"))
+    logger.info(f"fetched docs: web={stats.get('docs_web', 0)} pdf_web={stats.get('docs_pdf_web', 0)} pdf_local={stats.get('docs_pdf_local', 0)} total={docs_total}")
+    logger.info(f"chunks: total={stats.get('chunks_total', 0)} kept={stats.get('chunks_kept', 0)} dropped={stats.get('chunks_dropped', 0)} new={stats.get('chunks_new', 0)} unchanged={stats.get('chunks_unchanged', 0)} removed={stats.get('chunks_removed', 0)}")
 
-    after_size = index_size(vs)
+    after_size = index_size(vs) if vs is not None else 0
     elapsed = round(time.time() - start_ts, 3)
     logger.info(f"index size (after): {after_size}")
     logger.info(f"elapsed_s: {elapsed}")
+    timer.log(logger)
+    # full per-URL / per-PDF tables; the summary below keeps the 10 slowest of each
+    timings_path = LOGS_DIR / "refresh_timings.json"
+    with open(timings_path, "w", encoding="utf-8") as f:
+        json.dump(dict(timer.summary(), elapsed_s=elapsed), f, indent=1)
     logger.info("=== refresh end ===")
 
     # JSON summary for cron-friendly scraping
@@ -108,17 +78,28 @@ def main():
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "rebuild": args.rebuild,
         "dry_run": args.dry_run,
+        "resume": args.resume,
         "urls": len(URLS),
         "pdf_urls": len(PDF_URLS),
         "local_pdf_paths": len(LOCAL_PDF_PATHS),
-        "docs_web": len(web_docs),
-        "docs_pdf_web": len(pdf_web_docs),
-        "docs_pdf_local": len(pdf_local_docs),
-        "docs_total": len(all_docs),
-        "chunks_estimated": chunk_count,
+        "docs_web": stats.get("docs_web", 0),
+        "docs_pdf_web": stats.get("docs_pdf_web", 0),
+        "docs_pdf_local": stats.get("docs_pdf_local", 0),
+        "docs_total": docs_total,
+        "chunks_total": stats.get("chunks_total", 0),
+        "chunks_kept": stats.get("chunks_kept", 0),
+        "chunks_dropped": stats.get("chunks_dropped", 0),
+        "chunks_new": stats.get("chunks_new", 0),
+        "chunks_unchanged": stats.get("chunks_unchanged", 0),
+        "chunks_removed": stats.get("chunks_removed", 0),
+        "chunks_resumed": stats.get("chunks_resumed", 0),
+        "chunks_embedded": stats.get("chunks_embedded", 0),
         "index_size_before": before_size,
         "index_size_after": after_size,
         "elapsed_s": elapsed,
+        **timer.summary(top=10),
+        "timings_path": str(timings_path),
+        "profile_path": str(LOGS_DIR / "refresh.prof") if args.profile else None,
     }
     print(json.dumps(summary))
 
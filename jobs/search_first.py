@@ -7,19 +7,33 @@
 # Usage:
 #   python search_first.py -k 25 --mine
 #
+# Runs as a pipeline: search workers feed newly found URLs into bounded
+# queues for the scrape (--mine) and PDF download workers, so downloads
+# start while searches are still running. Every stage is paced by a
+# per-host token bucket (service/rate_limit.py) instead of fixed sleeps.
+# Search results are cached per (query, k) in logs/search_cache.json
+# (SEARCH_CACHE_TTL_S); --refresh-older-than 1d re-issues older queries,
+# --no-cache bypasses the cache.
+#
 
 # Deps:
 #   pip install duckduckgo-search beautifulsoup4 requests
 import sys, os
 import logging
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-import argparse, json, re, time
+import argparse, json, queue, re, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
 import requests
 from ddgs import DDGS
-from bs4 import BeautifulSoup
-from service.utils import download_pdf, is_allowed_websites
-from config import LOGS_DIR, ALLOWED
+from service.utils import fetch_pdf, is_allowed_websites
+from config import (
+    LOGS_DIR, ALLOWED, SEARCH_RATE, FETCH_RATE_PER_HOST, SEARCH_WORKERS, SCRAPE_WORKERS, DOWNLOAD_WORKERS,
+    SEARCH_CACHE_PATH, SEARCH_CACHE_TTL_S,
+)
+from service.rate_limit import HostRateLimiter
+from service.search_cache import SearchCache, parse_age
+from service.term_miner import ACCESS_TERMS, TermMiner, aggregate, make_pool, mine_html_in_pool, top_terms
 from service.logging_helper import configure_logging
 
 PDF_URL_RE = re.compile(r'\.pdf(?:$|[?#/])', re.I)
@@ -27,14 +41,6 @@ PDF_URL_RE = re.compile(r'\.pdf(?:$|[?#/])', re.I)
 # Always include this URL in results (per request)
 ALWAYS_INCLUDE = "https://www.edmonton.ca/programs_services/housing/affordable-housing-developments"
 
-# ---- Tunable mining pattern (internal string) ----
-# Captures common lane/pathway/vehicle-access phrases found in bylaw/guide pages.
-ACCESS_TERMS_REGEX = r"\b(?:abutting lane|rear lane|back lane|pathway|vehicle access)\b"  # case-insensitive
-
-# (Optional) keep a couple of generic capitalized phrase patterns for headings/terms discovery
-CAPITALIZED_BIGRAM_REGEX  = r"\b[A-Z][a-z]+ [A-Z][a-z]+\b"
-CAPITALIZED_TRIGRAM_REGEX = r"\b[A-Z][a-z]+ [A-Z][a-z]+ [A-Z][a-z]+\b"
-
 # ---- Glossary (ALL zones) ----
 GLOSSARY = {
     "alley": ["alley", "lane", "laneway", "rear lane", "back lane"],
@@ -53,6 +59,9 @@ GLOSSARY = {
     ],
 }
 
+# Phrases counted by --mine (service/term_miner.py): access terms + every glossary entry
+MINING_TERMS = list(ACCESS_TERMS) + [t for terms in GLOSSARY.values() for t in terms]
+
 BASE_QUERIES = [
     "Do I need an alley for a backyard house?",
     "alley requirement backyard housing edmonton",
@@ -111,42 +120,155 @@ def gen_queries():
             final.append(q); seen.add(q)
     return final
 
-def scrape_terms(url, timeout=12):
-    # Mine new terms from pages (case-insensitive)
+def fetch_html(url, timeout=12):
     try:
         headers = {"User-Agent": os.getenv("USER_AGENT", "YEGGardenSuite-RAG/1.0")}
-        html = requests.get(url, timeout=timeout, headers=headers).text
-        soup = BeautifulSoup(html, "html.parser")
-        text = re.sub(r"\s+", " ", soup.get_text(" ", strip=True))
-
-        patterns = [
-            CAPITALIZED_BIGRAM_REGEX,
-            CAPITALIZED_TRIGRAM_REGEX,
-            ACCESS_TERMS_REGEX,
-        ]
-
-        hits = set()
-        for pat in patterns:
-            try:
-                # Use IGNORECASE to match "Pathway" and "pathway" etc.
-                hits.update(re.findall(pat, text, flags=re.IGNORECASE))
-            except re.error as e:
-                print(f"[warn] bad regex skipped: {pat} -> {e}")
-
-        # Normalize tuples to strings, dedupe, trim
-        out = []
-        for h in hits:
-            if isinstance(h, tuple):
-                out.append(" ".join([x for x in h if isinstance(x, str)]).strip())
-            elif isinstance(h, str):
-                out.append(h.strip())
-        return sorted({x for x in out if x})[:100]
+        return requests.get(url, timeout=timeout, headers=headers).text
+    except Exception:
+        return ""
+
+def scrape_terms(url, timeout=12):
+    # Mine terms from one page, most frequent first (discover() mines many pages in a process pool)
+    try:
+        return top_terms(TermMiner(MINING_TERMS).mine_html(fetch_html(url, timeout)))
     except Exception:
         return []
 def is_pdf (url):
     is_pdf = bool(__import__('re').search(r'\.pdf(?:$|[?#/])', url.lower()))
     return is_pdf
 
+# ---- Discovery pipeline: search -> (scrape, download) ----
+SEARCH_HOST = "duckduckgo.com"
+_DONE = object()
+logger = logging.getLogger(__name__)
+
+def _start_stage(name, q, workers, fn, stats):
+    """Start `workers` threads applying fn to items from q until a _DONE marker each."""
+    stats[name] = {"items": 0, "busy_s": 0.0, "errors": 0}
+    lock = threading.Lock()
+
+    def _run():
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            t0 = time.perf_counter()
+            try:
+                fn(item)
+            except Exception as e:
+                logger.warning("%s failed for %s: %s", name, item, e)
+                with lock:
+                    stats[name]["errors"] += 1
+            with lock:
+                stats[name]["items"] += 1
+                stats[name]["busy_s"] += time.perf_counter() - t0
+
+    threads = [threading.Thread(target=_run, name=f"{name}-{i}", daemon=True) for i in range(max(1, workers))]
+    for t in threads:
+        t.start()
+    return threads
+
+def discover(queries, k=25, mine=False, limiter=None, search_workers=SEARCH_WORKERS,
+             scrape_workers=SCRAPE_WORKERS, download_workers=DOWNLOAD_WORKERS, queue_size=256, search_fn=None,
+             cache=None, max_age_s=None, mine_processes=None):
+    """Run the search/scrape/download stages concurrently.
+
+    search_fn(query, k=...) defaults to ddg(); cache (a SearchCache) answers
+    queries younger than max_age_s without touching the search backend or
+    its rate limit.
+
+    With mine=True scrape workers fetch pages and hand the HTML to a process
+    pool of mine_processes TermMiner workers (default: one per CPU).
+
+    Returns (results {query: urls}, all_urls, mined {url: Counter of terms}, downloads {pdf url: (path or None, is_new)}, stats).
+    """
+    limiter = limiter or HostRateLimiter(FETCH_RATE_PER_HOST, overrides={SEARCH_HOST: SEARCH_RATE})
+    backend = search_fn or ddg
+
+    def search_fn(q, k):
+        limiter.acquire(SEARCH_HOST)
+        return backend(q, k=k)
+
+    if cache is not None:
+        search_fn = cache.wrap(search_fn, max_age_s)
+    results, mined, downloads, stats = {}, {}, {}, {}
+    seen = set()
+    lock = threading.Lock()
+    scrape_q = queue.Queue(maxsize=queue_size)
+    download_q = queue.Queue(maxsize=queue_size)
+
+    def _emit(u):
+        with lock:
+            if u in seen:
+                return
+            seen.add(u)
+        if is_pdf(urlparse(u).path.lower()):
+            download_q.put(u)
+        elif mine:
+            # PDFs are binary; they are downloaded for indexing, not scraped for terms
+            scrape_q.put(u)
+
+    def _search(q):
+        urls = allowlist(search_fn(q, k=k))
+        if urls:
+            with lock:
+                results[q] = urls
+        for u in urls:
+            _emit(u)
+        return len(urls)
+
+    mine_pool = make_pool(MINING_TERMS, mine_processes) if mine else None
+    mining = {}
+
+    def _scrape(u):
+        limiter.acquire(u)
+        html = fetch_html(u)
+        if html:
+            mining[u] = mine_pool.submit(mine_html_in_pool, html)
+
+    def _download(u):
+        limiter.acquire(u)
+        downloads[u] = fetch_pdf(u)
+
+    t_start = time.perf_counter()
+    stages = [
+        ("scrape", scrape_q, _start_stage("scrape", scrape_q, scrape_workers if mine else 1, _scrape, stats)),
+        ("download", download_q, _start_stage("download", download_q, download_workers, _download, stats)),
+    ]
+    # Always include requested URL
+    _emit(ALWAYS_INCLUDE)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max(1, search_workers), thread_name_prefix="search") as pool:
+        futures = {pool.submit(_search, q): q for q in queries}
+        for f in as_completed(futures):
+            try:
+                f.result()
+            except Exception as e:
+                logger.warning("search failed for %s: %s", futures[f], e)
+    stats["search"] = {"items": len(queries), "wall_s": round(time.perf_counter() - t0, 3)}
+    if cache is not None:
+        stats["search"].update(cache_hits=cache.hits, cache_misses=cache.misses)
+
+    for name, q, threads in stages:
+        for _ in threads:
+            q.put(_DONE)
+    for name, q, threads in stages:
+        for t in threads:
+            t.join()
+        stats[name]["wall_s"] = round(time.perf_counter() - t_start, 3)
+        stats[name]["busy_s"] = round(stats[name]["busy_s"], 3)
+    if mine_pool is not None:
+        for u, f in mining.items():
+            try:
+                mined[u] = f.result()
+            except Exception as e:
+                logger.warning("mining failed for %s: %s", u, e)
+        mine_pool.shutdown()
+        stats["mine"] = {"items": len(mined), "wall_s": round(time.perf_counter() - t_start, 3)}
+    stats["total_wall_s"] = round(time.perf_counter() - t_start, 3)
+    return results, set(seen), mined, downloads, stats
+
 def main():
     # Configure logging to logs/search_first.log + console
     logger = configure_logging(level=logging.INFO)
@@ -154,28 +276,38 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("-k", type=int, default=25, help="max results per query (default: 25)")
     ap.add_argument("--mine", action="store_true", help="mine new terms from top pages")
+    ap.add_argument("--search-rate", type=float, default=SEARCH_RATE, help="search queries per second")
+    ap.add_argument("--host-rate", type=float, default=FETCH_RATE_PER_HOST, help="scrapes/downloads per second per host")
+    ap.add_argument("--search-workers", type=int, default=SEARCH_WORKERS)
+    ap.add_argument("--scrape-workers", type=int, default=SCRAPE_WORKERS)
+    ap.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS)
+    ap.add_argument("--refresh-older-than", type=parse_age, default=None, metavar="AGE",
+                    help="re-issue cached queries older than AGE (e.g. 12h, 3d; default: cache TTL)")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not update the search cache")
+    ap.add_argument("--mine-processes", type=int, default=None, help="term mining processes (default: CPU count)")
     args = ap.parse_args()
 
     queries = gen_queries()
-    results = {}
-    all_urls = set()
-
-    for q in queries:
-        urls = allowlist(ddg(q, k=args.k))
-        if urls:
-            results[q] = urls
-            all_urls.update(urls)
-        time.sleep(0.2)  # polite
-
-    # Always include requested URL
-    all_urls.add(ALWAYS_INCLUDE)
-
-    # Optional: mine terms
-    mined = {}
-    if args.mine:
-        for u in sorted(all_urls):
-            mined[u] = scrape_terms(u)
-            time.sleep(0.2)
+    limiter = HostRateLimiter(args.host_rate, overrides={SEARCH_HOST: args.search_rate})
+    cache = None if args.no_cache else SearchCache(SEARCH_CACHE_PATH, SEARCH_CACHE_TTL_S)
+    results, all_urls, mined, downloads, stage_stats = discover(
+        queries,
+        k=args.k,
+        mine=args.mine,
+        limiter=limiter,
+        search_workers=args.search_workers,
+        scrape_workers=args.scrape_workers,
+        download_workers=args.download_workers,
+        cache=cache,
+        max_age_s=args.refresh_older_than,
+        mine_processes=args.mine_processes,
+    )
+    term_totals, term_doc_freq = aggregate(mined.values())
+    if cache is not None:
+        cache.save()
+        logger.info("search cache: %s (%s)", cache.stats(), SEARCH_CACHE_PATH)
+    for name, st in stage_stats.items():
+        logger.info("stage %s: %s", name, st)
 
     # Partition PDFs vs others
     pdf_urls = []
@@ -196,16 +328,21 @@ def main():
             other_urls.append(u)
 
     # Print grouped output
+    new_pdfs = []
     print(f"PDF urls ({len(pdf_urls)}):")
     logger.info("PDF urls (%d):", len(pdf_urls))
     for u in pdf_urls:
-        # Re-print grouped section nicely, but download using raw URL
+        # Re-print grouped section nicely; the download already ran in the pipeline
         print(f'"{u}",')
         logger.info('"%s",', u)
-        saved = download_pdf(u)
-        if saved:
+        saved, is_new = downloads.get(u, (None, False))
+        if saved and is_new:
             print("Saved to:", saved)
             logger.info("Saved to: %s", saved)
+            new_pdfs.append(saved)
+        elif saved:
+            print("Unchanged:", saved)
+            logger.info("Unchanged (already stored): %s", saved)
         else:
             print(f"[error] PDF not saved for: {u}")
             logger.error("PDF not saved for: %s", u)
@@ -223,8 +360,12 @@ def main():
             "queries": queries,
             "unique_urls": sorted(all_urls),
             "pdf_urls": pdf_urls,
+            "new_pdf_paths": new_pdfs,
             "other_urls": other_urls,
-            "mined_terms": mined if args.mine else {},
+            "mined_terms": {u: top_terms(c) for u, c in sorted(mined.items())},
+            "term_frequencies": {t: term_totals[t] for t in top_terms(term_totals, 200)},
+            "term_page_counts": {t: term_doc_freq[t] for t in top_terms(term_totals, 200)},
+            "stages": stage_stats,
         }, f, indent=2, ensure_ascii=False)
     logger.info("Saved results to %s", out_path)
 
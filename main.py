@@ -4,10 +4,11 @@ import logging
 import time
 from config import URLS, PDF_URLS, LOCAL_PDF_PATHS
 from service.logging_helper import configure_logging
-from service.rag_store import build_or_load_store
+from service.rag_store import build_or_load_store, load_live_store
 from service.qa_chain import make_qa
 from service.answer_modes import answer_pre_ingest, answer_hybrid
 from service.utils import attach_citations
+from service.tracing import latency_report, trace_question
 
 EXAMPLE_QUESTIONS = [
     "What is backyard housing and do I need permits?",
@@ -15,20 +16,28 @@ EXAMPLE_QUESTIONS = [
     "Do I need an alley to build a backyard house?",
 ]
 
+def report_latency():
+    # p50/p95/p99 per stage over the questions traced in this run (service/tracing.py)
+    report = latency_report()
+    logging.info("QA latency by stage (ms):\n%s", report)
+    print("\nLatency by stage (ms):\n" + report)
+
 def ask_once(vs, question: str, mode: str):
-    if mode == "rag":
-        qa = make_qa(vs)
-        ans, srcs = answer_pre_ingest(question, qa)
-    elif mode == "hybrid":
-        ans, srcs = answer_hybrid(question, vs)
-    else:
+    if mode not in {"rag", "hybrid"}:
         raise ValueError("mode must be 'rag' or 'hybrid'")
-    logging.info("A: %s", attach_citations(ans, srcs))
-    print(attach_citations(ans, srcs))
+    with trace_question(question, mode):
+        if mode == "rag":
+            qa = make_qa(vs)
+            ans, srcs = answer_pre_ingest(question, qa)
+        else:
+            ans, srcs = answer_hybrid(question, vs)
+    answer = attach_citations(ans, srcs)
+    logging.debug("A: %s", answer)  # full answers only at DEBUG; stdout already has them
+    print(answer)
 
 def interactive(vs, mode: str):
-    logging.info("Backyard Housing QA (%s) — type 'exit' to quit.", mode)
-    print(f"Backyard Housing QA ({mode}) — type 'exit' to quit.")
+    logging.info("Backyard Housing QA (%s) — type 'exit' to quit, 'stats' for latency.", mode)
+    print(f"Backyard Housing QA ({mode}) — type 'exit' to quit, 'stats' for latency.")
     qa = make_qa(vs) if mode == "rag" else None
     while True:
         try:
@@ -37,12 +46,18 @@ def interactive(vs, mode: str):
             break
         if not q or q.lower() in {"exit", "quit"}:
             break
-        if mode == "rag":
-            ans, srcs = answer_pre_ingest(q, qa)
-        else:
-            ans, srcs = answer_hybrid(q, vs)
-        logging.info("A: %s", attach_citations(ans, srcs))
-        print("\nA:", attach_citations(ans, srcs))
+        if q.lower() == "stats":
+            report_latency()
+            continue
+        with trace_question(q, mode):
+            if mode == "rag":
+                ans, srcs = answer_pre_ingest(q, qa)
+            else:
+                ans, srcs = answer_hybrid(q, vs)
+        answer = attach_citations(ans, srcs)
+        logging.debug("A: %s", answer)
+        print("\nA:", answer)
+    report_latency()
 
 def main():
     # Ensure a polite default User-Agent for outbound HTTP requests
@@ -74,7 +89,8 @@ def main():
         return ask_once(vs, args.question, args.mode)
 
     if args.interactive:
-        return interactive(vs, args.mode)
+        # long-running: follow snapshots published by jobs/refresh.py without a restart
+        return interactive(load_live_store(vs), args.mode)
 
     if args.examples or True:  # default: run examples
         logging.info("=== %s MODE ===", args.mode.upper())
@@ -82,13 +98,16 @@ def main():
         for q in EXAMPLE_QUESTIONS:
             logging.info("Q: %s", q)
             print(f"\nQ: {q}")
-            if args.mode == "rag":
-                qa = make_qa(vs)
-                ans, srcs = answer_pre_ingest(q, qa)
-            else:
-                ans, srcs = answer_hybrid(q, vs)
-            logging.info("A: %s", attach_citations(ans, srcs))
-            print("A:", attach_citations(ans, srcs))
+            with trace_question(q, args.mode):
+                if args.mode == "rag":
+                    qa = make_qa(vs)
+                    ans, srcs = answer_pre_ingest(q, qa)
+                else:
+                    ans, srcs = answer_hybrid(q, vs)
+            answer = attach_citations(ans, srcs)
+            logging.debug("A: %s", answer)
+            print("A:", answer)
+        report_latency()
 
 if __name__ == "__main__":
     main()
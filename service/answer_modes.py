@@ -1,18 +1,26 @@
+from functools import lru_cache
 from langchain.prompts import PromptTemplate
-from langchain_ollama import ChatOllama  # pip install -U langchain-ollama
 from config import GEN_MODEL
 from service.qa_chain import make_qa
+from service.tracing import callbacks, span
 
 # --- Normalizer protects retrieval from user typos before embeddings/reranker run.---
 _QN_PROMPT = PromptTemplate.from_template(
     "Fix spelling and grammar in the question without changing meaning. "
     "Return ONLY the corrected question.\n\nQuestion: {q}"
 )
-_qn_llm = ChatOllama(model=GEN_MODEL, temperature=0)
+
+@lru_cache(maxsize=1)
+def _normalizer_llm():
+    # built on first question rather than at import, so `main.py -q` starts without it
+    from langchain_ollama import ChatOllama  # pip install -U langchain-ollama
+    return ChatOllama(model=GEN_MODEL, temperature=0)
 
 def normalize_question(q: str) -> str:
     try:
-        result = _qn_llm.invoke(_QN_PROMPT.format(q=q))
+        llm = _normalizer_llm()
+        with span("normalize"):
+            result = llm.invoke(_QN_PROMPT.format(q=q))
         # If result is a list, get the first string or dict's 'content'
         if isinstance(result, list):
             if result and isinstance(result[0], dict) and "content" in result[0]:
@@ -43,34 +51,40 @@ def normalize_question(q: str) -> str:
     except Exception:
         return q  # safest fallback
 
+def _invoke(qa_chain, query: str, attempt: str) -> dict:
+    # one traced RetrievalQA call; the callbacks add retrieve / prompt_assembly / ttft / generation spans
+    with span("qa", attempt=attempt):
+        return qa_chain.invoke({"query": query}, config={"callbacks": callbacks()})
+
 # Then use it inside your answer functions:
 
 def answer_pre_ingest(question: str, qa_chain):
     q_norm = normalize_question(question)
-    out = qa_chain.invoke({"query": q_norm})
+    out = _invoke(qa_chain, q_norm, "normalized")
     # If normalization hurt recall, fall back to original once
     if out["result"].strip() == "NOT_ENOUGH_CONTEXT" and q_norm != question:
-        out = qa_chain.invoke({"query": question})
+        out = _invoke(qa_chain, question, "original")
     return out["result"], out.get("source_documents", [])
 
 def answer_hybrid(question: str, vs):
     q_norm = normalize_question(question)
     qa = make_qa(vs)
-    first = qa.invoke({"query": q_norm})
+    first = _invoke(qa, q_norm, "normalized")
     text = first["result"].strip()
     srcs = first.get("source_documents", [])
 
     if text == "NOT_ENOUGH_CONTEXT" and q_norm != question:
-        first = qa.invoke({"query": question})
+        first = _invoke(qa, question, "original")
         text = first["result"].strip()
         srcs = first.get("source_documents", [])
 
     if text == "NOT_ENOUGH_CONTEXT":
         from service.rag_store import refresh_store
         from config import URLS, PDF_URLS, LOCAL_PDF_PATHS
-        refresh_store(vs, URLS, PDF_URLS, LOCAL_PDF_PATHS)
+        with span("refresh"):
+            refresh_store(vs, URLS, PDF_URLS, LOCAL_PDF_PATHS)
         qa = make_qa(vs)
-        second = qa.invoke({"query": q_norm})
+        second = _invoke(qa, q_norm, "after_refresh")
         text = second["result"].strip()
         srcs = second.get("source_documents", [])
     return text, srcs
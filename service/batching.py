@@ -0,0 +1,230 @@
+"""Dynamic micro-batching for the embedding service.
+
+Concurrent HTTP requests each submit their texts to one MicroBatcher. A worker
+thread collects submissions until max_batch_size texts are queued or
+max_wait_ms has passed since the first one arrived, runs a single encode per
+embedding_type, and hands each caller back its own slice of the result.
+
+With workers > 1 several inference threads share the queue: one collects the
+next batch while another is still inside encode (PyTorch / ONNX Runtime
+release the GIL during the forward pass). close() stops intake and drains
+everything already queued before the threads exit.
+
+Usage:
+
+    batcher = MicroBatcher(lambda texts, etype: model_encode(texts, etype), max_batch_size=32, max_wait_ms=5)
+    vectors = batcher.embed(["text a", "text b"], "documents")   # blocks until the batch ran
+    batcher.stats()   # queue depth, batch-size histogram, ...
+    batcher.close()   # graceful shutdown: finish in-flight and queued batches
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the batch-size histogram buckets (texts per encode call)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+_STOP = object()
+
+
+class BatcherClosed(RuntimeError):
+    """Raised by submit() after close(), e.g. while the service swaps in a reloaded model."""
+
+
+class _Request:
+    __slots__ = ("texts", "embedding_type", "future", "enqueued")
+
+    def __init__(self, texts: List[str], embedding_type: str):
+        self.texts = texts
+        self.embedding_type = embedding_type
+        self.future: Future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str], str], Sequence],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        name: str = "embed-batcher",
+        on_batch: Optional[Callable[[int, float], None]] = None,
+        workers: int = 1,
+    ):
+        """on_batch(batch_size, encode_seconds) is called after every encode (e.g. to feed metrics)."""
+        self.encode_fn = encode_fn
+        self.on_batch = on_batch
+        self.workers = max(1, int(workers))
+        self._closed = False
+        self._intake_lock = threading.Lock()  # closed check + put vs. close's stop markers
+        self._collect_lock = threading.Lock()
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._carry: Optional[_Request] = None
+        self._lock = threading.Lock()
+        self._histogram: Dict[str, int] = {str(b): 0 for b in BATCH_SIZE_BUCKETS}
+        self._histogram["+Inf"] = 0
+        self._batches = 0
+        self._texts = 0
+        self._requests = 0
+        self._wait_s_total = 0.0
+        self._in_flight = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    # ---------- caller side ----------
+    def submit(self, texts: Sequence[str], embedding_type: str = "documents") -> Future:
+        req = _Request(list(texts), embedding_type)
+        with self._intake_lock:
+            if self._closed:
+                raise BatcherClosed("batcher is shut down")
+            self._queue.put(req)
+        return req.future
+
+    def embed(self, texts: Sequence[str], embedding_type: str = "documents", timeout: Optional[float] = None):
+        return self.submit(texts, embedding_type).result(timeout)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() + (1 if self._carry is not None else 0)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stop accepting work, finish everything already queued, then stop the workers."""
+        with self._intake_lock:
+            if self._closed:
+                return
+            self._closed = True
+            for _ in self._threads:
+                self._queue.put(_STOP)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for t in self._threads:
+            t.join(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        if not any(t.is_alive() for t in self._threads):
+            self._fail_leftovers()
+        logger.info("batcher: closed (batches=%d texts=%d)", self._batches, self._texts)
+
+    def _fail_leftovers(self) -> None:
+        # nothing should be left once the workers are gone; never leave a caller waiting on a dead queue
+        leftovers = [self._carry] if self._carry is not None else []
+        self._carry = None
+        while True:
+            try:
+                leftovers.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        failed = 0
+        for req in leftovers:
+            if req is not _STOP and not req.future.done():
+                req.future.set_exception(BatcherClosed("batcher is shut down"))
+                failed += 1
+        if failed:
+            logger.warning("batcher: failed %d request(s) queued after shutdown", failed)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "closed": self._closed,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_s * 1000.0,
+                "queue_depth": self.queue_depth(),
+                "in_flight_texts": self._in_flight,
+                "batches": self._batches,
+                "requests": self._requests,
+                "texts": self._texts,
+                "avg_batch_size": round(self._texts / self._batches, 3) if self._batches else 0.0,
+                "avg_queue_wait_ms": round(self._wait_s_total / self._requests * 1000.0, 3) if self._requests else 0.0,
+                "batch_size_histogram": dict(self._histogram),
+            }
+
+    # ---------- worker side ----------
+    def _collect(self) -> Optional[List[_Request]]:
+        """Next batch, or None once a stop marker is reached (everything before it was served)."""
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        if first is _STOP:
+            return None
+        batch = [first]
+        n = len(first.texts)
+        deadline = time.perf_counter() + self.max_wait_s
+        while n < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                req = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if req is _STOP:
+                self._queue.put(req)  # nothing is queued after a stop marker; leave it for the next collect
+                break
+            if n + len(req.texts) > self.max_batch_size:
+                self._carry = req  # starts the next batch
+                break
+            batch.append(req)
+            n += len(req.texts)
+        return batch
+
+    def _record(self, size: int, reqs: List[_Request], started: float) -> None:
+        with self._lock:
+            self._batches += 1
+            self._texts += size
+            self._requests += len(reqs)
+            self._wait_s_total += sum(started - r.enqueued for r in reqs)
+            for b in BATCH_SIZE_BUCKETS:
+                if size <= b:
+                    self._histogram[str(b)] += 1
+                    break
+            else:
+                self._histogram["+Inf"] += 1
+
+    def _run_group(self, reqs: List[_Request]) -> None:
+        texts = [t for r in reqs for t in r.texts]
+        started = time.perf_counter()
+        with self._lock:
+            self._in_flight += len(texts)
+        try:
+            vectors = self.encode_fn(texts, reqs[0].embedding_type)
+        except Exception as e:
+            for r in reqs:
+                r.future.set_exception(e)
+            return
+        finally:
+            with self._lock:
+                self._in_flight -= len(texts)
+        self._record(len(texts), reqs, started)
+        if self.on_batch is not None:
+            try:
+                self.on_batch(len(texts), time.perf_counter() - started)
+            except Exception:
+                logger.exception("batcher: on_batch hook failed")
+        offset = 0
+        for r in reqs:
+            r.future.set_result(vectors[offset:offset + len(r.texts)])
+            offset += len(r.texts)
+
+    def _run(self) -> None:
+        while True:
+            with self._collect_lock:
+                batch = self._collect()
+            if batch is None:
+                return
+            groups: Dict[str, List[_Request]] = {}
+            for req in batch:
+                groups.setdefault(req.embedding_type, []).append(req)
+            for reqs in groups.values():
+                self._run_group(reqs)
+
+
+__all__ = ["BATCH_SIZE_BUCKETS", "BatcherClosed", "MicroBatcher"]
@@ -0,0 +1,123 @@
+"""On-disk checkpoints for long embedding runs (jobs/refresh.py --resume).
+
+Layout under CHECKPOINT_DIR:
+
+    manifest.json        {"version", "embed_model", "parts": [{"file", "ids"}, ...]}
+    part-00000.npy       float32 vectors, one row per id in the matching manifest part
+    part-00001.npy
+    ...
+
+Vectors are buffered in memory and written as a new part every
+CHECKPOINT_EVERY_BATCHES batches; the manifest is replaced atomically after
+the part file is on disk, so a crash never leaves a manifest pointing at a
+half-written part.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from config import CHECKPOINT_DIR, CHECKPOINT_EVERY_BATCHES
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+
+
+class EmbeddingCheckpoint:
+    def __init__(self, path: Path = CHECKPOINT_DIR, embed_model: str = "", every_batches: int = CHECKPOINT_EVERY_BATCHES):
+        self.path = Path(path)
+        self.embed_model = embed_model
+        self.every_batches = max(1, int(every_batches))
+        self._parts: List[Dict[str, object]] = []
+        self._where: Dict[str, Tuple[int, int]] = {}   # chunk_id -> (part index, row)
+        self._arrays: Dict[int, np.ndarray] = {}
+        self._pending_ids: List[str] = []
+        self._pending_vecs: List[np.ndarray] = []
+        self._pending_batches = 0
+
+    # ---------- read side ----------
+    def load(self) -> int:
+        """Load an existing checkpoint; returns the number of completed chunk ids."""
+        try:
+            with open(self.path / MANIFEST, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return 0
+        if manifest.get("embed_model") != self.embed_model:
+            logger.warning(
+                "checkpoint: embed_model mismatch (%s != %s), ignoring %s",
+                manifest.get("embed_model"), self.embed_model, self.path,
+            )
+            return 0
+        self._parts = list(manifest.get("parts", []))
+        for pi, part in enumerate(self._parts):
+            for row, cid in enumerate(part["ids"]):
+                self._where[cid] = (pi, row)
+        logger.info("checkpoint: loaded %d vectors from %d parts", len(self._where), len(self._parts))
+        return len(self._where)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._where
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def vectors(self, chunk_ids: Sequence[str]) -> List[List[float]]:
+        out = []
+        for cid in chunk_ids:
+            pi, row = self._where[cid]
+            arr = self._arrays.get(pi)
+            if arr is None:
+                arr = np.load(self.path / str(self._parts[pi]["file"]), mmap_mode="r")
+                self._arrays[pi] = arr
+            out.append(np.asarray(arr[row], dtype=np.float32).tolist())
+        return out
+
+    # ---------- write side ----------
+    def record(self, chunk_ids: Sequence[str], vectors) -> None:
+        """Buffer one embedded batch; flushes every `every_batches` batches."""
+        self._pending_ids.extend(chunk_ids)
+        self._pending_vecs.append(np.asarray(vectors, dtype=np.float32))
+        self._pending_batches += 1
+        if self._pending_batches >= self.every_batches:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending_ids:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        pi = len(self._parts)
+        name = f"part-{pi:05d}.npy"
+        tmp = self.path / (name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.vstack(self._pending_vecs))
+        os.replace(tmp, self.path / name)
+        self._parts.append({"file": name, "ids": list(self._pending_ids)})
+        for row, cid in enumerate(self._pending_ids):
+            self._where[cid] = (pi, row)
+        self._write_manifest()
+        logger.info("checkpoint: wrote %s (%d vectors, %d total)", name, len(self._pending_ids), len(self._where))
+        self._pending_ids, self._pending_vecs, self._pending_batches = [], [], 0
+
+    def _write_manifest(self) -> None:
+        tmp = self.path / (MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "embed_model": self.embed_model, "parts": self._parts}, f)
+        os.replace(tmp, self.path / MANIFEST)
+
+    def clear(self) -> None:
+        """Remove the checkpoint (after a successful publish, or before a fresh run)."""
+        self._arrays.clear()
+        self._parts, self._where = [], {}
+        self._pending_ids, self._pending_vecs, self._pending_batches = [], [], 0
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+__all__ = ["EmbeddingCheckpoint"]
@@ -0,0 +1,325 @@
+"""Structure-aware, token-sized chunking with a content-hash split cache.
+
+Replaces the two RecursiveCharacterTextSplitter setups (1200/150 in split_docs,
+800/120 in build_index) with one chunker that:
+- never merges across input Documents, so PDF page boundaries are kept
+  (PyPDFLoader yields one Document per page);
+- starts a new section at headings: bylaw subsections such as "6.10.2 Site
+  Coverage", "Part 5"/"Section 2"/"Schedule A", markdown "#" headings and short
+  ALL-CAPS lines;
+- keeps tables (pipe/tab/column-aligned rows) together, splitting large ones by
+  rows with the header row repeated;
+- sizes chunks in tokens (tiktoken cl100k_base, word-count estimate if missing).
+
+Every chunk gets metadata["chunk_id"], derived from the source document's content
+hash, so unchanged documents keep their chunk IDs across refreshes and can be
+skipped by incremental embedding. Splits are cached by that hash in
+CHUNK_CACHE_PATH, so unchanged documents are not re-split either.
+
+Usage:
+
+    from service.chunker import chunk_documents
+    chunks = chunk_documents(docs)                # uses + updates the on-disk cache
+    chunks = chunk_documents(docs, cache=None)    # no cache
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_CACHE_MAX_AGE_S, CHUNK_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Bump when the splitting rules change so cached splits are not reused.
+CHUNKER_VERSION = 1
+
+_NUMBERED_HEADING_RE = re.compile(r"^\s*\d+(?:\.\d+){1,4}\.?\s+[A-Z(]")
+_NAMED_HEADING_RE = re.compile(
+    r"^\s*(?:#{1,6}\s+\S|(?:part|section|schedule|appendix)\s+[\dA-Z]+\b)", re.IGNORECASE
+)
+_TABLE_ROW_RE = re.compile(r"\|.*\||\t|\S {3,}\S.* {3,}\S")
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+")
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, otherwise a words*4/3 estimate."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text.split()) * 4 + 2) // 3
+
+
+def _is_heading(line: str) -> bool:
+    s = line.strip()
+    if not s or len(s) > 120:
+        return False
+    if _NUMBERED_HEADING_RE.match(s) or _NAMED_HEADING_RE.match(s):
+        return True
+    return s.isupper() and 3 <= len(s) <= 80 and any(c.isalpha() for c in s)
+
+
+def _is_table_row(line: str) -> bool:
+    return bool(_TABLE_ROW_RE.search(line))
+
+
+def _blocks(text: str) -> List[Tuple[str, str, str]]:
+    """Split text into (kind, heading, body) blocks; kind is "text" or "table"."""
+    blocks: List[Tuple[str, str, str]] = []
+    heading = ""
+    para: List[str] = []
+    table: List[str] = []
+
+    def flush_para():
+        if para:
+            blocks.append(("text", heading, "\n".join(para)))
+            para.clear()
+
+    def flush_table():
+        if table:
+            blocks.append(("table", heading, "\n".join(table)))
+            table.clear()
+
+    for raw in text.splitlines():
+        line = raw.rstrip()
+        if not line.strip():
+            flush_para()
+            flush_table()
+            continue
+        if _is_table_row(line):
+            flush_para()
+            table.append(line)
+            continue
+        flush_table()
+        if _is_heading(line):
+            flush_para()
+            heading = line.strip()
+            para.append(heading)
+            continue
+        para.append(line)
+    flush_para()
+    flush_table()
+    return blocks
+
+
+def _split_long_text(body: str, max_tokens: int, overlap_tokens: int) -> List[str]:
+    """Split one oversized paragraph on sentence boundaries (words as a last resort)."""
+    units = [u for u in _SENTENCE_RE.split(body) if u.strip()]
+    if len(units) == 1:
+        units = body.split()
+    pieces: List[str] = []
+    cur: List[str] = []
+    cur_tokens = 0
+    for unit in units:
+        t = count_tokens(unit)
+        if cur and cur_tokens + t > max_tokens:
+            pieces.append(" ".join(cur))
+            # carry the tail of the previous piece as overlap
+            tail: List[str] = []
+            tail_tokens = 0
+            for prev in reversed(cur):
+                pt = count_tokens(prev)
+                if tail_tokens + pt > overlap_tokens:
+                    break
+                tail.insert(0, prev)
+                tail_tokens += pt
+            cur, cur_tokens = tail, tail_tokens
+        cur.append(unit)
+        cur_tokens += t
+    if cur:
+        pieces.append(" ".join(cur))
+    return pieces
+
+
+def _split_table(body: str, max_tokens: int) -> List[str]:
+    rows = body.splitlines()
+    header, rest = rows[0], rows[1:]
+    pieces: List[str] = []
+    cur = [header]
+    cur_tokens = count_tokens(header)
+    for row in rest:
+        t = count_tokens(row)
+        if len(cur) > 1 and cur_tokens + t > max_tokens:
+            pieces.append("\n".join(cur))
+            cur, cur_tokens = [header], count_tokens(header)
+        cur.append(row)
+        cur_tokens += t
+    if len(cur) > 1 or not pieces:
+        pieces.append("\n".join(cur))
+    return pieces
+
+
+def split_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[Tuple[str, str]]:
+    """Return [(section_heading, chunk_text), ...] for one document's text."""
+    out: List[Tuple[str, str]] = []
+    cur: List[str] = []
+    cur_tokens = 0
+    cur_heading = ""
+
+    def flush():
+        nonlocal cur, cur_tokens
+        if cur:
+            out.append((cur_heading, "\n\n".join(cur)))
+        cur, cur_tokens = [], 0
+
+    for kind, heading, body in _blocks(text):
+        if heading != cur_heading:
+            # a heading immediately followed by a sub-heading stays with it
+            if not (len(cur) == 1 and cur[0] == cur_heading):
+                flush()
+            cur_heading = heading
+        t = count_tokens(body)
+        if t > max_tokens:
+            flush()
+            parts = _split_table(body, max_tokens) if kind == "table" else _split_long_text(body, max_tokens, overlap_tokens)
+            for i, part in enumerate(parts):
+                # continuation pieces repeat the section heading for retrieval context
+                if i and heading and not part.startswith(heading):
+                    part = f"{heading}\n{part}"
+                out.append((heading, part))
+            continue
+        if cur and cur_tokens + t > max_tokens:
+            flush()
+            if heading and body != heading:
+                cur, cur_tokens = [heading], count_tokens(heading)
+        cur.append(body)
+        cur_tokens += t
+    flush()
+    return [(h, c) for h, c in out if c.strip()]
+
+
+def doc_hash(doc: Document, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> str:
+    md = doc.metadata or {}
+    h = hashlib.sha256()
+    for part in (
+        f"v{CHUNKER_VERSION}:{max_tokens}:{overlap_tokens}",
+        str(md.get("source") or md.get("url") or ""),
+        str(md.get("page") if md.get("page") is not None else md.get("pdf_page")),
+        doc.page_content,
+    ):
+        h.update(part.encode("utf-8", "replace"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ChunkCache:
+    """JSON file mapping document content hash -> list of {"id", "section", "text"}.
+
+    The file is shared by refresh and crawl runs: save() merges this run's
+    entries into what is on disk and evicts entries no run has used for
+    max_age_s, so documents that disappeared from the sources do not accumulate
+    and one job does not drop the other's splits.
+    """
+
+    def __init__(self, path: Path = CHUNK_CACHE_PATH, max_age_s: float = CHUNK_CACHE_MAX_AGE_S):
+        self.path = Path(path)
+        self.max_age_s = max_age_s
+        self._used: Dict[str, List[Dict[str, str]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._entries, _ = self._read()
+
+    def _read(self) -> Tuple[Dict[str, List[Dict[str, str]]], Dict[str, float]]:
+        """(docs, last-used timestamps) from the file; empty if missing, unreadable or from another CHUNKER_VERSION."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CHUNKER_VERSION:
+                return data.get("docs", {}), data.get("used", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("chunk cache unreadable, ignoring: %s (%s)", self.path, e)
+        return {}, {}
+
+    def get(self, key: str) -> Optional[List[Dict[str, str]]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._used[key] = entry
+        return entry
+
+    def put(self, key: str, chunks: List[Dict[str, str]]) -> None:
+        self._entries[key] = chunks
+        self._used[key] = chunks
+
+    def save(self) -> None:
+        now = time.time()
+        # re-read: another job may have saved since this run loaded the cache
+        docs, used = self._read()
+        # entries written before timestamps were kept start their max_age_s now
+        keep = {k: used.get(k, now) for k in docs if now - used.get(k, now) <= self.max_age_s}
+        docs = {k: docs[k] for k in keep}
+        docs.update(self._used)
+        keep.update(dict.fromkeys(self._used, now))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex[:6]}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CHUNKER_VERSION, "docs": docs, "used": keep}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def chunk_document(
+    doc: Document,
+    cache: Optional[ChunkCache] = None,
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> List[Document]:
+    key = doc_hash(doc, max_tokens, overlap_tokens)
+    entries = cache.get(key) if cache is not None else None
+    if entries is None:
+        entries = [
+            {"id": hashlib.sha1(f"{key}:{i}".encode()).hexdigest(), "section": heading, "text": text}
+            for i, (heading, text) in enumerate(split_text(doc.page_content, max_tokens, overlap_tokens))
+        ]
+        if cache is not None:
+            cache.put(key, entries)
+    out = []
+    for e in entries:
+        md = dict(doc.metadata or {})
+        md.update({"chunk_id": e["id"], "doc_hash": key})
+        if e["section"]:
+            md["section"] = e["section"]
+        out.append(Document(page_content=e["text"], metadata=md))
+    return out
+
+
+def chunk_documents(
+    docs: Iterable[Document],
+    cache: Optional[ChunkCache] | str = "default",
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> List[Document]:
+    """Chunk every document; pass cache=None to skip the on-disk split cache."""
+    own_cache = cache == "default"
+    if own_cache:
+        cache = ChunkCache()
+    chunks: List[Document] = []
+    for doc in docs:
+        chunks.extend(chunk_document(doc, cache, max_tokens, overlap_tokens))
+    if own_cache:
+        cache.save()
+        logger.info("chunker: chunks=%d cache_hits=%d cache_misses=%d", len(chunks), cache.hits, cache.misses)
+    return chunks
+
+
+__all__ = ["ChunkCache", "chunk_document", "chunk_documents", "count_tokens", "split_text"]
@@ -0,0 +1,654 @@
+"""Polite concurrent site crawler (jobs/crawl.py).
+
+    crawler = Crawler(indexed=set(vs.docstore._dict))   # seeds: config.URLS in scope + every scope host's sitemaps
+    for page in crawler.iter_pages():        # CrawledPage objects, streamed while the crawl runs
+        ...                                  # load -> split -> embed (rag_store.load_crawled)
+    remove_chunks(vs, crawler.superseded(sources))      # old chunks of changed pages
+    crawler.commit(chunk_ids, index_version) # after the pages are indexed and published
+
+Scope is CRAWL_SCOPE (host -> path prefixes), intersected with ALLOWED via
+is_allowed_websites when ALLOWED is non-empty. URLs are normalized before
+they enter the frontier (lowercase host, no fragment / default port /
+trailing slash / tracking parameters, sorted query), so every page is
+fetched once per crawl.
+
+Politeness: robots.txt is honoured (Disallow and Crawl-delay), each host gets
+CRAWL_HOST_CONCURRENCY requests in flight and at most CRAWL_RATE_PER_HOST
+requests/s, and <meta name="robots"> nofollow/noindex is respected.
+
+State (CRAWL_STATE_PATH) keeps each page's ETag / Last-Modified / content
+hash and outgoing links. Known pages are re-checked with conditional
+requests; a 304, an unchanged hash or a sitemap <lastmod> older than the
+last fetch means the page is not emitted again, but its stored links still
+feed the frontier. Validators only become "known" on commit(), i.e. once the
+caller has indexed the pages, so a crash never loses content. Entries also
+keep the page's indexed chunk ids: a page only counts as known while those
+are in the index (indexed=...), so an index rebuilt without the crawled
+chunks gets them back on the next crawl. resume=True
+restarts an interrupted crawl from its saved frontier.
+
+Pages that jobs/refresh.py loads itself (config.URLS / PDF_URLS) are owned by
+refresh: they are still fetched for their links but never emitted, so the two
+jobs do not keep replacing each other's chunks of the same URL.
+
+PDFs are streamed into the content-addressed store (service/pdf_store.py).
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from datetime import datetime
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Awaitable, Callable, Container, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+from config import (
+    ALLOWED, URLS, PDF_URLS, CRAWL_SCOPE, CRAWL_STATE_PATH, CRAWL_CONCURRENCY, CRAWL_HOST_CONCURRENCY,
+    CRAWL_RATE_PER_HOST, CRAWL_MAX_PAGES, CRAWL_USER_AGENT,
+)
+from service.pdf_store import pdf_store
+from service.term_miner import html_to_text
+from service.utils import PDF_URL_RE, is_allowed_websites
+
+logger = logging.getLogger(__name__)
+
+_TRACKING_PARAM = re.compile(r"^(utm_\w+|fbclid|gclid|cb)$", re.I)
+_SKIP_EXT = re.compile(r"\.(png|jpe?g|gif|webp|svg|ico|css|js|json|woff2?|ttf|zip|mp3|mp4|docx?|xlsx?|pptx?)$", re.I)
+_MAX_SITEMAP_DEPTH = 3
+_SAVE_EVERY = 50      # pages between state saves
+_DONE = object()
+
+
+# ---------- URLs ----------
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """Canonical form used for frontier dedup; None for non-http(s) or malformed URLs."""
+    try:
+        p = urlparse(urljoin(base, url.strip()) if base else url.strip())
+        if p.scheme not in ("http", "https") or not p.hostname:
+            return None
+        host = p.hostname.lower()
+        port = p.port
+    except ValueError:
+        return None
+    netloc = host if port is None or (p.scheme, port) in (("http", 80), ("https", 443)) else f"{host}:{port}"
+    path = re.sub(r"/{2,}", "/", p.path or "/")
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(p.query, keep_blank_values=True) if not _TRACKING_PARAM.match(k)))
+    return urlunparse((p.scheme, netloc, path, "", query, ""))
+
+
+def in_scope(url: str, scope: Dict[str, Sequence[str]] = CRAWL_SCOPE) -> bool:
+    p = urlparse(url)
+    prefixes = scope.get((p.hostname or "").lower())
+    if not prefixes or not any((p.path or "/").startswith(pre) for pre in prefixes):
+        return False
+    if _SKIP_EXT.search(p.path):
+        return False
+    return not ALLOWED or is_allowed_websites(url)
+
+
+def is_pdf_url(url: str) -> bool:
+    return bool(PDF_URL_RE.search(url))
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    """Sitemap <lastmod> (W3C datetime) -> epoch seconds."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+# ---------- HTML ----------
+class _LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links: List[str] = []
+        self.title = ""
+        self.nofollow = False
+        self.noindex = False
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag in ("a", "area") and a.get("href") and "nofollow" not in (a.get("rel") or ""):
+            self.links.append(a["href"])
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "meta" and (a.get("name") or "").lower() == "robots":
+            content = (a.get("content") or "").lower()
+            self.nofollow |= "nofollow" in content or "none" in content
+            self.noindex |= "noindex" in content or "none" in content
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+
+def parse_html(url: str, html: str) -> Tuple[str, str, List[str], bool]:
+    """(title, text, normalized links, indexable) for one page."""
+    p = _LinkParser()
+    try:
+        p.feed(html)
+    except Exception:
+        pass
+    links = [] if p.nofollow else [u for u in (normalize_url(h, base=url) for h in p.links) if u]
+    return p.title.strip(), html_to_text(html), links, not p.noindex
+
+
+# ---------- state ----------
+class CrawlState:
+    """{"version": 1, "index_version", "pages": {url: entry}, "run": {"started", "complete", "pending": [...], "fetched": {url: entry}}}
+
+    entry = {"kind", "etag", "last_modified", "sha256", "links", "fetched_at", "status", "chunk_ids"}
+
+    chunk_ids are the page's chunks in the index it was committed against
+    (index_version); a page whose chunks are no longer indexed is not "known".
+    """
+
+    def __init__(self, path=CRAWL_STATE_PATH):
+        self.path = Path(path)
+        self.pages: Dict[str, dict] = {}
+        self.run: dict = {}
+        self.index_version: Optional[str] = None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.pages = data.get("pages", {})
+            self.run = data.get("run", {})
+            self.index_version = data.get("index_version")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"[warn] crawl state unreadable, starting fresh: {self.path} -> {e}")
+        self._lock = threading.Lock()
+
+    def new_run(self) -> None:
+        self.run = {"started": time.strftime("%Y-%m-%dT%H:%M:%S"), "complete": False, "pending": [], "fetched": {}}
+
+    def save(self) -> None:
+        with self._lock:
+            data = json.dumps({"version": 1, "index_version": self.index_version, "pages": self.pages, "run": self.run})
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex[:6]}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+
+    def record(self, url: str, entry: dict) -> None:
+        with self._lock:
+            self.run.setdefault("fetched", {})[url] = entry
+
+    def commit(self, chunk_ids: Optional[Dict[str, Sequence[str]]] = None, index_version: Optional[str] = None) -> int:
+        """Make this run's fetched pages known (their validators are used from now on); returns how many.
+
+        chunk_ids: {url: indexed chunk ids} for the pages that were indexed; other
+        new/changed pages are recorded with none, unchanged ones keep theirs.
+        """
+        with self._lock:
+            fetched = self.run.get("fetched") or {}
+            for url, entry in fetched.items():
+                if chunk_ids is not None and url in chunk_ids:
+                    entry["chunk_ids"] = sorted(chunk_ids[url])
+                elif entry.get("status") != "unchanged":
+                    entry["chunk_ids"] = []  # fetched but nothing indexed (noindex, empty, dropped as duplicate)
+            self.pages.update(fetched)
+            self.run["fetched"] = {}
+            if index_version:
+                self.index_version = index_version
+        self.save()
+        return len(fetched)
+
+    def chunk_ids(self) -> Set[str]:
+        """Every chunk id recorded for a crawled page."""
+        with self._lock:
+            return {cid for entry in self.pages.values() for cid in entry.get("chunk_ids") or ()}
+
+
+@dataclass
+class CrawledPage:
+    url: str
+    kind: str                   # "html" or "pdf"
+    status: str                 # "new", "changed" or "unchanged" (only emitted with changed_only=False)
+    title: str = ""
+    text: str = ""              # html: page text without script/style
+    path: Optional[str] = None  # pdf: file in the content-addressed store
+    fetched_at: float = field(default_factory=time.time)
+
+
+class _Host:
+    """Per-host politeness: robots.txt, a concurrency cap and a minimum interval between requests."""
+
+    def __init__(self, concurrency: int, interval: float):
+        self.sem = asyncio.Semaphore(max(1, concurrency))
+        self.interval = interval
+        self.robots: Optional[RobotFileParser] = None
+        self.sitemaps: List[str] = []
+        self._robots_lock = asyncio.Lock()
+        self._lock = asyncio.Lock()
+        self._next_at = 0.0
+
+    async def wait_turn(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# ---------- crawler ----------
+class Crawler:
+    def __init__(
+        self,
+        seeds: Optional[Sequence[str]] = None,
+        scope: Dict[str, Sequence[str]] = CRAWL_SCOPE,
+        state_path=CRAWL_STATE_PATH,
+        concurrency: int = CRAWL_CONCURRENCY,
+        host_concurrency: int = CRAWL_HOST_CONCURRENCY,
+        rate_per_host: float = CRAWL_RATE_PER_HOST,
+        max_pages: int = CRAWL_MAX_PAGES,
+        user_agent: str = CRAWL_USER_AGENT,
+        changed_only: bool = True,
+        resume: bool = False,
+        sitemaps: bool = True,
+        timeout: float = 20.0,
+        indexed: Optional[Container[str]] = None,
+        exclude: Optional[Sequence[str]] = None,
+    ):
+        """indexed: chunk ids currently in the index; known pages whose chunks are missing
+        from it (e.g. dropped by `jobs/refresh.py --rebuild`) are fetched and emitted as new.
+        exclude: URLs indexed by another job (default: config.URLS + PDF_URLS); followed, never emitted."""
+        self.seeds = list(URLS if seeds is None else seeds)
+        self.exclude = {u for u in (normalize_url(x) for x in (list(URLS) + list(PDF_URLS) if exclude is None else exclude)) if u}
+        self.scope = scope
+        self.state = CrawlState(state_path)
+        self.concurrency = max(1, concurrency)
+        self.host_concurrency = host_concurrency
+        self.rate_per_host = rate_per_host
+        self.max_pages = max_pages
+        self.user_agent = user_agent
+        self.changed_only = changed_only
+        self.resume = resume
+        self.use_sitemaps = sitemaps
+        self.timeout = timeout
+        self.indexed = indexed
+        self.stats: Dict[str, int] = {}
+        self._stop = threading.Event()
+
+    # ----- frontier -----
+    def _count(self, key: str, n: int = 1) -> None:
+        self.stats[key] = self.stats.get(key, 0) + n
+
+    def _enqueue(self, url: str, lastmod: Optional[float] = None) -> None:
+        url = normalize_url(url)
+        if not url or url in self._seen or not in_scope(url, self.scope):
+            return
+        if len(self._seen) >= self.max_pages:
+            self._count("capped")
+            return
+        self._seen.add(url)
+        self._pending.add(url)
+        self._frontier.put_nowait((url, lastmod))
+
+    def _host(self, url: str) -> _Host:
+        host = urlparse(url).netloc
+        h = self._hosts.get(host)
+        if h is None:
+            interval = 1.0 / self.rate_per_host if self.rate_per_host > 0 else 0.0
+            h = self._hosts[host] = _Host(self.host_concurrency, interval)
+        return h
+
+    async def _fetch_text(self, session, url: str) -> Tuple[Optional[int], Optional[str]]:
+        """Small politeness-paced GET (robots.txt, sitemaps): (status, text); (None, None) on network failure."""
+        h = self._host(url)
+        try:
+            async with h.sem:
+                await h.wait_turn()
+                async with session.get(url) as r:
+                    if r.status >= 400:
+                        return r.status, None
+                    body = await r.read()
+                    status = r.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug("crawl: GET %s failed: %s", url, e)
+            return None, None
+        if body[:2] == b"\x1f\x8b":
+            body = gzip.decompress(body)
+        return status, body.decode("utf-8", errors="replace")
+
+    async def _get_text(self, session, url: str) -> Optional[str]:
+        return (await self._fetch_text(session, url))[1]
+
+    async def _robots(self, session, url: str) -> _Host:
+        h = self._host(url)
+        async with h._robots_lock:
+            if h.robots is None:
+                p = urlparse(url)
+                status, text = await self._fetch_text(session, f"{p.scheme}://{p.netloc}/robots.txt")
+                rp = RobotFileParser()
+                rp.parse((text or "").splitlines())
+                if status in (401, 403):
+                    rp.disallow_all = True  # as RobotFileParser.read(): access-restricted robots.txt means stay out
+                delay = rp.crawl_delay(self.user_agent)
+                if delay:
+                    h.interval = max(h.interval, float(delay))
+                h.sitemaps = list(rp.site_maps() or []) or [f"{p.scheme}://{p.netloc}/sitemap.xml"]
+                h.robots = rp
+                found = "forbidden (disallow all)" if rp.disallow_all else ("found" if text else "missing")
+                logger.info("crawl: %s robots.txt %s, interval %.2fs", p.netloc, found, h.interval)
+        return h
+
+    async def _sitemap(self, session, url: str, depth: int = 0) -> None:
+        text = await self._get_text(session, url)
+        if not text:
+            return
+        try:
+            root = ET.fromstring(text)
+        except ET.ParseError as e:
+            logger.warning("crawl: bad sitemap %s: %s", url, e)
+            return
+        children = []
+        for node in root:
+            tag = node.tag.rsplit("}", 1)[-1]
+            loc = lastmod = None
+            for child in node:
+                name = child.tag.rsplit("}", 1)[-1]
+                if name == "loc":
+                    loc = (child.text or "").strip()
+                elif name == "lastmod":
+                    lastmod = child.text
+            if not loc:
+                continue
+            if tag == "sitemap" and depth < _MAX_SITEMAP_DEPTH:
+                children.append(self._sitemap(session, loc, depth + 1))
+            elif tag == "url":
+                self._count("sitemap_urls")
+                self._enqueue(loc, _parse_time(lastmod))
+        if children:
+            await asyncio.gather(*children)
+
+    async def _discover_sitemaps(self, session) -> None:
+        jobs = []
+        for host in self.scope:
+            h = await self._robots(session, f"https://{host}/")
+            jobs += [self._sitemap(session, u) for u in h.sitemaps]
+        await asyncio.gather(*jobs)
+
+    # ----- fetching -----
+    def _known(self, url: str) -> dict:
+        known = self.state.pages.get(url) or {}
+        if known and self.indexed is not None:
+            ids = known.get("chunk_ids")
+            if ids is None or any(cid not in self.indexed for cid in ids):
+                self._count("not_in_index")
+                return {}
+        return known
+
+    def _unchanged(self, url: str, known: dict) -> None:
+        self._count("unchanged")
+        self.state.record(url, dict(known, checked_at=time.time()))
+        for link in known.get("links") or []:
+            self._enqueue(link)
+
+    async def _visit(self, session, url: str, lastmod: Optional[float], emit) -> None:
+        h = await self._robots(session, url)
+        if not h.robots.can_fetch(self.user_agent, url):
+            self._count("robots_blocked")
+            return
+        known = self._known(url)
+        if self.changed_only and known and lastmod and lastmod <= known.get("fetched_at", 0):
+            self._unchanged(url, known)  # sitemap says nothing changed since the last fetch: no request
+            return
+        headers = {}
+        if self.changed_only and known:
+            if known.get("etag"):
+                headers["If-None-Match"] = known["etag"]
+            if known.get("last_modified"):
+                headers["If-Modified-Since"] = known["last_modified"]
+
+        async with h.sem:
+            await h.wait_turn()
+            async with session.get(url, headers=headers) as r:
+                if r.status == 304 and known:
+                    self._unchanged(url, known)
+                    return
+                if r.status >= 400:
+                    self._count("http_errors")
+                    logger.info("crawl: %s -> HTTP %d", url, r.status)
+                    return
+                final = normalize_url(str(r.url)) or url
+                if final != url:
+                    # redirected: crawl the target once, under its own URL
+                    if final in self._seen or not in_scope(final, self.scope):
+                        self._count("redirects_skipped")
+                        return
+                    self._seen.add(final)
+                    url, known = final, self._known(final)
+                entry = {
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                    "fetched_at": time.time(),
+                }
+                ctype = r.headers.get("Content-Type", "").lower()
+                if "pdf" in ctype or (is_pdf_url(url) and "html" not in ctype):
+                    page = await self._save_pdf(r, url, known, entry)
+                elif "html" in ctype:
+                    body = await r.read()
+                    page = None
+                else:
+                    self._count("skipped_type")
+                    return
+
+        if page is None:
+            charset = r.charset or "utf-8"
+            sha = hashlib.sha256(body).hexdigest()
+            html = body.decode(charset, errors="replace")
+            # parsing is CPU work: keep the event loop free for other requests
+            title, text, links, indexable = await asyncio.get_running_loop().run_in_executor(None, parse_html, url, html)
+            status = "new" if not known.get("sha256") else ("unchanged" if known["sha256"] == sha else "changed")
+            entry.update(kind="html", sha256=sha, links=links, status=status)
+            for link in links:
+                self._enqueue(link)
+            page = CrawledPage(url, "html", status, title=title, text=text, fetched_at=entry["fetched_at"]) if indexable else None
+            if not indexable:
+                self._count("noindex")
+        if page is not None and url in self.exclude:
+            self._count("refresh_owned")
+            page = None
+        self.state.record(url, entry)
+        self._count(f"{entry['kind']}_{entry['status']}")
+        if page is not None and (page.status != "unchanged" or not self.changed_only):
+            await emit(page)
+
+    async def _save_pdf(self, r, url: str, known: dict, entry: dict) -> CrawledPage:
+        store = pdf_store()
+        tmp = store.tmp_path()
+        h = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                async for chunk in r.content.iter_chunked(65536):
+                    h.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            sha = h.hexdigest()
+            # os.replace + manifest rewrite: off the event loop
+            path, _ = await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(
+                    store.add, tmp, url, sha, size, etag=entry["etag"], last_modified=entry["last_modified"], origin="crawl"
+                )
+            )
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        status = "new" if not known.get("sha256") else ("unchanged" if known["sha256"] == sha else "changed")
+        entry.update(kind="pdf", sha256=sha, links=[], status=status)
+        return CrawledPage(url, "pdf", status, path=path, fetched_at=entry["fetched_at"])
+
+    async def _worker(self, session, emit) -> None:
+        while True:
+            url, lastmod = await self._frontier.get()
+            if self._stop.is_set():
+                self._frontier.task_done()  # stays in _pending for resume
+                continue
+            try:
+                await self._visit(session, url, lastmod, emit)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                self._count("fetch_errors")
+                logger.info("crawl: %s failed: %s", url, e)
+            except Exception as e:
+                self._count("fetch_errors")
+                logger.warning("crawl: %s failed: %s", url, e, exc_info=True)
+            finally:
+                self._pending.discard(url)
+                self._visited += 1
+                if self._visited % _SAVE_EVERY == 0:
+                    self._save()
+                self._frontier.task_done()
+
+    def _save(self) -> None:
+        self.state.run["pending"] = sorted(self._pending)
+        self.state.save()
+
+    # ----- entry points -----
+    async def run(self, emit: Callable[[CrawledPage], Awaitable[None]]) -> Dict[str, int]:
+        """Crawl until the frontier is empty, awaiting emit(page) for every new or changed page."""
+        self._frontier: asyncio.Queue = asyncio.Queue()
+        self._seen: Set[str] = set()
+        self._pending: Set[str] = set()
+        self._hosts: Dict[str, _Host] = {}
+        self._visited = 0
+        t0 = time.perf_counter()
+
+        if self.resume and self.state.run and (self.state.run.get("pending") or self.state.run.get("fetched")):
+            # pages fetched but never committed were not indexed: fetch them again
+            seeds = list(self.state.run.get("pending") or []) + list(self.state.run.get("fetched") or {})
+            self.state.run["fetched"] = {}
+            logger.info("crawl: resuming run from %s with %d queued urls", self.state.run.get("started"), len(seeds))
+        else:
+            self.state.new_run()
+            seeds = self.seeds
+        for u in seeds:
+            self._enqueue(u)
+
+        headers = {"User-Agent": self.user_agent}
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(headers=headers, timeout=timeout, connector=connector) as session:
+            workers = [asyncio.create_task(self._worker(session, emit)) for _ in range(self.concurrency)]
+            try:
+                if self.use_sitemaps:
+                    await self._discover_sitemaps(session)
+                await self._frontier.join()
+            finally:
+                for w in workers:
+                    w.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        self.state.run["complete"] = not self._stop.is_set() and not self._pending
+        self._save()
+        self.stats["seen"] = len(self._seen)
+        self.stats["elapsed_s"] = round(time.perf_counter() - t0, 3)
+        logger.info("crawl: done %s", self.stats)
+        return self.stats
+
+    def iter_pages(self, buffer: int = 64) -> Iterator[CrawledPage]:
+        """Run the crawl on a background event loop and yield pages as they arrive.
+
+        At most `buffer` pages wait for the consumer; beyond that the crawl
+        pauses, so a slow embedder applies back-pressure instead of piling up pages.
+        """
+        q: "queue.Queue" = queue.Queue(maxsize=buffer)
+        errors: List[BaseException] = []
+
+        def _runner():
+            loop = asyncio.new_event_loop()
+
+            async def emit(page):
+                await loop.run_in_executor(None, q.put, page)
+
+            try:
+                loop.run_until_complete(self.run(emit))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                loop.close()
+                q.put(_DONE)
+
+        self._stop.clear()
+        t = threading.Thread(target=_runner, name="crawler", daemon=True)
+        t.start()
+        try:
+            while True:
+                item = q.get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            # consumer stopped early: let the loop wind down (remaining URLs stay pending for resume)
+            self._stop.set()
+            while t.is_alive():
+                try:
+                    if q.get(timeout=0.5) is _DONE:
+                        break
+                except queue.Empty:
+                    pass
+            t.join()
+        if errors:
+            raise errors[0]
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def owns(self, source: str) -> bool:
+        """True if chunks cited by `source` belong to the crawl (a crawled URL that refresh does not load)."""
+        url = normalize_url(source) if source else None
+        return url is not None and url in self.state.pages and url not in self.exclude
+
+    def superseded(self, sources: Dict[str, Set[str]]) -> List[str]:
+        """Previously indexed chunk ids of this run's new/changed pages that they no longer produce.
+
+        sources is {url: chunk ids} as filled in by rag_store.ingest(sources=...);
+        pages that produced nothing this time (now noindex, empty) lose all their old chunks.
+        """
+        stale: List[str] = []
+        for url, entry in (self.state.run.get("fetched") or {}).items():
+            if entry.get("status") == "unchanged" and url not in self.exclude:
+                continue
+            # refresh-owned pages give up whatever an earlier crawl indexed for them
+            current = set() if url in self.exclude else sources.get(url, set())
+            stale += [cid for cid in (self.state.pages.get(url) or {}).get("chunk_ids") or () if cid not in current]
+        return stale
+
+    def commit(self, chunk_ids: Optional[Dict[str, Sequence[str]]] = None, index_version: Optional[str] = None) -> int:
+        """Call after the emitted pages are indexed (and published); unchanged pages are skipped from then on."""
+        chunk_ids = dict(chunk_ids or {})
+        chunk_ids.update((url, []) for url in (self.state.run.get("fetched") or {}) if url in self.exclude)
+        return self.state.commit(chunk_ids, index_version)
+
+
+__all__ = ["CrawlState", "CrawledPage", "Crawler", "in_scope", "normalize_url", "parse_html"]
@@ -0,0 +1,180 @@
+"""Near-duplicate chunk elimination (MinHash over word shingles + LSH banding).
+
+Runs between split_docs and embedding so near-identical inputs (e.g.
+ResidentialGuidelines.pdf vs ResidentialGuidelines_1.pdf, or navigation text
+repeated on every web page) are embedded once. The kept chunk remembers every
+other source it was seen in under metadata["duplicate_sources"], so citations
+still point at all of them.
+
+Usage:
+
+    from service.dedup import dedup_chunks
+    kept, stats = dedup_chunks(chunks)   # stats == {"kept": ..., "dropped": ...}
+
+Streaming callers can use ChunkDeduper directly:
+
+    deduper = ChunkDeduper()
+    for chunk in chunks:
+        if deduper.add(chunk):
+            ...  # first time this text was seen -> embed it
+
+With keep_docs=False the deduper holds only signatures and chunk ids (not
+the chunks), and duplicate sources are collected in deduper.duplicates
+({kept chunk_id: [refs]}) for the caller to apply once the kept chunks are
+indexed (rag_store.ingest).
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from config import DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_SHINGLE_SIZE, DEDUP_THRESHOLD
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _shingles(text: str, size: int) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _source_ref(doc: Document) -> Dict[str, object]:
+    md = doc.metadata or {}
+    return {
+        "source": md.get("source") or md.get("url") or "unknown",
+        "page": md.get("page") if md.get("page") is not None else md.get("pdf_page"),
+    }
+
+
+class ChunkDeduper:
+    """Incremental near-duplicate filter.
+
+    - Exact duplicates (same normalized text) are caught by a content hash.
+    - Near duplicates are found through LSH bands of the MinHash signature and
+      confirmed when the estimated Jaccard similarity is >= threshold.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = DEDUP_NUM_PERM,
+        bands: int = DEDUP_BANDS,
+        shingle_size: int = DEDUP_SHINGLE_SIZE,
+        seed: int = 1,
+        keep_docs: bool = True,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._exact: Dict[str, int] = {}
+        self._signatures: List[np.ndarray] = []
+        self.keep_docs = keep_docs
+        self._kept: List[Document] = []
+        self._kept_refs: List[Dict[str, object]] = []
+        self._kept_ids: List[Optional[str]] = []
+        self.duplicates: Dict[str, List[Dict[str, object]]] = {}
+        self.dropped = 0
+
+    @property
+    def kept(self) -> int:
+        return len(self._kept_refs)
+
+    def stats(self) -> Dict[str, int]:
+        return {"kept": self.kept, "dropped": self.dropped}
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = _shingles(text, self.shingle_size)
+        if not shingles:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hv = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        # (a * x + b) mod p, one row per permutation; overflow wraps, which is fine for hashing
+        with np.errstate(over="ignore"):
+            phv = (np.outer(self._a, hv) + self._b[:, None]) % _MERSENNE_PRIME
+        return (phv & _MAX_HASH).min(axis=1)
+
+    def _find_match(self, sig: np.ndarray) -> Optional[int]:
+        seen = set()
+        for band in range(self.bands):
+            key = sig[band * self.rows:(band + 1) * self.rows].tobytes()
+            for idx in self._buckets[band].get(key, ()):
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                if float(np.mean(self._signatures[idx] == sig)) >= self.threshold:
+                    return idx
+        return None
+
+    def _record_duplicate(self, idx: int, dup: Document) -> None:
+        ref = _source_ref(dup)
+        if ref == self._kept_refs[idx]:
+            return
+        if self.keep_docs:
+            refs = self._kept[idx].metadata.setdefault("duplicate_sources", [])
+        else:
+            refs = self.duplicates.setdefault(self._kept_ids[idx], [])
+        if ref not in refs:
+            refs.append(ref)
+
+    def add(self, doc: Document) -> bool:
+        """Return True if doc is new (keep it), False if it duplicates a kept chunk.
+
+        A dropped chunk's source/page is appended to the kept chunk's
+        metadata["duplicate_sources"].
+        """
+        text = " ".join(_WORD_RE.findall(doc.page_content.lower()))
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        idx = self._exact.get(digest)
+        sig = None
+        if idx is None:
+            sig = self.signature(text)
+            idx = self._find_match(sig)
+        if idx is not None:
+            self._record_duplicate(idx, doc)
+            self.dropped += 1
+            return False
+
+        idx = len(self._kept_refs)
+        if self.keep_docs:
+            self._kept.append(doc)
+        self._kept_refs.append(_source_ref(doc))
+        self._kept_ids.append((doc.metadata or {}).get("chunk_id"))
+        self._signatures.append(sig)
+        self._exact[digest] = idx
+        for band in range(self.bands):
+            key = sig[band * self.rows:(band + 1) * self.rows].tobytes()
+            self._buckets[band].setdefault(key, []).append(idx)
+        return True
+
+    def kept_docs(self) -> List[Document]:
+        return list(self._kept)
+
+
+def dedup_chunks(chunks: Iterable[Document], **kwargs) -> Tuple[List[Document], Dict[str, int]]:
+    """Drop near-duplicate chunks. Returns (kept_chunks, {"kept": n, "dropped": m})."""
+    deduper = ChunkDeduper(**kwargs)
+    kept = [c for c in chunks if deduper.add(c)]
+    return kept, deduper.stats()
+
+
+__all__ = ["ChunkDeduper", "dedup_chunks"]
@@ -0,0 +1,225 @@
+"""Persistent, content-addressed embedding cache for the embedding service.
+
+Key: sha256(model path, backend, quantize, embedding_type, text), so int8 /
+ONNX vectors never answer for fp32 torch ones. Vectors live in a
+memory-mapped float32 file (one fixed slot per entry) with a parallel uint64
+tag file holding a checksum of the key in each slot; a small SQLite table maps
+key -> slot and tracks last use for LRU eviction once the size limit is hit.
+
+    cache = EmbeddingCache("data/embedding_cache", max_bytes=512 * 1024 * 1024)
+    found = cache.get_many(keys)          # {key: np.ndarray}, refreshes LRU order
+    cache.put_many(missing_keys, vectors)
+    cache.stats()                         # hits, misses, hit_rate, bytes_used, ...
+
+Several worker processes can share one cache directory:
+
+- all writes (slot allocation, eviction, reset) run inside one
+  BEGIN IMMEDIATE transaction, and meta is re-read under it;
+- the slot files are sized on first put (capacity = max_bytes // (dim * 4)).
+  A vector of a different dimension resets the cache into a new generation of
+  files (named in meta), so other processes' mappings are never truncated;
+- a writer reusing a slot clears its tag, writes the vector, then sets the
+  new tag. A reader copies the vector and only accepts it if the tag still
+  matches its key, so a concurrent eviction reads as a miss, never as
+  another key's vector.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(model: str, embedding_type: str, text: str, backend: str = "torch", quantize: Optional[str] = None) -> str:
+    h = hashlib.sha256()
+    for part in (model, backend or "torch", quantize or "none", embedding_type, text):
+        h.update(part.encode("utf-8", "replace"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _tag(key: str) -> int:
+    # 64-bit checksum of the key; 0 marks a slot being rewritten
+    return int(key[:16], 16) or 1
+
+
+class EmbeddingCache:
+    def __init__(self, path, max_bytes: int):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path / "index.sqlite"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("BEGIN IMMEDIATE")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER UNIQUE, last_used REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_used)")
+        self._db.execute("COMMIT")
+        self._vectors: Optional[np.memmap] = None
+        self._tags: Optional[np.memmap] = None
+        self._file: Optional[str] = None
+        self.dim = 0
+        self.capacity = 0
+        self.hits = 0
+        self.misses = 0
+        if self._meta("dim") and not self._attach():
+            # repaired (under the write lock) by the next put_many
+            logger.warning("embedding cache: vector file missing or resized in %s", self.path)
+
+    # ---------- storage ----------
+    def _meta(self, k: str) -> Optional[str]:
+        row = self._db.execute("SELECT v FROM meta WHERE k = ?", (k,)).fetchone()
+        return row[0] if row else None
+
+    def _attach(self) -> bool:
+        """Map the slot files meta currently names (possibly written by another process)."""
+        dim, capacity, name = self._meta("dim"), self._meta("capacity"), self._meta("file")
+        if not (dim and capacity and name):
+            self._vectors = self._tags = None
+            return False
+        dim, capacity = int(dim), int(capacity)
+        if self._vectors is not None and name == self._file:
+            return True
+        vec_path, tag_path = self.path / f"{name}.f32", self.path / f"{name}.tags"
+        if not (vec_path.exists() and tag_path.exists()
+                and vec_path.stat().st_size == dim * capacity * 4 and tag_path.stat().st_size == capacity * 8):
+            self._vectors = self._tags = None
+            return False
+        self._vectors = np.memmap(vec_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+        self._tags = np.memmap(tag_path, dtype=np.uint64, mode="r+", shape=(capacity,))
+        self._file, self.dim, self.capacity = name, dim, capacity
+        return True
+
+    def _reset(self, dim: int) -> None:
+        """New, empty generation of slot files. Caller holds the write transaction (no commit here)."""
+        capacity = max(1, self.max_bytes // (dim * 4))
+        old = self._meta("file")
+        name = f"vectors-{time.time_ns()}"
+        np.memmap(self.path / f"{name}.f32", dtype=np.float32, mode="w+", shape=(capacity, dim)).flush()
+        np.memmap(self.path / f"{name}.tags", dtype=np.uint64, mode="w+", shape=(capacity,)).flush()
+        self._db.execute("DELETE FROM entries")
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            [("dim", str(dim)), ("capacity", str(capacity)), ("file", name)],
+        )
+        self._vectors = self._tags = None
+        self._file = None
+        if not self._attach():
+            raise RuntimeError(f"embedding cache: could not open new slot files in {self.path}")
+        # stale generations (and the pre-generation vectors.f32); mappings held by other processes stay valid
+        for f in list(self.path.glob("vectors*.f32")) + list(self.path.glob("vectors*.tags")):
+            if f.stem != name and (old is None or f.stem == old or f.stem == "vectors"):
+                try:
+                    f.unlink()
+                except OSError:
+                    pass
+
+    def _free_slots(self, n: int) -> List[int]:
+        # slots are handed out contiguously and only freed by eviction (which reuses
+        # them immediately) or a reset, so the used slots are always 0..used-1
+        used = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        slots: List[int] = list(range(used, min(self.capacity, used + n)))
+        if len(slots) < n:
+            # evict least recently used entries and reuse their slots
+            victims = self._db.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (n - len(slots),)
+            ).fetchall()
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in victims])
+            slots += [s for _, s in victims]
+        return slots
+
+    # ---------- public API ----------
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        if not keys:
+            return {}
+        with self._lock:
+            if not self._attach():
+                self.misses += len(keys)
+                return {}
+            found: Dict[str, np.ndarray] = {}
+            uniq = list(dict.fromkeys(keys))
+            for i in range(0, len(uniq), 500):
+                part = uniq[i:i + 500]
+                q = "SELECT key, slot FROM entries WHERE key IN (%s)" % ",".join("?" * len(part))
+                for key, slot in self._db.execute(q, part):
+                    if slot >= self.capacity:
+                        continue
+                    vec = np.array(self._vectors[slot])
+                    # checked after the copy: a slot being reused by another process reads as a miss
+                    if int(self._tags[slot]) == _tag(key):
+                        found[key] = vec
+            if found:
+                now = time.time()
+                self._db.execute("BEGIN")
+                self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._db.execute("COMMIT")
+            hits = sum(1 for k in keys if k in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+            return found
+
+    def put_many(self, keys: Sequence[str], vectors) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        with self._lock:
+            # serialize slot allocation with other processes sharing the cache (multi-worker serving)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # meta as of now, under the lock: another worker may have created or reset the files
+                if not self._attach() or vectors.shape[1] != self.dim:
+                    logger.info("embedding cache: new slot files (dim=%d) in %s", vectors.shape[1], self.path)
+                    self._reset(int(vectors.shape[1]))
+                rows = {}
+                for k, v in zip(keys, vectors):
+                    rows[k] = v
+                existing = set()
+                uniq = list(rows)
+                for i in range(0, len(uniq), 500):
+                    part = uniq[i:i + 500]
+                    q = "SELECT key FROM entries WHERE key IN (%s)" % ",".join("?" * len(part))
+                    existing.update(r[0] for r in self._db.execute(q, part))
+                new_keys = [k for k in uniq if k not in existing][: self.capacity]
+                slots = self._free_slots(len(new_keys))
+                now = time.time()
+                for k, slot in zip(new_keys, slots):
+                    self._tags[slot] = 0
+                    self._vectors[slot] = rows[k]
+                    self._tags[slot] = _tag(k)
+                self._vectors.flush()
+                self._tags.flush()
+                self._db.executemany(
+                    "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    [(k, s, now) for k, s in zip(new_keys, slots)],
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "capacity": self.capacity,
+                "dim": self.dim,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bytes_used": entries * self.dim * 4,
+                "max_bytes": self.max_bytes,
+            }
+
+
+__all__ = ["EmbeddingCache", "cache_key"]
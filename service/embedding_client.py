@@ -0,0 +1,59 @@
+"""HTTP client for the embedding service (service/embedding_gen_service.py).
+
+Asks for a binary response (see service/embedding_codec.py) and decodes it
+straight into a numpy array; falls back to JSON when fmt="json" or when the
+server answers with JSON anyway.
+
+Usage:
+
+    from service.embedding_client import EmbeddingClient
+    client = EmbeddingClient()                       # EMBED_SERVICE_URL, raw float32
+    vecs = client.embed(["text a", "text b"])        # np.ndarray, shape (2, dim)
+    q = client.embed(["question?"], embedding_type="query")
+"""
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+import numpy as np
+import requests
+
+from config import EMBED_SERVICE_URL
+from service.embedding_codec import FORMATS, JSON_MIME, decode_embeddings
+
+
+class EmbeddingClient:
+    def __init__(
+        self,
+        base_url: str = EMBED_SERVICE_URL,
+        fmt: str = "raw",
+        dtype: str = "float32",
+        session: Optional[requests.Session] = None,
+        timeout: float = 120.0,
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"fmt must be one of {tuple(FORMATS)}")
+        self.base_url = base_url.rstrip("/")
+        self.fmt = fmt
+        self.dtype = dtype
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    def embed(self, texts: Sequence[str], embedding_type: str = "documents", output_dim: Optional[int] = None) -> np.ndarray:
+        """Return a (len(texts), dim) array. Binary responses are read-only views over the body.
+
+        output_dim asks the service for truncated, re-normalized (Matryoshka) vectors.
+        """
+        payload = {"texts": list(texts), "embedding_type": embedding_type, "dtype": self.dtype}
+        if output_dim:
+            payload["output_dim"] = int(output_dim)
+        headers = {"Accept": FORMATS[self.fmt]}
+        r = self.session.post(f"{self.base_url}/embed", json=payload, headers=headers, timeout=self.timeout)
+        r.raise_for_status()
+        ctype = r.headers.get("Content-Type", JSON_MIME)
+        if ctype.split(";", 1)[0].strip() == JSON_MIME:
+            return np.asarray(r.json()["embeddings"], dtype=np.float32)
+        return decode_embeddings(r.content, ctype)
+
+
+__all__ = ["EmbeddingClient"]
@@ -0,0 +1,101 @@
+"""Wire formats for embedding matrices returned by the embedding service.
+
+JSON stays the default. Clients that send one of these Accept types get a
+compact binary body instead:
+
+    application/json             {"embeddings": [[...], ...], ...}  (default)
+    application/octet-stream     16-byte header + raw little-endian matrix
+    application/x-npy            NumPy .npy file
+    application/msgpack          {"shape": [n, d], "dtype": "float32", "data": <bytes>}  (needs msgpack)
+
+Raw header layout (little-endian): b"EMB1", uint8 dtype code (0=float32,
+1=float16), 3 pad bytes, uint32 rows, uint32 dim. Binary responses also carry
+X-Embedding-Shape ("n,d") and X-Embedding-Dtype headers.
+
+decode_embeddings() returns a read-only numpy view over the response body
+(no per-float parsing, no copy).
+"""
+from __future__ import annotations
+
+import io
+import struct
+from typing import Tuple
+
+import numpy as np
+
+JSON_MIME = "application/json"
+RAW_MIME = "application/octet-stream"
+NPY_MIME = "application/x-npy"
+MSGPACK_MIME = "application/msgpack"
+SUPPORTED_MIMES = (JSON_MIME, RAW_MIME, NPY_MIME, MSGPACK_MIME)
+FORMATS = {"json": JSON_MIME, "raw": RAW_MIME, "npy": NPY_MIME, "msgpack": MSGPACK_MIME}
+
+RAW_MAGIC = b"EMB1"
+_RAW_HEADER = struct.Struct("<4sB3xII")
+_DTYPE_CODES = {"float32": 0, "float16": 1}
+_CODE_DTYPES = {v: k for k, v in _DTYPE_CODES.items()}
+DTYPES = tuple(_DTYPE_CODES)
+
+
+def _le(dtype: str) -> np.dtype:
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"dtype must be one of {DTYPES}")
+    return np.dtype(dtype).newbyteorder("<")
+
+
+def encode_embeddings(arr: np.ndarray, mime: str, dtype: str = "float32") -> Tuple[bytes, dict]:
+    """Serialize a 2-D matrix for a binary mime type; returns (body, extra response headers)."""
+    arr = np.ascontiguousarray(np.asarray(arr), dtype=_le(dtype))
+    if arr.ndim != 2:
+        raise ValueError("expected a 2-D embedding matrix")
+    rows, dim = arr.shape
+    headers = {"X-Embedding-Shape": f"{rows},{dim}", "X-Embedding-Dtype": dtype}
+    if mime == RAW_MIME:
+        body = _RAW_HEADER.pack(RAW_MAGIC, _DTYPE_CODES[dtype], rows, dim) + arr.tobytes()
+    elif mime == NPY_MIME:
+        buf = io.BytesIO()
+        np.save(buf, arr, allow_pickle=False)
+        body = buf.getvalue()
+    elif mime == MSGPACK_MIME:
+        import msgpack
+        body = msgpack.packb({"shape": [rows, dim], "dtype": dtype, "data": arr.tobytes()}, use_bin_type=True)
+    else:
+        raise ValueError(f"unsupported binary format: {mime}")
+    return body, headers
+
+
+def decode_embeddings(body: bytes, content_type: str) -> np.ndarray:
+    """Decode a binary embedding response into a (rows, dim) array without copying the data."""
+    mime = (content_type or "").split(";", 1)[0].strip().lower()
+    if mime == RAW_MIME:
+        magic, code, rows, dim = _RAW_HEADER.unpack_from(body, 0)
+        if magic != RAW_MAGIC:
+            raise ValueError("not an embedding buffer (bad magic)")
+        dt = _le(_CODE_DTYPES[code])
+        return np.frombuffer(body, dtype=dt, count=rows * dim, offset=_RAW_HEADER.size).reshape(rows, dim)
+    if mime == NPY_MIME:
+        f = io.BytesIO(body)
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran, dt = read_header(f)
+        arr = np.frombuffer(body, dtype=dt, count=int(np.prod(shape)), offset=f.tell())
+        return arr.reshape(shape, order="F" if fortran else "C")
+    if mime == MSGPACK_MIME:
+        import msgpack
+        obj = msgpack.unpackb(body, raw=False)
+        rows, dim = obj["shape"]
+        return np.frombuffer(obj["data"], dtype=_le(obj["dtype"]), count=rows * dim).reshape(rows, dim)
+    raise ValueError(f"unsupported content type: {content_type}")
+
+
+__all__ = [
+    "DTYPES",
+    "FORMATS",
+    "JSON_MIME",
+    "MSGPACK_MIME",
+    "NPY_MIME",
+    "RAW_MIME",
+    "SUPPORTED_MIMES",
+    "decode_embeddings",
+    "encode_embeddings",
+]
@@ -1,12 +1,21 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
+import numpy as np
 import sys
 import os
 import json
+import threading
+import time
+from datetime import datetime
 from typing import List, Dict, Any
 
 # Add the django_dr1_app path to sys.path to import the embedder
 sys.path.append(os.path.join(os.path.dirname(__file__), 'django_dr1_app', 'db_action'))
 from service.embeder import QwenInstruct
+from service.batching import BATCH_SIZE_BUCKETS, BatcherClosed, MicroBatcher
+from service.embedding_codec import DTYPES, JSON_MIME, SUPPORTED_MIMES, encode_embeddings
+from service.embedding_cache import EmbeddingCache, cache_key
+from service.metrics import Counter, Histogram, render as render_metrics
+from service.matryoshka import truncate
 
 app = Flask(__name__)
 
@@ -15,123 +24,304 @@ app = Flask(__name__)
 MODEL_PATH = "../local_models/gte-Qwen2-1.5B-instruct"  # Default model path, can be changed
 embedder = None
 
+# Micro-batching: concurrent requests are coalesced into one encode call
+# of up to MAX_BATCH_SIZE texts, waiting at most MAX_WAIT_MS for the batch to fill.
+MAX_BATCH_SIZE = int(os.environ.get("EMBED_MAX_BATCH_SIZE", "32"))
+MAX_WAIT_MS = float(os.environ.get("EMBED_MAX_WAIT_MS", "5"))
+# Longest an HTTP request waits for its batch; a stuck batcher fails the request instead of hanging the thread
+REQUEST_TIMEOUT_S = float(os.environ.get("EMBED_REQUEST_TIMEOUT_S", "120"))
+# Length bucketing inside QwenInstruct: padded tokens per model forward pass
+MAX_TOKENS_PER_BATCH = int(os.environ.get("EMBED_MAX_TOKENS_PER_BATCH", "16384"))
+# Inference backend: device auto-detected unless EMBED_DEVICE is set; on CPU,
+# EMBED_BACKEND=onnx|openvino and EMBED_QUANTIZE=int8 select the optimized path
+DEVICE = os.environ.get("EMBED_DEVICE") or None
+BACKEND = os.environ.get("EMBED_BACKEND", "torch")
+QUANTIZE = os.environ.get("EMBED_QUANTIZE") or None
+NUM_THREADS = int(os.environ["EMBED_NUM_THREADS"]) if os.environ.get("EMBED_NUM_THREADS") else None
+# Persistent embedding cache keyed by (model path, backend, quantize, embedding_type, text); EMBED_CACHE_MAX_MB=0 disables it
+CACHE_DIR = os.environ.get("EMBED_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "embedding_cache"))
+CACHE_MAX_MB = float(os.environ.get("EMBED_CACHE_MAX_MB", "512"))
+cache = None
+batcher = None
+# Inference threads pulling batches from the shared queue (one model copy per process)
+INFERENCE_WORKERS = int(os.environ.get("EMBED_INFERENCE_WORKERS", "1"))
+
+# MODEL_PATH, embedder and batcher are swapped together by a background model reload (POST /config)
+_swap_lock = threading.Lock()
+_reload_state: Dict[str, Any] = {"state": "idle"}
+
+def _encode(model, texts: List[str], embedding_type: str):
+    """Run one model forward pass for a coalesced batch (called on the batcher thread)"""
+    if embedding_type == 'query':
+        return model.embed_query(texts)
+    return model.embed_documents(texts)
+
+def _serving():
+    """(model path, batcher) currently serving requests, read together"""
+    with _swap_lock:
+        return MODEL_PATH, batcher
+
+def _output_dim(data):
+    """Optional Matryoshka output_dim from the request body; None means full width"""
+    value = data.get('output_dim', request.args.get('output_dim'))
+    if value in (None, ''):
+        return None
+    value = int(value)
+    if value <= 0:
+        raise ValueError("output_dim must be a positive integer")
+    return value
+
+def embed_texts_cached(texts: List[str], embedding_type: str) -> np.ndarray:
+    """Embed through the cache: hits skip the model, misses go to the batcher and are stored"""
+    while True:
+        model_path, active = _serving()
+        try:
+            return _embed_with(model_path, active, texts, embedding_type)
+        except BatcherClosed:
+            if active is _serving()[1]:
+                raise
+            # the model was swapped while this request was waiting; retry on the new one
+
+def _embed_with(model_path: str, active: MicroBatcher, texts: List[str], embedding_type: str) -> np.ndarray:
+    if cache is None:
+        return np.asarray(active.embed(texts, embedding_type, timeout=REQUEST_TIMEOUT_S), dtype=np.float32)
+    keys = [cache_key(model_path, embedding_type, t, backend=BACKEND, quantize=QUANTIZE) for t in texts]
+    found = cache.get_many(keys)
+    missing = [i for i, k in enumerate(keys) if k not in found]
+    if missing:
+        vectors = np.asarray(active.embed([texts[i] for i in missing], embedding_type, timeout=REQUEST_TIMEOUT_S), dtype=np.float32)
+        cache.put_many([keys[i] for i in missing], vectors)
+        for i, v in zip(missing, vectors):
+            found[keys[i]] = v
+    return np.vstack([found[k] for k in keys])
+
 def initialize_embedder():
-    """Initialize the QwenInstruct embedder"""
+    """Initialize the QwenInstruct embedder (model weights only; per-process threads start in start_workers)"""
     global embedder
     try:
-        embedder = QwenInstruct(MODEL_PATH)
+        embedder = _load_model(MODEL_PATH)
         print(f"Successfully initialized QwenInstruct with model: {MODEL_PATH}")
     except Exception as e:
         print(f"Error initializing embedder: {e}")
         # Fallback to a different model or handle the error
         raise
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint that actually tests system functionality"""
-    health_status = {
-        "status": "healthy",
-        "service": "embedding-service",
-        "model": MODEL_PATH,
-        "checks": {}
-    }
-    
-    # Check 1: Embedder initialization
-    if embedder is None:
-        health_status["status"] = "unhealthy"
-        health_status["checks"]["embedder_initialized"] = {
-            "status": "failed",
-            "error": "Embedder not initialized"
-        }
-        return jsonify(health_status), 503
-    else:
-        health_status["checks"]["embedder_initialized"] = {
-            "status": "passed",
-            "message": "Embedder is initialized"
-        }
-    
-    # Check 2: Test embedding functionality
+def _load_model(model_path: str):
+    return QwenInstruct(
+        model_path,
+        max_tokens_per_batch=MAX_TOKENS_PER_BATCH,
+        device=DEVICE,
+        backend=BACKEND,
+        quantize=QUANTIZE,
+        num_threads=NUM_THREADS,
+    )
+
+def _make_batcher(model) -> MicroBatcher:
+    return MicroBatcher(
+        lambda texts, embedding_type: _encode(model, texts, embedding_type),
+        max_batch_size=MAX_BATCH_SIZE,
+        max_wait_ms=MAX_WAIT_MS,
+        on_batch=_on_batch,
+        workers=INFERENCE_WORKERS,
+    )
+
+def _reload_model(model_path: str):
+    """Load model_path next to the serving model, then swap it in and drain the old batcher"""
+    global MODEL_PATH, embedder, batcher
+    started = time.time()
     try:
-        test_text = "This is a test text for health check"
-        test_embeddings = embedder.embed_documents([test_text])
-        
-        if test_embeddings and len(test_embeddings) > 0:
-            embedding_dim = len(test_embeddings[0])
-            health_status["checks"]["embedding_functionality"] = {
-                "status": "passed",
-                "message": f"Embedding test successful, dimension: {embedding_dim}",
-                "embedding_dimension": embedding_dim
-            }
-        else:
-            health_status["status"] = "unhealthy"
-            health_status["checks"]["embedding_functionality"] = {
-                "status": "failed",
-                "error": "Embedding test returned empty result"
-            }
-            return jsonify(health_status), 503
-            
+        model = _load_model(model_path)
+        dim = len(model.embed_documents(["This is a test text for model reload"])[0])
+        with _swap_lock:
+            old_path, old_batcher = MODEL_PATH, batcher
+            MODEL_PATH, embedder = model_path, model
+            if old_batcher is not None:
+                batcher = _make_batcher(model)
+        if old_batcher is not None:
+            old_batcher.close(60)  # requests already queued finish on the old model
+        _reload_state.update(state="ready", previous=old_path, embedding_dimension=dim, seconds=round(time.time() - started, 2))
+        print(f"Model reloaded: {old_path} -> {model_path} (dimension {dim})")
     except Exception as e:
-        health_status["status"] = "unhealthy"
-        health_status["checks"]["embedding_functionality"] = {
-            "status": "failed",
-            "error": f"Embedding test failed: {str(e)}"
-        }
-        return jsonify(health_status), 503
-    
-    # Check 3: Memory usage (optional)
+        _reload_state.update(state="failed", error=str(e), seconds=round(time.time() - started, 2))
+        print(f"[warn] Model reload failed, still serving {MODEL_PATH}: {e}")
+
+def start_workers():
+    """Start this process's inference batcher, cache handle and readiness self-test.
+
+    Kept separate from initialize_embedder because threads and SQLite handles do
+    not survive fork: under gunicorn the model is loaded once in the master
+    (preload_app, weights shared copy-on-write) and this runs in each worker.
+    """
+    global batcher, cache
+    if embedder is not None and batcher is None:
+        batcher = _make_batcher(embedder)
+    if CACHE_MAX_MB > 0 and cache is None:
+        cache = EmbeddingCache(CACHE_DIR, max_bytes=int(CACHE_MAX_MB * 1024 * 1024))
+    start_self_test()
+
+def shutdown_workers(timeout: float = 30.0):
+    """Graceful shutdown: stop intake and drain in-flight and queued batches"""
+    if batcher is not None:
+        batcher.close(timeout)
+
+def create_app(start: bool = True):
+    """App factory for WSGI servers, e.g. gunicorn -c service/gunicorn_conf.py"""
+    if embedder is None:
+        try:
+            initialize_embedder()
+        except Exception as e:
+            print(f"Failed to initialize embedder: {e}")
+    if start:
+        start_workers()
+    return app
+
+# ---------- Probes & metrics ----------
+# /livez is constant-time; /readyz and /health return the cached result of a
+# background self-test that runs every READY_INTERVAL_S, so a load balancer
+# probing every few seconds never triggers a model forward pass itself.
+READY_INTERVAL_S = float(os.environ.get("EMBED_READY_INTERVAL_S", "30"))
+_ready_state: Dict[str, Any] = {"status": "starting", "checks": {}, "timestamp": None}
+_self_test_thread = None
+
+REQUESTS = Counter("embed_http_requests_total", "HTTP requests by endpoint and status", ("endpoint", "status"))
+LATENCY = Histogram("embed_http_request_seconds", "HTTP request latency", ("endpoint",))
+BATCH_SIZE = Histogram("embed_batch_size", "Texts per model forward pass", buckets=BATCH_SIZE_BUCKETS)
+BATCH_SECONDS = Histogram("embed_batch_seconds", "Model encode time per batch")
+
+def _on_batch(size: int, seconds: float):
+    BATCH_SIZE.observe(size)
+    BATCH_SECONDS.observe(seconds)
+
+def _memory_usage() -> Dict[str, Any]:
     try:
         import psutil
-        memory_info = psutil.virtual_memory()
-        health_status["checks"]["memory_usage"] = {
-            "status": "passed",
-            "message": "Memory usage normal",
-            "memory_percent": memory_info.percent,
-            "available_mb": round(memory_info.available / 1024 / 1024, 2)
+        vm = psutil.virtual_memory()
+        return {
+            "rss_bytes": psutil.Process().memory_info().rss,
+            "memory_percent": vm.percent,
+            "available_mb": round(vm.available / 1024 / 1024, 2),
         }
-        
-        # Warn if memory usage is high
-        if memory_info.percent > 90:
-            health_status["checks"]["memory_usage"]["status"] = "warning"
-            health_status["checks"]["memory_usage"]["message"] = "High memory usage detected"
-            
     except ImportError:
-        health_status["checks"]["memory_usage"] = {
-            "status": "skipped",
-            "message": "psutil not available for memory monitoring"
-        }
-    except Exception as e:
-        health_status["checks"]["memory_usage"] = {
-            "status": "failed",
-            "error": f"Memory check failed: {str(e)}"
-        }
-    
-    # Check 4: Model file accessibility
+        import resource
+        # ru_maxrss is KiB on Linux (peak, not current)
+        return {"rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+def run_self_test() -> Dict[str, Any]:
+    """Deep readiness check: embed a test sentence (bypassing the cache), model path, memory"""
+    checks: Dict[str, Any] = {}
+    status = "healthy"
+    if embedder is None or batcher is None:
+        checks["embedder_initialized"] = {"status": "failed", "error": "Embedder not initialized"}
+        status = "unhealthy"
+    else:
+        checks["embedder_initialized"] = {"status": "passed", "message": "Embedder is initialized"}
+        try:
+            t0 = time.perf_counter()
+            test_embeddings = batcher.embed(["This is a test text for health check"], "documents", timeout=120)
+            embedding_dim = len(test_embeddings[0]) if len(test_embeddings) else 0
+            if embedding_dim:
+                checks["embedding_functionality"] = {
+                    "status": "passed",
+                    "message": f"Embedding test successful, dimension: {embedding_dim}",
+                    "embedding_dimension": embedding_dim,
+                    "latency_ms": round((time.perf_counter() - t0) * 1000, 2),
+                }
+            else:
+                checks["embedding_functionality"] = {"status": "failed", "error": "Embedding test returned empty result"}
+                status = "unhealthy"
+        except Exception as e:
+            checks["embedding_functionality"] = {"status": "failed", "error": f"Embedding test failed: {str(e)}"}
+            status = "unhealthy"
+    if os.path.exists(MODEL_PATH):
+        checks["model_accessibility"] = {"status": "passed", "message": "Model path is accessible"}
+    else:
+        checks["model_accessibility"] = {"status": "failed", "error": f"Model path not found: {MODEL_PATH}"}
+        status = "unhealthy"
     try:
-        if os.path.exists(MODEL_PATH):
-            health_status["checks"]["model_accessibility"] = {
-                "status": "passed",
-                "message": "Model path is accessible"
-            }
-        else:
-            health_status["status"] = "unhealthy"
-            health_status["checks"]["model_accessibility"] = {
-                "status": "failed",
-                "error": f"Model path not found: {MODEL_PATH}"
-            }
-            return jsonify(health_status), 503
+        mem = _memory_usage()
+        checks["memory_usage"] = dict(mem, status="warning" if mem.get("memory_percent", 0) > 90 else "passed")
     except Exception as e:
-        health_status["status"] = "unhealthy"
-        health_status["checks"]["model_accessibility"] = {
-            "status": "failed",
-            "error": f"Model accessibility check failed: {str(e)}"
-        }
-        return jsonify(health_status), 503
-    
-    # Add timestamp
-    from datetime import datetime
-    health_status["timestamp"] = datetime.now().isoformat()
-    
-    return jsonify(health_status)
+        checks["memory_usage"] = {"status": "failed", "error": f"Memory check failed: {str(e)}"}
+    return {"status": status, "checks": checks, "timestamp": datetime.now().isoformat(), "checked_at": time.time()}
+
+def _self_test_loop():
+    global _ready_state
+    while True:
+        _ready_state = run_self_test()
+        time.sleep(READY_INTERVAL_S)
+
+def start_self_test():
+    global _self_test_thread
+    if _self_test_thread is None:
+        _self_test_thread = threading.Thread(target=_self_test_loop, name="embed-self-test", daemon=True)
+        _self_test_thread.start()
+
+def _readiness():
+    state = _ready_state
+    checked_at = state.get("checked_at")
+    stale = checked_at is None or time.time() - checked_at > 3 * READY_INTERVAL_S
+    ready = state.get("status") == "healthy" and not stale
+    return ready, dict(state, service="embedding-service", model=MODEL_PATH, stale=stale)
+
+_active_requests = 0
+_active_lock = threading.Lock()
+
+@app.before_request
+def _start_timer():
+    global _active_requests
+    g.request_start = time.perf_counter()
+    with _active_lock:
+        _active_requests += 1
+
+@app.teardown_request
+def _finish_request(exc=None):
+    global _active_requests
+    if getattr(g, "request_start", None) is not None:
+        with _active_lock:
+            _active_requests -= 1
+
+@app.after_request
+def _record_request(response):
+    start = getattr(g, "request_start", None)
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+    if start is not None:
+        LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+    return response
+
+@app.route('/livez', methods=['GET'])
+def livez():
+    """Liveness: the process is up and serving HTTP"""
+    return jsonify({"status": "alive"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: cached result of the periodic background self-test"""
+    ready, body = _readiness()
+    return jsonify(body), (200 if ready else 503)
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check (kept for existing callers); same cached result as /readyz"""
+    return readyz()
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text metrics: request counts/latency, batch sizes, queue depth, memory, cache"""
+    gauges: Dict[str, Any] = {"embed_ready": 1 if _readiness()[0] else 0, "embed_http_requests_in_flight": _active_requests}
+    if batcher is not None:
+        gauges["embed_queue_depth"] = batcher.queue_depth()
+    try:
+        gauges["process_resident_memory_bytes"] = _memory_usage().get("rss_bytes")
+    except Exception:
+        pass
+    if cache is not None:
+        cstats = cache.stats()
+        gauges["embed_cache_hit_rate"] = cstats["hit_rate"]
+        gauges["embed_cache_bytes_used"] = cstats["bytes_used"]
+        gauges["embed_cache_entries"] = cstats["entries"]
+    body = render_metrics(REQUESTS, LATENCY, BATCH_SIZE, BATCH_SECONDS, gauges=gauges)
+    return Response(body, mimetype="text/plain; version=0.0.4")
 
 @app.route('/embed', methods=['POST'])
 def embed_texts():
@@ -150,6 +340,13 @@ def embed_texts():
         "text_count": 3,
         "embedding_dimension": 1024
     }
+    
+    Binary responses (see service/embedding_codec.py): send
+    Accept: application/octet-stream | application/x-npy | application/msgpack
+    and optionally "dtype": "float16" in the JSON body (default float32).
+    
+    Optional "output_dim": N returns the first N components of each embedding,
+    re-normalized (Matryoshka truncation; the cache keeps full width).
     """
     try:
         # Get JSON data from request
@@ -172,15 +369,31 @@ def embed_texts():
         if not all(isinstance(text, str) for text in texts):
             return jsonify({"error": "All texts must be strings"}), 400
         
+        try:
+            output_dim = _output_dim(data)
+        except (TypeError, ValueError):
+            return jsonify({"error": "output_dim must be a positive integer"}), 400
+        
         # Check if embedder is initialized
-        if embedder is None:
+        if embedder is None or batcher is None:
             return jsonify({"error": "Embedder not initialized"}), 500
         
-        # Generate embeddings based on type
-        if embedding_type == 'query':
-            embeddings = embedder.embed_query(texts)
-        else:  # documents
-            embeddings = embedder.embed_documents(texts)
+        # Generate embeddings based on type (cache first, misses coalesced with concurrent requests)
+        embeddings = embed_texts_cached(texts, 'query' if embedding_type == 'query' else 'documents')
+        if output_dim is not None:
+            if output_dim > embeddings.shape[1]:
+                return jsonify({"error": f"output_dim must be at most {embeddings.shape[1]}"}), 400
+            embeddings = truncate(embeddings, output_dim)
+        
+        # Binary response if the client asked for one via Accept (JSON stays the default)
+        mime = request.accept_mimetypes.best_match(SUPPORTED_MIMES, default=JSON_MIME)
+        if mime != JSON_MIME:
+            dtype = data.get('dtype', request.args.get('dtype', 'float32'))
+            if dtype not in DTYPES:
+                return jsonify({"error": f"dtype must be one of {list(DTYPES)}"}), 400
+            body, headers = encode_embeddings(np.asarray(embeddings), mime, dtype)
+            headers["X-Embedding-Type"] = embedding_type
+            return Response(body, mimetype=mime, headers=headers)
         
         # Convert numpy arrays to lists for JSON serialization
         embeddings_list = [embedding.tolist() if hasattr(embedding, 'tolist') else embedding for embedding in embeddings]
@@ -206,7 +419,8 @@ def embed_single_text():
     Expected JSON input:
     {
         "text": "single text to embed",
-        "embedding_type": "documents"  # or "query"
+        "embedding_type": "documents",  # or "query"
+        "output_dim": 256               # optional, truncate + re-normalize
     }
     
     Returns:
@@ -233,15 +447,21 @@ def embed_single_text():
         if not isinstance(text, str):
             return jsonify({"error": "Text must be a string"}), 400
         
+        try:
+            output_dim = _output_dim(data)
+        except (TypeError, ValueError):
+            return jsonify({"error": "output_dim must be a positive integer"}), 400
+        
         # Check if embedder is initialized
-        if embedder is None:
+        if embedder is None or batcher is None:
             return jsonify({"error": "Embedder not initialized"}), 500
         
-        # Generate embedding based on type
-        if embedding_type == 'query':
-            embeddings = embedder.embed_query([text])
-        else:  # documents
-            embeddings = embedder.embed_documents([text])
+        # Generate embedding based on type (cache first, misses coalesced with concurrent requests)
+        embeddings = embed_texts_cached([text], 'query' if embedding_type == 'query' else 'documents')
+        if output_dim is not None:
+            if output_dim > embeddings.shape[1]:
+                return jsonify({"error": f"output_dim must be at most {embeddings.shape[1]}"}), 400
+            embeddings = truncate(embeddings, output_dim)
         
         # Get the first (and only) embedding
         embedding = embeddings[0]
@@ -258,51 +478,143 @@ def embed_single_text():
     except Exception as e:
         return jsonify({"error": f"Embedding failed: {str(e)}"}), 500
 
+@app.route('/batch_stats', methods=['GET'])
+def batch_stats():
+    """Micro-batching stats: queue depth, batch-size histogram, average wait"""
+    if batcher is None:
+        return jsonify({"error": "Embedder not initialized"}), 503
+    return jsonify(batcher.stats())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Embedding cache stats: hit rate, entries, bytes used"""
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(cache.stats(), enabled=True, path=os.path.abspath(CACHE_DIR)))
+
 @app.route('/config', methods=['GET'])
 def get_config():
     """Get current configuration"""
     return jsonify({
         "model_path": MODEL_PATH,
-        "embedder_initialized": embedder is not None
+        "embedder_initialized": embedder is not None,
+        "max_batch_size": MAX_BATCH_SIZE,
+        "max_wait_ms": MAX_WAIT_MS,
+        "max_tokens_per_batch": MAX_TOKENS_PER_BATCH,
+        "device": embedder.device if embedder is not None else DEVICE,
+        "backend": embedder.backend if embedder is not None else BACKEND,
+        "quantize": embedder.quantize if embedder is not None else QUANTIZE,
+        "num_threads": NUM_THREADS,
+        "reload": dict(_reload_state)
     })
 
 @app.route('/config', methods=['POST'])
 def update_config():
-    """Update configuration (restart required)"""
-    global MODEL_PATH
+    """
+    Switch to another model without downtime
+    
+    Expected JSON input:
+    {
+        "model_path": "../local_models/other-model"
+    }
+    
+    The new model is loaded in the background while the current one keeps
+    serving; once it has embedded a test sentence it is swapped in and the old
+    batcher drains its queue. Poll GET /config ("reload") for progress. Under
+    gunicorn this reloads the worker that received the request only; roll out
+    with a restart (HUP) instead.
+    """
     try:
         data = request.get_json()
         if not data:
             return jsonify({"error": "No JSON data provided"}), 400
         
         new_model_path = data.get('model_path')
-        if new_model_path:
-            MODEL_PATH = new_model_path
-            return jsonify({
-                "message": "Configuration updated. Please restart the service to apply changes.",
-                "new_model_path": MODEL_PATH
-            })
-        else:
+        if not new_model_path:
             return jsonify({"error": "No model_path provided"}), 400
+        
+        with _swap_lock:
+            if _reload_state.get("state") == "loading":
+                return jsonify({"error": "A model reload is already in progress", "reload": dict(_reload_state)}), 409
+            _reload_state.clear()
+            _reload_state.update(state="loading", target=new_model_path, started_at=datetime.now().isoformat())
+        threading.Thread(target=_reload_model, args=(new_model_path,), name="model-reload", daemon=True).start()
+        return jsonify({
+            "message": "Loading model in the background; the current model keeps serving until it is ready.",
+            "model_path": MODEL_PATH,
+            "new_model_path": new_model_path,
+            "reload": dict(_reload_state)
+        }), 202
             
     except Exception as e:
         return jsonify({"error": f"Configuration update failed: {str(e)}"}), 500
 
+def serve_production(host: str, port: int):
+    """Threaded WSGI server with graceful shutdown on SIGTERM/SIGINT.
+
+    Stops accepting connections, drains queued batches, then waits for
+    in-flight requests to finish writing their responses. For several
+    processes sharing one copy of the model use gunicorn with
+    service/gunicorn_conf.py instead.
+    """
+    import signal
+    from werkzeug.serving import make_server
+
+    server = make_server(host, port, app, threaded=True)
+
+    def _graceful(signum, frame):
+        print(f"Received signal {signum}: stopping intake and draining in-flight batches...")
+        # shutdown() blocks until serve_forever returns, so call it off the main thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, _graceful)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, _graceful)
+    print(f"Serving on http://{host}:{port} (production mode)")
+    try:
+        server.serve_forever()
+    finally:
+        shutdown_workers()
+        deadline = time.time() + 30
+        while _active_requests > 0 and time.time() < deadline:
+            time.sleep(0.05)
+        server.server_close()
+        print("Embedding service stopped")
+
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="QwenInstruct embedding service")
+    parser.add_argument("--serve", choices=["dev", "prod"], default="dev", help="dev: Flask dev server; prod: threaded server with graceful drain")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=4098)
+    args = parser.parse_args()
+
     # Initialize the embedder when starting the service
     try:
         initialize_embedder()
         print("Embedding service started successfully!")
         print(f"Model: {MODEL_PATH}")
         print("Available endpoints:")
-        print("  GET  /health - Health check")
+        print("  GET  /livez - Liveness probe")
+        print("  GET  /readyz - Readiness probe (cached background self-test)")
+        print("  GET  /health - Health check (same as /readyz)")
+        print("  GET  /metrics - Prometheus metrics")
         print("  POST /embed - Embed multiple texts")
         print("  POST /embed_single - Embed single text")
+        print("  GET  /batch_stats - Micro-batching stats")
+        print("  GET  /cache/stats - Embedding cache stats")
         print("  GET  /config - Get configuration")
-        print("  POST /config - Update configuration")
+        print("  POST /config - Reload another model in the background")
     except Exception as e:
         print(f"Failed to initialize embedder: {e}")
         print("Service will start but embedding endpoints will return errors")
     
-    # Run the Flask app
-    app.run(host='0.0.0.0', port=4098, debug=False)
\ No newline at end of file
+    # Inference batcher, cache and background readiness self-test
+    start_workers()
+    
+    if args.serve == "prod":
+        serve_production(args.host, args.port)
+    else:
+        # Run the Flask app
+        # threaded=True so concurrent requests can be coalesced by the batcher
+        app.run(host=args.host, port=args.port, debug=False, threaded=True)
@@ -1,30 +1,140 @@
 
 
 from sentence_transformers import SentenceTransformer
-import platform
+import logging
+import numpy as np
+import os
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "openvino")
+# file written by sentence_transformers.export_dynamic_quantized_onnx_model
+ONNX_INT8_CONFIG = "avx512_vnni"
+
+
+def detect_device() -> str:
+    """cuda if a GPU is usable, mps on Apple silicon, otherwise cpu."""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return "cuda"
+        mps = getattr(torch.backends, "mps", None)
+        if mps is not None and mps.is_available():
+            return "mps"
+    except Exception:
+        pass
+    return "cpu"
+
 
 class QwenInstruct:
-    def __init__(self, model_path):
-        #detect OS config and set device accordingly
-        if platform.system() == "Windows":
-            self.model = SentenceTransformer(model_name_or_path=model_path, trust_remote_code= True, device="cuda")
-        elif platform.system() == "Darwin":
-            self.model = SentenceTransformer(model_name_or_path=model_path, trust_remote_code= True, device="mps")
-        elif platform.system() == "Linux":
-            self.model = SentenceTransformer(model_name_or_path=model_path, trust_remote_code= True, device="cuda")
-        else:
-            self.model = SentenceTransformer(model_name_or_path=model_path, trust_remote_code= True, device="cpu")
-        print(self.model.max_seq_length)  
-        self.model.max_seq_length = 8192 
+    def __init__(
+        self,
+        model_path,
+        max_tokens_per_batch: int = 16384,
+        device: str | None = None,
+        backend: str = "torch",
+        quantize: str | None = None,
+        num_threads: int | None = None,
+    ):
+        """
+        device: "cuda" / "mps" / "cpu"; None auto-detects (no more hard-coded cuda on Linux).
+        backend: "torch", or on CPU "onnx" / "openvino" (exported on first load, needs optimum).
+        quantize: "int8" for dynamic int8 quantization on CPU (torch: Linear layers, onnx: qint8 export).
+        num_threads: intra-op CPU threads (torch and ONNX Runtime).
+        """
+        self.device = device or detect_device()
+        self.backend = backend if self.device == "cpu" else "torch"
+        self.quantize = quantize if self.device == "cpu" else None
+        if num_threads:
+            os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+            try:
+                import torch
+                torch.set_num_threads(int(num_threads))
+            except Exception:
+                pass
+        if self.backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}")
+
+        self.model = None
+        if self.backend != "torch":
+            try:
+                self.model = self._load_exported(model_path, num_threads)
+            except Exception as e:
+                logger.warning("QwenInstruct: %s backend unavailable (%s); falling back to torch", self.backend, e)
+                self.backend = "torch"
+        if self.model is None:
+            self.model = SentenceTransformer(model_name_or_path=model_path, trust_remote_code= True, device=self.device)
+            if self.quantize == "int8":
+                import torch
+                self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info("QwenInstruct: device=%s backend=%s quantize=%s threads=%s", self.device, self.backend, self.quantize, num_threads)
+        print(self.model.max_seq_length)
+        self.model.max_seq_length = 8192
+        # padded tokens per forward pass (texts in bucket * longest text in bucket)
+        self.max_tokens_per_batch = max_tokens_per_batch
+
+    def _load_exported(self, model_path, num_threads):
+        model_kwargs = {}
+        if self.backend == "onnx":
+            if num_threads:
+                import onnxruntime as ort
+                opts = ort.SessionOptions()
+                opts.intra_op_num_threads = int(num_threads)
+                model_kwargs["session_options"] = opts
+            if self.quantize == "int8":
+                qfile = os.path.join(model_path, "onnx", f"model_qint8_{ONNX_INT8_CONFIG}.onnx")
+                if not os.path.exists(qfile):
+                    from sentence_transformers import export_dynamic_quantized_onnx_model
+                    base = SentenceTransformer(model_path, trust_remote_code=True, device="cpu", backend="onnx")
+                    export_dynamic_quantized_onnx_model(base, ONNX_INT8_CONFIG, model_path)
+                model_kwargs["file_name"] = os.path.relpath(qfile, model_path)
+        elif self.quantize == "int8":
+            logger.warning("QwenInstruct: int8 is not applied to the openvino backend")
+        return SentenceTransformer(
+            model_path, trust_remote_code=True, device="cpu", backend=self.backend, model_kwargs=model_kwargs or None
+        )
+
+    def _token_lengths(self, texts: list[str]) -> list[int]:
+        enc = self.model.tokenizer(
+            texts, add_special_tokens=True, truncation=True, max_length=self.model.max_seq_length
+        )
+        return [len(ids) for ids in enc["input_ids"]]
+
+    def _encode_bucketed(self, texts: list[str], **kwargs) -> np.ndarray:
+        # Sort by token length and cut into buckets whose padded size stays under
+        # max_tokens_per_batch, so one long chunk no longer pads every short one
+        # to its length. Results are returned in the caller's order.
+        if len(texts) <= 1:
+            return self.model.encode(texts, **kwargs)
+        lengths = self._token_lengths(texts)
+        order = sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
+        out = [None] * len(texts)
+
+        def run(bucket):
+            vecs = self.model.encode([texts[i] for i in bucket], batch_size=len(bucket), **kwargs)
+            for i, v in zip(bucket, vecs):
+                out[i] = v
+
+        bucket, bucket_max = [], 0
+        for i in order:
+            # descending order: the first text in a bucket is its longest
+            if bucket and (len(bucket) + 1) * bucket_max > self.max_tokens_per_batch:
+                run(bucket)
+                bucket = []
+            if not bucket:
+                bucket_max = lengths[i]
+            bucket.append(i)
+        run(bucket)
+        return np.vstack(out)
 
     def embed_documents(self, text: [str]) -> [list[float]]:
-        #add embedding 
+        #add embedding
         text_list = text
-        embeddings = self.model.encode(text_list)
+        embeddings = self._encode_bucketed(text_list)
         return embeddings
 
     def embed_query(self, text: [str]) -> [list[float]]:
-        # special config for query. retrievel only. 
+        # special config for query. retrievel only.
         text_list = text
-        embeddings = self.model.encode(text_list,prompt_name='query')
-        return embeddings
\ No newline at end of file
+        embeddings = self._encode_bucketed(text_list, prompt_name='query')
+        return embeddings
@@ -0,0 +1,42 @@
+"""gunicorn settings for the embedding service.
+
+    gunicorn -c service/gunicorn_conf.py "service.embedding_gen_service:create_app(start=False)"
+
+With preload_app the model is loaded once in the master and forked workers
+share its weights copy-on-write; each worker then starts its own inference
+batcher, cache handle and readiness self-test (threads do not survive fork).
+CUDA cannot be used across fork, so set EMBED_PRELOAD=0 on GPU hosts (each
+worker then loads its own copy). The same goes for EMBED_BACKEND=onnx /
+openvino: the runtime session's intra-op thread pool is created with the
+model, and a forked worker inherits a pool whose threads do not exist in it
+(the first encode can hang), so preload defaults to off for those backends.
+
+On SIGTERM gunicorn stops accepting connections and waits up to
+graceful_timeout for in-flight requests; worker_exit then drains the batcher.
+
+Env: EMBED_BIND (0.0.0.0:4098), EMBED_HTTP_WORKERS (2), EMBED_HTTP_THREADS (8),
+EMBED_PRELOAD (1; 0 with EMBED_BACKEND=onnx|openvino), EMBED_GRACEFUL_TIMEOUT_S (30).
+"""
+import os
+
+bind = os.environ.get("EMBED_BIND", "0.0.0.0:4098")
+workers = int(os.environ.get("EMBED_HTTP_WORKERS", "2"))
+# threads per worker feed the shared micro-batcher queue
+worker_class = "gthread"
+threads = int(os.environ.get("EMBED_HTTP_THREADS", "8"))
+# onnxruntime / OpenVINO thread pools do not survive fork: load the model in each worker
+_fork_safe = os.environ.get("EMBED_BACKEND", "torch").lower() not in ("onnx", "openvino")
+preload_app = os.environ.get("EMBED_PRELOAD", "1" if _fork_safe else "0") == "1"
+graceful_timeout = int(os.environ.get("EMBED_GRACEFUL_TIMEOUT_S", "30"))
+# a cold model load on a worker (EMBED_PRELOAD=0) can take a while
+timeout = 300
+
+
+def post_worker_init(worker):
+    from service import embedding_gen_service
+    embedding_gen_service.start_workers()
+
+
+def worker_exit(server, worker):
+    from service import embedding_gen_service
+    embedding_gen_service.shutdown_workers(graceful_timeout)
@@ -0,0 +1,226 @@
+"""Versioned FAISS snapshots with an atomic CURRENT pointer, GC and hot reload.
+
+Layout under INDEX_DIR:
+
+    CURRENT                      text file holding the published version name
+    versions/<version>/          index.faiss + index.pkl + meta.json (+ any extra files a publisher writes)
+
+meta.json records what produced the vectors (embedding provider, model,
+dimension, ...); rag_store checks it against the configured embeddings on load.
+
+Publishing writes the snapshot to versions/.tmp-<version>, renames it into
+place, then swaps CURRENT with os.replace — readers see either the old or the
+new snapshot, never a half-written pair. An INDEX_DIR that still holds a bare
+index.faiss/index.pkl (layout before snapshots) is read as version "legacy".
+
+Long-running processes wrap their store in HotReloadingStore: a background
+thread polls CURRENT, loads a new snapshot off the query path and swaps the
+reference, so queries keep running against the old snapshot until the new
+one is fully loaded.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from langchain.schema import Document
+
+from config import INDEX_DIR, INDEX_KEEP_VERSIONS, INDEX_POLL_INTERVAL_S
+
+logger = logging.getLogger(__name__)
+
+CURRENT = "CURRENT"
+VERSIONS = "versions"
+LEGACY = "legacy"
+_LEGACY_FILES = ("index.faiss", "index.pkl")
+META_FILE = "meta.json"
+
+
+def current_version(root: Path = INDEX_DIR) -> Optional[str]:
+    """Published version name, "legacy" for a pre-snapshot index, or None if nothing is published."""
+    root = Path(root)
+    try:
+        version = (root / CURRENT).read_text(encoding="utf-8").strip()
+        if version:
+            return version
+    except FileNotFoundError:
+        pass
+    if all((root / name).exists() for name in _LEGACY_FILES):
+        return LEGACY
+    return None
+
+
+def snapshot_dir(version: str, root: Path = INDEX_DIR) -> Path:
+    root = Path(root)
+    return root if version == LEGACY else root / VERSIONS / version
+
+
+def write_meta(path: Path, meta: Dict[str, Any]) -> None:
+    # replace, not overwrite: meta.json is also backfilled into already published snapshots
+    tmp = Path(path) / (META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, sort_keys=True)
+    os.replace(tmp, Path(path) / META_FILE)
+
+
+def read_meta(version: str, root: Path = INDEX_DIR) -> Optional[Dict[str, Any]]:
+    """A snapshot's meta.json, or None for snapshots published before it existed."""
+    try:
+        with open(snapshot_dir(version, root) / META_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(root: Path = INDEX_DIR) -> List[str]:
+    vdir = Path(root) / VERSIONS
+    if not vdir.exists():
+        return []
+    return sorted(p.name for p in vdir.iterdir() if p.is_dir() and not p.name.startswith(".tmp-"))
+
+
+def publish_snapshot(write: Callable[[Path], None], root: Path = INDEX_DIR, keep: int = INDEX_KEEP_VERSIONS) -> str:
+    """Write a new snapshot via write(tmp_dir), publish it atomically and GC old ones.
+
+    Returns the new version name.
+    """
+    root = Path(root)
+    version = time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    tmp = root / VERSIONS / f".tmp-{version}"
+    tmp.mkdir(parents=True, exist_ok=True)
+    try:
+        write(tmp)
+        os.replace(tmp, root / VERSIONS / version)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    pointer_tmp = root / f"{CURRENT}.tmp"
+    pointer_tmp.write_text(version, encoding="utf-8")
+    os.replace(pointer_tmp, root / CURRENT)
+    logger.info("index: published version=%s", version)
+    gc_snapshots(root, keep=keep)
+    return version
+
+
+def gc_snapshots(root: Path = INDEX_DIR, keep: int = INDEX_KEEP_VERSIONS) -> List[str]:
+    """Delete all but the newest `keep` snapshots (never the current one). Returns removed versions.
+
+    Older-but-kept snapshots give processes that are still loading a previous
+    version time to finish.
+    """
+    root = Path(root)
+    current = current_version(root)
+    versions = list_versions(root)
+    doomed = [v for v in versions[:-keep] if v != current] if keep > 0 else [v for v in versions if v != current]
+    for v in doomed:
+        shutil.rmtree(root / VERSIONS / v, ignore_errors=True)
+    # stale temp dirs from crashed publishers
+    vdir = root / VERSIONS
+    if vdir.exists():
+        for p in vdir.iterdir():
+            if p.name.startswith(".tmp-") and time.time() - p.stat().st_mtime > 24 * 3600:
+                shutil.rmtree(p, ignore_errors=True)
+    # the pre-snapshot layout is superseded once a versioned snapshot is current
+    if current not in (None, LEGACY):
+        for name in _LEGACY_FILES:
+            try:
+                (root / name).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("index: could not remove legacy %s: %s", name, e)
+    if doomed:
+        logger.info("index: gc removed %d old versions: %s", len(doomed), ", ".join(doomed))
+    return doomed
+
+
+class _LiveRetriever(BaseRetriever):
+    """Retriever that resolves the store's current snapshot on every query."""
+
+    store: Any
+    search_type: str = "similarity"
+    search_kwargs: dict = {}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        retriever = self.store.get().as_retriever(search_type=self.search_type, search_kwargs=self.search_kwargs)
+        return retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+
+
+class HotReloadingStore:
+    """Wraps a vector store and swaps in newly published snapshots in the background.
+
+    - get() returns the current store (a plain attribute read, no locking on the query path).
+    - as_retriever() returns a retriever that follows swaps, so chains built once keep working.
+    - Other attributes (index, docstore, add_embeddings, ...) proxy to the current store.
+    """
+
+    def __init__(
+        self,
+        vs,
+        version: Optional[str],
+        load_fn: Callable[[str], Any],
+        root: Path = INDEX_DIR,
+        poll_interval_s: float = INDEX_POLL_INTERVAL_S,
+    ):
+        self._vs = vs
+        self.version = version
+        self._load_fn = load_fn
+        self._root = Path(root)
+        self._poll_interval_s = poll_interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, name="index-hot-reload", daemon=True)
+        self._thread.start()
+
+    def get(self):
+        return self._vs
+
+    def as_retriever(self, search_type: str = "similarity", search_kwargs: Optional[dict] = None, **_):
+        return _LiveRetriever(store=self, search_type=search_type, search_kwargs=search_kwargs or {})
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._vs, name)
+
+    def check_now(self) -> bool:
+        """Reload if a newer version is published. Returns True if the store was swapped."""
+        version = current_version(self._root)
+        if version is None or version == self.version:
+            return False
+        t0 = time.perf_counter()
+        try:
+            vs = self._load_fn(version)
+        except Exception as e:
+            logger.warning("index: hot reload of version=%s failed: %s", version, e)
+            return False
+        self._vs, self.version = vs, version
+        logger.info("index: hot reloaded version=%s in %.2fs", version, time.perf_counter() - t0)
+        return True
+
+    def _poll(self):
+        while not self._stop.wait(self._poll_interval_s):
+            self.check_now()
+
+    def close(self):
+        self._stop.set()
+
+
+__all__ = [
+    "HotReloadingStore",
+    "current_version",
+    "gc_snapshots",
+    "list_versions",
+    "publish_snapshot",
+    "read_meta",
+    "snapshot_dir",
+    "write_meta",
+]
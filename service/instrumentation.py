@@ -0,0 +1,169 @@
+"""Per-stage timing for batch jobs (jobs/refresh.py, jobs/crawl.py).
+
+    timer = StageTimer()
+    with timer.span("pdf_parse", key=path, table="pdf") as sp:
+        docs = PyPDFLoader(path).load()
+        sp.items, sp.bytes = len(docs), os.path.getsize(path)
+    timer.observe("embed_call", 0.84)          # latency sample -> p50/p90/p95/p99
+    summary = timer.summary()                  # {"stages": ..., "latency": ..., "tables": ...}
+    timer.log(logger)
+
+Pipeline stages overlap, so each stage reports two times: busy_s (sum of its
+spans; what the stage cost) and wall_s (first span start to last span end;
+when it was active). Rates are per busy second. Spans are thread-safe.
+
+    with profile_run(LOGS_DIR / "refresh.prof", logger):   # cProfile, including pipeline threads
+        ...
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import math
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from service import pipeline
+
+
+class Span:
+    __slots__ = ("items", "bytes")
+
+    def __init__(self, items: int = 0, bytes: int = 0):
+        self.items = items
+        self.bytes = bytes
+
+
+def percentiles(values: List[float], qs=(50, 90, 95, 99)) -> Dict[str, float]:
+    """Nearest-rank percentiles in seconds, plus count / mean / max."""
+    if not values:
+        return {"count": 0}
+    v = sorted(values)
+    out = {"count": len(v), "mean": round(sum(v) / len(v), 4), "max": round(v[-1], 4)}
+    for q in qs:
+        out[f"p{q}"] = round(v[max(0, math.ceil(q / 100 * len(v)) - 1)], 4)
+    return out
+
+
+class StageTimer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, dict] = {}
+        self._latency: Dict[str, List[float]] = {}
+        self._tables: Dict[str, List[dict]] = {}
+
+    def add(self, stage: str, seconds: float, items: int = 0, bytes: int = 0, start: Optional[float] = None,
+            key: Optional[str] = None, table: Optional[str] = None) -> None:
+        end = time.perf_counter()
+        start = end - seconds if start is None else start
+        with self._lock:
+            st = self._stages.get(stage)
+            if st is None:
+                st = self._stages[stage] = {"spans": 0, "busy_s": 0.0, "items": 0, "bytes": 0, "first": start, "last": end}
+            st["spans"] += 1
+            st["busy_s"] += seconds
+            st["items"] += items
+            st["bytes"] += bytes
+            st["first"] = min(st["first"], start)
+            st["last"] = max(st["last"], end)
+            if table is not None:
+                self._tables.setdefault(table, []).append(
+                    {"key": key, "stage": stage, "seconds": round(seconds, 4), "items": items, "bytes": bytes}
+                )
+
+    @contextmanager
+    def span(self, stage: str, key: Optional[str] = None, table: Optional[str] = None) -> Iterator[Span]:
+        sp = Span()
+        t0 = time.perf_counter()
+        try:
+            yield sp
+        finally:
+            self.add(stage, time.perf_counter() - t0, sp.items, sp.bytes, start=t0, key=key, table=table)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._latency.setdefault(name, []).append(seconds)
+
+    def timed_iter(self, items, stage: str):
+        """Yield from items, recording the time spent waiting for each one as `stage` (e.g. an idle consumer)."""
+        it = iter(items)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self.add(stage, time.perf_counter() - t0, 1, start=t0)
+            yield item
+
+    # ---------- reporting ----------
+    def stages(self) -> Dict[str, dict]:
+        with self._lock:
+            items = [(k, dict(v)) for k, v in self._stages.items()]
+        out = {}
+        for name, st in sorted(items, key=lambda kv: kv[1]["first"]):
+            busy = st["busy_s"]
+            out[name] = {
+                "spans": st["spans"],
+                "busy_s": round(busy, 3),
+                "wall_s": round(st["last"] - st["first"], 3),
+                "items": st["items"],
+                "bytes": st["bytes"],
+                "items_per_s": round(st["items"] / busy, 2) if busy > 0 else None,
+                "bytes_per_s": round(st["bytes"] / busy, 1) if busy > 0 else None,
+            }
+        return out
+
+    def latency(self) -> Dict[str, dict]:
+        with self._lock:
+            samples = {k: list(v) for k, v in self._latency.items()}
+        return {k: percentiles(v) for k, v in samples.items()}
+
+    def tables(self, top: Optional[int] = None) -> Dict[str, List[dict]]:
+        """Per-key rows (e.g. per URL / per PDF), slowest first."""
+        with self._lock:
+            tables = {k: list(v) for k, v in self._tables.items()}
+        return {k: sorted(rows, key=lambda r: -r["seconds"])[:top] for k, rows in tables.items()}
+
+    def summary(self, top: Optional[int] = None) -> dict:
+        return {"stages": self.stages(), "latency": self.latency(), "tables": self.tables(top)}
+
+    def log(self, logger, top: int = 10) -> None:
+        for name, st in self.stages().items():
+            logger.info(
+                "stage %-18s busy_s=%-9s wall_s=%-9s items=%-7d bytes=%-10d items/s=%s",
+                name, st["busy_s"], st["wall_s"], st["items"], st["bytes"], st["items_per_s"],
+            )
+        for name, p in self.latency().items():
+            logger.info("latency %s: %s", name, p)
+        for table, rows in self.tables(top).items():
+            logger.info("slowest %d by %s:", len(rows), table)
+            for r in rows:
+                logger.info("  %8.3fs %-16s items=%-5d %s", r["seconds"], r["stage"], r["items"], r["key"])
+
+
+@contextmanager
+def profile_run(path, logger=None, top: int = 30):
+    """cProfile the block, including pipeline stage threads; dump to path and log the top functions."""
+    prof = cProfile.Profile()
+    thread_profiles = pipeline.set_thread_profiling(True)
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        pipeline.set_thread_profiling(False)
+        stats = pstats.Stats(prof)
+        for p in thread_profiles:
+            stats.add(p)
+        stats.dump_stats(str(path))
+        if logger is not None:
+            buf = io.StringIO()
+            pstats.Stats(str(path), stream=buf).sort_stats("cumulative").print_stats(top)
+            logger.info("profile written to %s (threads merged: %d)\n%s", path, len(thread_profiles), buf.getvalue())
+
+
+__all__ = ["Span", "StageTimer", "percentiles", "profile_run"]
@@ -25,6 +25,11 @@ Streaming tokens (answer only):
     for token in chain.stream("Setback requirements?"):
         print(token, end="", flush=True)
 
+Tracing: inside service.tracing.trace_question(...) both chains record
+retrieve / embed_query / faiss_search / prompt_assembly / ttft / generation
+spans (pass config={"callbacks": tracing.callbacks()} to make_lcel_chain's
+runnable yourself; the _with_sources runnable does it for you).
+
 Notes:
 - You can plug additional steps between retriever and LLM (e.g., a reranker) by editing pipeline.
 - History support: format CHAT_PROMPT manually with a list for "history" if needed.
@@ -36,6 +41,8 @@ from langchain.schema import Document
 
 from service.prompts import CHAT_PROMPT
 from service.qa_chain import make_llm  # reuse Ollama LLM factory
+from service.matryoshka_retriever import make_retriever
+from service.tracing import callbacks
 
 # ------------ Helpers ------------
 
@@ -54,6 +61,9 @@ def _extract_sources(docs: List[Document]) -> List[str]:
         src = d.metadata.get("source") or "unknown"
         page = d.metadata.get("page") or d.metadata.get("pdf_page")
         out.append(f"{src}{' (page '+str(page)+')' if page is not None else ''}")
+        for ref in d.metadata.get("duplicate_sources") or []:
+            dup_page = ref.get("page")
+            out.append(f"{ref.get('source') or 'unknown'}{' (page '+str(dup_page)+')' if dup_page is not None else ''}")
     # keep order, remove dupes while preserving first occurrence
     seen = set(); uniq = []
     for s in out:
@@ -69,7 +79,7 @@ def make_lcel_chain(vs, k: int = 4):
     Simpler substitute for RetrievalQA when you only want the answer and
     might later insert custom logic.
     """
-    retriever = vs.as_retriever(search_kwargs={"k": k})
+    retriever = make_retriever(vs, k=k)
     llm = make_llm()
 
     chain = (
@@ -88,7 +98,7 @@ def make_lcel_chain_with_sources(vs, k: int = 4):
 
     Output shape: {"answer": str, "sources": [str, ...]}
     """
-    retriever = vs.as_retriever(search_kwargs={"k": k})
+    retriever = make_retriever(vs, k=k)
     llm = make_llm()
 
     def _build_context(x: Dict[str, Any]):
@@ -109,14 +119,12 @@ def make_lcel_chain_with_sources(vs, k: int = 4):
     )
 
     def _invoke(question: str):
-        intermediate = pipeline.invoke(question)
+        config = {"callbacks": callbacks()}
+        intermediate = pipeline.invoke(question, config=config)
         # intermediate is an LLM message/string depending on llm; ensure str
         answer = getattr(intermediate, "content", intermediate)
-        docs = (
-            ({"question": question} | pipeline) if False else None  # placeholder to show structure
-        )
         # We need docs: rerun retriever only (cheaper)
-        retrieved = retriever.get_relevant_documents(question)
+        retrieved = retriever.invoke(question, config=config)
         sources = _extract_sources(retrieved)
         return {"answer": answer, "sources": sources}
 
@@ -125,8 +133,9 @@ def make_lcel_chain_with_sources(vs, k: int = 4):
             return _invoke(question)
         def stream(self, question: str):  # stream answer tokens only
             # Stream via llm.stream over formatted prompt messages
-            formatted = CHAT_PROMPT.format_messages(question=question, context=_format_docs_plain(retriever.get_relevant_documents(question)))
-            for part in llm.stream(formatted):
+            config = {"callbacks": callbacks()}
+            formatted = CHAT_PROMPT.format_messages(question=question, context=_format_docs_plain(retriever.invoke(question, config=config)))
+            for part in llm.stream(formatted, config=config):
                 yield getattr(part, "content", part)
         def batch(self, questions: List[str]):
             return [self.invoke(q) for q in questions]
@@ -7,16 +7,33 @@ Usage:
 
 You can also override the script name:
     configure_logging(name="index_builder")  # logs/index_builder.log
+
+Structured events (one JSON object per line, e.g. QA traces):
+    log = get_json_logger("traces")          # logs/traces.jsonl
+    log.info({"event": "qa_trace", "ms": {...}})
+
+By default (LOG_QUEUE in config.py) callers only put records on a queue; a
+QueueListener thread does the formatting, file writes and rotation, so
+logging stays out of request latency and Playwright/pipeline profiles. The
+queue is drained at exit. Other knobs, all in config.py or as arguments:
+
+    LOG_JSON = True                              # logs/<name>.jsonl instead of text
+    LOG_LEVELS = {"httpx": "WARNING"}            # per-logger levels
+    LOG_SAMPLING = {"service.rag_store": 0.1}    # keep 10% of that module's DEBUG/INFO records
 """
 from __future__ import annotations
 
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 import sys
-from typing import Optional
+from typing import Dict, List, Optional
 
-from config import LOGS_DIR
+from config import LOG_JSON, LOG_LEVELS, LOG_QUEUE, LOG_SAMPLING, LOGS_DIR
 
 
 def _infer_script_name() -> str:
@@ -31,43 +48,179 @@ def _infer_script_name() -> str:
     return "main"
 
 
+class _JsonLineFormatter(logging.Formatter):
+    """Record as one JSON line: dict messages are merged in, anything else becomes "message"."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        if isinstance(record.msg, dict):
+            payload = record.msg
+        else:
+            payload = {"logger": record.name, "message": record.getMessage()}
+            if record.exc_info:
+                payload["exc"] = self.formatException(record.exc_info)
+        payload = {"ts": round(record.created, 3), "level": record.levelname, **payload}
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _SamplingFilter(logging.Filter):
+    """Keep a fraction of DEBUG/INFO records per logger prefix; warnings and errors always pass."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # longest prefix first, so "service.rag_store" beats "service"
+        self.rates = sorted(rates.items(), key=lambda kv: -len(kv[0]))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return rate >= 1 or random.random() < rate
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # structured (dict) messages go to the listener as-is for the JSON formatter
+        if isinstance(record.msg, dict) and not record.args:
+            return record
+        return super().prepare(record)
+
+
+# one listener per queue; stopped (and drained) at exit
+_listeners: Dict[int, QueueListener] = {}
+
+
+def _stop_listeners() -> None:
+    for listener in list(_listeners.values()):
+        try:
+            listener.stop()
+        except Exception:
+            pass
+    _listeners.clear()
+
+
+atexit.register(_stop_listeners)  # registered after logging's own atexit, so it runs first
+
+
+def _queue_handler_of(logger: logging.Logger) -> Optional[_QueueHandler]:
+    return next((h for h in logger.handlers if isinstance(h, _QueueHandler)), None)
+
+
+def _route(logger: logging.Logger, handlers: List[logging.Handler], use_queue: bool) -> None:
+    """Attach handlers to logger, either directly or behind its QueueHandler/QueueListener."""
+    if not use_queue:
+        for h in handlers:
+            logger.addHandler(h)
+        return
+    qh = _queue_handler_of(logger)
+    if qh is None:
+        qh = _QueueHandler(queue.SimpleQueue())
+        logger.addHandler(qh)
+    old = _listeners.pop(id(qh), None)
+    if old is not None:
+        old.stop()  # drains, then restarts below with the extra handlers
+        handlers = list(old.handlers) + handlers
+    listener = QueueListener(qh.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners[id(qh)] = listener
+
+
+def _handlers_of(logger: logging.Logger) -> List[logging.Handler]:
+    qh = _queue_handler_of(logger)
+    listener = _listeners.get(id(qh)) if qh is not None else None
+    return list(logger.handlers) + (list(listener.handlers) if listener is not None else [])
+
+
+def _same_file(h: logging.Handler, path: Path) -> bool:
+    try:
+        return isinstance(h, RotatingFileHandler) and Path(getattr(h, "baseFilename", "")) == path
+    except Exception:
+        return False
+
+
 def configure_logging(
     name: Optional[str] = None,
     level: int = logging.INFO,
     to_console: bool = True,
     max_bytes: int = 1_000_000,
     backup_count: int = 3,
+    use_queue: bool = LOG_QUEUE,
+    json_lines: bool = LOG_JSON,
+    levels: Optional[Dict[str, object]] = None,
+    sampling: Optional[Dict[str, float]] = None,
 ) -> logging.Logger:
     """Configure root logging with a rotating file handler under LOGS_DIR.
 
-    - File: logs/<name>.log, where name defaults to the current script name.
+    - File: logs/<name>.log (logs/<name>.jsonl with json_lines), where name defaults to the current script name.
     - Also attaches a console handler by default.
+    - use_queue: handlers run on a QueueListener thread; callers only enqueue.
+    - levels: {"logger.name": "WARNING"} overrides (default LOG_LEVELS).
+    - sampling: {"logger.prefix": 0.1} keeps that fraction of DEBUG/INFO records (default LOG_SAMPLING).
     - Safe to call multiple times: avoids duplicate handlers.
     """
-    log_name = (name or _infer_script_name()) + ".log"
+    log_name = (name or _infer_script_name()) + (".jsonl" if json_lines else ".log")
     log_path = LOGS_DIR / log_name
     log_path.parent.mkdir(parents=True, exist_ok=True)
 
     root = logging.getLogger()
     root.setLevel(level)
+    for logger_name, logger_level in (LOG_LEVELS if levels is None else levels).items():
+        logging.getLogger(logger_name).setLevel(logger_level)
 
-    # Deduplicate: check if a handler already targets this file
-    def _is_same_file_handler(h: logging.Handler) -> bool:
-        try:
-            return isinstance(h, RotatingFileHandler) and Path(getattr(h, "baseFilename", "")) == log_path
-        except Exception:
-            return False
-
-    fmt = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    fmt = _JsonLineFormatter() if json_lines else logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    existing = _handlers_of(root)
+    new: List[logging.Handler] = []
 
-    if not any(_is_same_file_handler(h) for h in root.handlers):
+    # Deduplicate: check if a handler already targets this file
+    if not any(_same_file(h, log_path) for h in existing):
         fh = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
         fh.setFormatter(fmt)
-        root.addHandler(fh)
+        new.append(fh)
 
-    if to_console and not any(isinstance(h, logging.StreamHandler) for h in root.handlers):
+    if to_console and not any(isinstance(h, logging.StreamHandler) for h in existing + new):
         ch = logging.StreamHandler()
-        ch.setFormatter(fmt)
-        root.addHandler(ch)
+        ch.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        new.append(ch)
+
+    if new:
+        _route(root, new, use_queue)
+
+    rates = LOG_SAMPLING if sampling is None else sampling
+    for h in root.handlers:
+        for f in [f for f in h.filters if isinstance(f, _SamplingFilter)]:
+            h.removeFilter(f)
+        if rates:
+            h.addFilter(_SamplingFilter(rates))
 
     return root
+
+
+def get_json_logger(
+    name: str,
+    max_bytes: int = 5_000_000,
+    backup_count: int = 3,
+    use_queue: bool = LOG_QUEUE,
+) -> logging.Logger:
+    """Logger "json.<name>" writing JSON lines to logs/<name>.jsonl (not propagated to the console/root log)."""
+    log = logging.getLogger(f"json.{name}")
+    log_path = LOGS_DIR / f"{name}.jsonl"
+    if not any(_same_file(h, log_path) for h in _handlers_of(log)):
+        fh = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        fh.setFormatter(_JsonLineFormatter())
+        _route(log, [fh], use_queue)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    return log
+
+
+def flush_logging() -> None:
+    """Write out everything queued so far (exit does this automatically); logging keeps working afterwards."""
+    for listener in list(_listeners.values()):
+        listener.stop()   # returns once the queue is drained
+        listener.start()
+        for h in listener.handlers:
+            h.flush()
+
+
+__all__ = ["configure_logging", "flush_logging", "get_json_logger"]
@@ -0,0 +1,103 @@
+"""Matryoshka-style truncated embeddings (numpy only; shared by the index and the embedding service).
+
+nomic-embed-text and gte-Qwen2 are trained so that a prefix of an embedding is
+itself a usable embedding. truncate() keeps the first `dim` components and
+re-normalizes them to unit length, so cosine / L2 ranking still works.
+
+With INDEX_OUTPUT_DIM set the FAISS index stores only the short vectors. The
+full-width vectors are kept beside it in the snapshot (FullVectors:
+full_vectors.npy + full_vectors_ids.json) so retrieval can re-score coarse
+candidates exactly, see service/matryoshka_retriever.py.
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FULL_VECTORS_FILE = "full_vectors.npy"
+FULL_IDS_FILE = "full_vectors_ids.json"
+
+
+def normalize(vectors) -> np.ndarray:
+    arr = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    return arr / np.where(norms > 0, norms, 1.0)
+
+
+def truncate(vectors, dim: int) -> np.ndarray:
+    """First `dim` components of each vector (1-D or 2-D input), re-normalized to unit length."""
+    arr = np.asarray(vectors, dtype=np.float32)
+    if dim <= 0 or dim > arr.shape[-1]:
+        raise ValueError(f"output_dim must be in 1..{arr.shape[-1]}, got {dim}")
+    return normalize(arr[..., :dim])
+
+
+class FullVectors:
+    """Full-width vectors keyed by chunk id, stored next to a truncated index."""
+
+    def __init__(self, ids: Sequence[str] = (), vectors: Optional[np.ndarray] = None):
+        self._ids: List[str] = list(ids)
+        self._parts: List[np.ndarray] = [np.asarray(vectors, dtype=np.float32)] if vectors is not None and len(ids) else []
+        self._pos: Dict[str, int] = {cid: i for i, cid in enumerate(self._ids)}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if len(self._parts) > 1:
+            self._parts = [np.vstack(self._parts)]
+        return self._parts[0] if self._parts else np.empty((0, 0), dtype=np.float32)
+
+    def add(self, ids: Sequence[str], vectors) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        for cid in ids:
+            self._pos[cid] = len(self._ids)
+            self._ids.append(cid)
+        self._parts.append(vectors)
+
+    def remove(self, ids: Sequence[str]) -> int:
+        """Drop the rows of ids (e.g. chunks superseded by a re-chunked source); returns rows removed."""
+        drop = {cid for cid in ids if cid in self._pos}
+        if not drop:
+            return 0
+        matrix = self.matrix
+        keep = [i for i, cid in enumerate(self._ids) if cid not in drop]
+        self._ids = [self._ids[i] for i in keep]
+        self._parts = [matrix[keep]] if keep else []
+        self._pos = {cid: i for i, cid in enumerate(self._ids)}
+        return len(drop)
+
+    def get(self, ids: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, found mask); rows for unknown ids are zeros."""
+        matrix = self.matrix
+        idx = np.array([self._pos.get(cid, -1) for cid in ids], dtype=np.int64)
+        found = idx >= 0
+        rows = np.zeros((len(ids), matrix.shape[1] if matrix.size else 0), dtype=np.float32)
+        if found.any():
+            rows[found] = matrix[idx[found]]
+        return rows, found
+
+    def save(self, path) -> None:
+        path = Path(path)
+        np.save(path / FULL_VECTORS_FILE, self.matrix, allow_pickle=False)
+        tmp = path / (FULL_IDS_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._ids, f)
+        os.replace(tmp, path / FULL_IDS_FILE)
+
+    @classmethod
+    def load(cls, path) -> Optional["FullVectors"]:
+        path = Path(path)
+        if not (path / FULL_VECTORS_FILE).exists() or not (path / FULL_IDS_FILE).exists():
+            return None
+        with open(path / FULL_IDS_FILE, encoding="utf-8") as f:
+            ids = json.load(f)
+        return cls(ids, np.load(path / FULL_VECTORS_FILE))
+
+
+__all__ = ["FULL_IDS_FILE", "FULL_VECTORS_FILE", "FullVectors", "normalize", "truncate"]
@@ -0,0 +1,119 @@
+"""Truncated-dimension embeddings and two-stage retrieval for the FAISS store.
+
+    INDEX_OUTPUT_DIM = 256          # index stores 256-d prefixes (re-normalized)
+    INDEX_TWO_STAGE_FACTOR = 4      # coarse top k*4 on short vectors, exact re-score with full vectors
+
+make_embeddings() in rag_store wraps the configured embeddings in
+TruncatingEmbeddings, so documents and queries both hit the index at
+INDEX_OUTPUT_DIM. make_retriever() returns a TwoStageRetriever when
+INDEX_TWO_STAGE_FACTOR > 0, otherwise a plain similarity retriever. The
+two-stage path is chosen per query from the store's current embeddings, so a
+hot-reloaded snapshot that is (no longer) truncated is searched the right way. Both time their query embedding / FAISS search as tracing spans
+("embed_query", "faiss_search", "rescore") when a question is being traced.
+`jobs/bench_index.py --output-dims 256,512` measures recall@k and
+latency of both against full-width search.
+"""
+from __future__ import annotations
+
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain.schema import Document
+
+from config import INDEX_TWO_STAGE_FACTOR
+from service.index_registry import HotReloadingStore
+from service.matryoshka import normalize, truncate
+from service.tracing import span
+
+
+class TruncatingEmbeddings(Embeddings):
+    """Wraps an Embeddings and returns the first output_dim components, re-normalized."""
+
+    def __init__(self, base: Embeddings, output_dim: int):
+        self.base = base
+        self.output_dim = int(output_dim)
+
+    def __getattr__(self, name):
+        # batch_size / max_workers etc. of the wrapped embeddings (see rag_store.embed_batch_size)
+        if name.startswith("_") or name == "base":
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    def embed_documents_full(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.base.embed_documents(texts), dtype=np.float32)
+
+    def embed_query_full(self, text: str) -> np.ndarray:
+        return np.asarray(self.base.embed_query(text), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return truncate(self.embed_documents_full(texts), self.output_dim).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return truncate(self.embed_query_full(text), self.output_dim).tolist()
+
+
+def _current(store):
+    return store.get() if isinstance(store, HotReloadingStore) else store
+
+
+def _similarity_search(vs, query: str, k: int) -> List[Document]:
+    with span("embed_query"):
+        vector = vs.embedding_function.embed_query(query)
+    with span("faiss_search", k=k):
+        return vs.similarity_search_by_vector(vector, k=k)
+
+
+class TwoStageRetriever(BaseRetriever):
+    """Coarse search on truncated vectors, then exact cosine re-scoring with the full vectors.
+
+    Stores whose embeddings are not truncated (e.g. a migrated snapshot picked up
+    by load_live_store) get a plain similarity search instead."""
+
+    store: Any
+    k: int = 4
+    factor: int = INDEX_TWO_STAGE_FACTOR
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vs = _current(self.store)
+        emb = vs.embedding_function
+        if not isinstance(emb, TruncatingEmbeddings) or self.factor <= 0:
+            return _similarity_search(vs, query, self.k)
+        with span("embed_query"):
+            q_full = emb.embed_query_full(query)
+        with span("faiss_search", k=self.k * max(1, self.factor)):
+            candidates = vs.similarity_search_by_vector(
+                truncate(q_full, emb.output_dim).tolist(), k=self.k * max(1, self.factor)
+            )
+        full = getattr(vs, "full_vectors", None)
+        if full is None or not candidates:
+            return candidates[: self.k]
+        with span("rescore", candidates=len(candidates)):
+            rows, found = full.get([d.metadata.get("chunk_id") for d in candidates])
+            scores = normalize(rows) @ normalize(q_full) if rows.size else np.zeros(len(candidates))
+            # candidates without a stored full vector keep their coarse order after the re-scored ones
+            scores = np.where(found, scores, -np.inf)
+            order = sorted(range(len(candidates)), key=lambda i: (-scores[i], i))
+        return [candidates[i] for i in order[: self.k]]
+
+
+class SimilarityRetriever(BaseRetriever):
+    """Plain top-k similarity search (what vs.as_retriever() does), with the query embedding timed on its own."""
+
+    store: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return _similarity_search(_current(self.store), query, self.k)
+
+
+def make_retriever(vs, k: int = 4):
+    """Retriever for make_qa / the LCEL chains: two-stage (decided per query) when enabled, else plain similarity."""
+    if INDEX_TWO_STAGE_FACTOR > 0:
+        return TwoStageRetriever(store=vs, k=k, factor=INDEX_TWO_STAGE_FACTOR)
+    return SimilarityRetriever(store=vs, k=k)
+
+
+__all__ = ["SimilarityRetriever", "TruncatingEmbeddings", "TwoStageRetriever", "make_retriever"]
@@ -0,0 +1,95 @@
+"""Minimal in-process metrics with Prometheus text exposition (no client library needed).
+
+    REQUESTS = Counter("embed_http_requests_total", "HTTP requests", ("endpoint", "status"))
+    LATENCY = Histogram("embed_http_request_seconds", "Request latency", ("endpoint",))
+    REQUESTS.inc(endpoint="/embed", status="200")
+    LATENCY.observe(0.012, endpoint="/embed")
+    text = render(REQUESTS, LATENCY, gauges={"process_resident_memory_bytes": rss})
+
+Updates take one lock and a dict lookup, so they are cheap enough for every request.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(names: Sequence[str], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_fmt_labels(self.labels, key)} {v}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], list] = {}   # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_fmt_labels(self.labels, key, ('le', repr(float(bound))))} {cumulative}"
+            cumulative += series[len(self.buckets)]
+            yield f"{self.name}_bucket{_fmt_labels(self.labels, key, ('le', '+Inf'))} {cumulative}"
+            yield f"{self.name}_sum{_fmt_labels(self.labels, key)} {series[-1]}"
+            yield f"{self.name}_count{_fmt_labels(self.labels, key)} {cumulative}"
+
+
+def render(*metrics, gauges: Optional[Dict[str, float]] = None) -> str:
+    """Prometheus text format for the given counters/histograms plus plain gauges."""
+    lines = []
+    for m in metrics:
+        lines.extend(m.render())
+    for name, value in (gauges or {}).items():
+        if value is None:
+            continue
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+__all__ = ["Counter", "DEFAULT_LATENCY_BUCKETS", "Histogram", "render"]
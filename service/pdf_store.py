@@ -0,0 +1,272 @@
+"""Content-addressed PDF storage for downloads (service/utils.download_pdf / fetch_pdf).
+
+Layout under DATA_RAW_DIR:
+
+    objects/<sha256>.pdf     one file per distinct content
+    manifest.json            {"urls": {url: {"sha256", "etag", "last_modified", "fetched_at", "origin"}},
+                              "objects": {sha256: {"path", "size", "name", "urls"}},
+                              "files": {path: {"size", "mtime", "sha256"}}}
+
+Downloads are streamed to a temp file and hashed while writing. If the bytes
+are already stored (under objects/ or as a PDF saved directly into
+DATA_RAW_DIR, which is registered whenever the store loads) the temp file is discarded and the existing path is returned with
+is_new=False; ETag / Last-Modified from the previous fetch are sent so an
+unchanged URL usually costs a 304 and no transfer at all.
+
+    store = pdf_store()                        # shared per directory, thread-safe
+    path, is_new = store.fetch(url)
+    paths = store.unique_paths(LOCAL_PDF_PATHS) # drops byte-identical copies (ResidentialGuidelines_1.pdf)
+
+origin is "download" for fetch() (jobs/search_first.py) and "crawl" for
+service/crawler.py. refresh_store indexes downloaded_paths() next to
+LOCAL_PDF_PATHS (INDEX_DOWNLOADED_PDFS); crawled PDFs are indexed by the crawl
+itself. Objects are cited by display_name(), the file name they were
+downloaded as, not by their <sha256>.pdf path.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from config import DATA_RAW_DIR
+
+MANIFEST = "manifest.json"
+OBJECTS = "objects"
+_CHUNK = 65536
+
+
+def sha256_file(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class PdfStore:
+    def __init__(self, root=DATA_RAW_DIR):
+        self.root = Path(root)
+        self.objects = self.root / OBJECTS
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._manifest = self._load()
+
+    # ---------- manifest ----------
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.root / MANIFEST, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        except (OSError, ValueError) as e:
+            print(f"[warn] PDF manifest unreadable, rebuilding: {e}")
+            manifest = {}
+        for key in ("urls", "objects", "files"):
+            manifest.setdefault(key, {})
+        # every load: PDFs saved into the root since the last run (cheap, hashes are cached by size + mtime)
+        self._manifest = manifest
+        self._index_existing()
+        return manifest
+
+    def _save(self) -> None:
+        tmp = self.root / f".{MANIFEST}.{uuid.uuid4().hex[:6]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.root / MANIFEST)
+        self._dirty = False
+
+    def _rel(self, path: Path) -> str:
+        try:
+            return Path(path).resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return str(Path(path).resolve())
+
+    def _abs(self, rel: str) -> Path:
+        p = Path(rel)
+        return (p if p.is_absolute() else self.root / p).resolve()
+
+    def _index_existing(self) -> None:
+        """Register PDFs saved directly into the root (e.g. by hand), so re-downloads of them are no-ops."""
+        with self._lock:
+            for p in sorted(self.root.glob("*.pdf")):
+                sha = self.file_hash(p)
+                if sha not in self._manifest["objects"]:
+                    self._manifest["objects"][sha] = {"path": self._rel(p), "size": p.stat().st_size, "name": p.name, "urls": []}
+                    self._dirty = True
+            if self._dirty:
+                self._save()
+
+    # ---------- hashing ----------
+    def file_hash(self, path) -> str:
+        """sha256 of a file, cached in the manifest by (size, mtime)."""
+        path = Path(path)
+        st = path.stat()
+        rel = self._rel(path)
+        with self._lock:
+            cached = self._manifest["files"].get(rel)
+            if cached and cached["size"] == st.st_size and cached["mtime"] == st.st_mtime:
+                return cached["sha256"]
+        sha = sha256_file(path)
+        with self._lock:
+            self._manifest["files"][rel] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": sha}
+            self._dirty = True
+        return sha
+
+    def unique_paths(self, paths: Sequence[str]) -> List[str]:
+        """paths minus later byte-identical copies (missing files are kept so the loader can report them)."""
+        seen, out = set(), []
+        for p in paths:
+            try:
+                sha = self.file_hash(p)
+            except OSError:
+                out.append(p)
+                continue
+            if sha in seen:
+                print(f"[info] skipping duplicate PDF content: {p}")
+                continue
+            seen.add(sha)
+            out.append(p)
+        with self._lock:
+            if self._dirty:  # only newly hashed files; refresh / main call this on every run
+                self._save()
+        return out
+
+    def object_path(self, sha: str) -> Optional[Path]:
+        with self._lock:
+            obj = self._manifest["objects"].get(sha)
+        if obj is not None and self._abs(obj["path"]).exists():
+            return self._abs(obj["path"])
+        return None
+
+    def downloaded_paths(self) -> List[str]:
+        """Current content of every URL stored by fetch(), oldest download first (crawled PDFs excluded)."""
+        with self._lock:
+            shas = [
+                entry["sha256"]
+                for _, entry in sorted(self._manifest["urls"].items(), key=lambda kv: kv[1].get("fetched_at") or "")
+                if entry.get("origin", "download") == "download"
+            ]
+        out = []
+        for sha in dict.fromkeys(shas):
+            path = self.object_path(sha)
+            if path is not None:
+                out.append(str(path))
+        return out
+
+    def display_name(self, path) -> Optional[str]:
+        """The name an objects/<sha256>.pdf file was downloaded as, or None for other files."""
+        path = Path(path)
+        if path.resolve().parent != self.objects.resolve():
+            return None
+        with self._lock:
+            obj = self._manifest["objects"].get(path.stem)
+        return obj.get("name") if obj else None
+
+    def tmp_path(self) -> Path:
+        """Scratch file inside the store (same filesystem, so add() can rename it into place)."""
+        return self.objects / f".tmp-{uuid.uuid4().hex}"
+
+    def add(
+        self,
+        tmp: Path,
+        url: str,
+        sha: str,
+        size: int,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        name: Optional[str] = None,
+        origin: str = "download",
+    ) -> Tuple[str, bool]:
+        """Store a downloaded file already hashed as `sha`; returns (path, is_new). tmp is consumed only if new."""
+        with self._lock:
+            path = self.object_path(sha)
+            is_new = path is None
+            if is_new:
+                path = self.objects / f"{sha}.pdf"
+                os.replace(tmp, path)
+                path = path.resolve()
+                self._manifest["objects"][sha] = {
+                    "path": self._rel(path),
+                    "size": size,
+                    "name": name or os.path.basename(urlparse(url).path) or "download.pdf",
+                    "urls": [],
+                }
+            urls = self._manifest["objects"][sha].setdefault("urls", [])
+            if url not in urls:
+                urls.append(url)
+            self._manifest["urls"][url] = {
+                "sha256": sha,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "origin": origin,
+            }
+            self._save()
+        return str(path), is_new
+
+    # ---------- download ----------
+    def fetch(self, url: str, timeout: int = 30, name: Optional[str] = None) -> Tuple[Optional[str], bool]:
+        """Download url into the store; returns (absolute path or None on failure, is_new content)."""
+        with self._lock:
+            known = dict(self._manifest["urls"].get(url) or {})
+        existing = self.object_path(known["sha256"]) if known.get("sha256") else None
+
+        headers = {"User-Agent": os.getenv("USER_AGENT", "YEGGardenSuite-RAG/1.0")}
+        if existing is not None:
+            if known.get("etag"):
+                headers["If-None-Match"] = known["etag"]
+            if known.get("last_modified"):
+                headers["If-Modified-Since"] = known["last_modified"]
+
+        tmp = self.tmp_path()
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=timeout) as r:
+                if r.status_code == 304 and existing is not None:
+                    return str(existing), False
+                r.raise_for_status()
+                ct = r.headers.get("Content-Type", "")
+                if "pdf" not in ct.lower() and not urlparse(url).path.lower().endswith(".pdf"):
+                    print(f"[warn] Response may not be a PDF (Content-Type: {ct})")
+                h = hashlib.sha256()
+                size = 0
+                with open(tmp, "wb") as f:
+                    for chunk in r.iter_content(chunk_size=_CHUNK):
+                        if chunk:
+                            h.update(chunk)
+                            f.write(chunk)
+                            size += len(chunk)
+                etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+            return self.add(tmp, url, h.hexdigest(), size, etag=etag, last_modified=last_modified, name=name)
+        except Exception as e:
+            print(f"[error] Failed to download PDF from {url}: {e}")
+            return None, False
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+
+_stores: Dict[str, PdfStore] = {}
+_stores_lock = threading.Lock()
+
+
+def pdf_store(root=None) -> PdfStore:
+    """Shared PdfStore for a directory (one manifest writer per process)."""
+    root = Path(root or DATA_RAW_DIR)
+    key = str(root.resolve())
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = PdfStore(root)
+        return _stores[key]
+
+
+__all__ = ["PdfStore", "pdf_store", "sha256_file"]
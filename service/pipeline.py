@@ -0,0 +1,111 @@
+"""Bounded producer/consumer stages for streaming ingestion (rag_store.ingest).
+
+    docs = background(iter_sources(...), buffer=32, name="fetch")        # runs in its own thread
+    batches = background(batched(iter_chunks(docs), 64), buffer=4, name="split")
+    for batch in batches:                                                # embed in the caller's thread
+        ...
+
+Every stage runs ahead of its consumer by at most `buffer` items and blocks
+after that, so memory stays bounded by the buffers rather than the corpus
+and a slow embedder throttles fetching instead of piling up documents.
+Exceptions raised inside a stage are re-raised in the consumer; closing the
+consumer (or an exception downstream) stops the stage.
+
+set_thread_profiling(True) makes every stage thread run under its own
+cProfile.Profile (collected for service/instrumentation.profile_run), since
+cProfile only sees the thread that enabled it.
+"""
+from __future__ import annotations
+
+import cProfile
+import queue
+import threading
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+_thread_profiles: "list | None" = None
+
+
+def set_thread_profiling(enabled: bool) -> list:
+    """Start (or stop) profiling stage threads; returns the list their profiles are appended to."""
+    global _thread_profiles
+    if enabled:
+        _thread_profiles = []
+        return _thread_profiles
+    profiles, _thread_profiles = _thread_profiles or [], None
+    return profiles
+
+
+class _Failed:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def background(items: Iterable[T], buffer: int = 32, name: str = "stage") -> Iterator[T]:
+    """Iterate `items` in a daemon thread, handing results over through a bounded queue."""
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, buffer))
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run():
+        profiles = _thread_profiles
+        prof = cProfile.Profile() if profiles is not None else None
+        if prof is not None:
+            try:
+                prof.enable()
+            except ValueError:  # Python 3.12+: one profiler per process, the main one already covers threads
+                prof = None
+        try:
+            for item in items:
+                if not _put(item):
+                    break
+        except BaseException as e:
+            _put(_Failed(e))
+        finally:
+            close = getattr(items, "close", None)
+            if stop.is_set() and close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+            if prof is not None:
+                prof.disable()
+                profiles.append(prof)
+            _put(_DONE)
+
+    t = threading.Thread(target=_run, name=name, daemon=True)
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failed):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        t.join(timeout=5)
+
+
+def batched(items: Iterable[T], n: int) -> Iterator[List[T]]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, n))
+        if not batch:
+            return
+        yield batch
+
+
+__all__ = ["background", "batched", "set_thread_profiling"]
@@ -3,6 +3,7 @@ from langchain.prompts import ChatPromptTemplate
 from langchain.chains import RetrievalQA
 from config import GEN_MODEL, LLM_KWARGS
 from service.prompts import CHAT_PROMPT
+from service.matryoshka_retriever import make_retriever
 
 def make_llm():
     return OllamaLLM(model=GEN_MODEL, **LLM_KWARGS)
@@ -12,7 +13,7 @@ def make_prompt():
     return CHAT_PROMPT
 
 def make_qa(vs):
-    retriever = vs.as_retriever(search_kwargs={"k": 4})
+    retriever = make_retriever(vs, k=4)
     llm = make_llm()
     prompt = make_prompt()
     return RetrievalQA.from_chain_type(
@@ -0,0 +1,87 @@
+"""Compressed FAISS index modes for the persistent store.
+
+INDEX_QUANTIZATION in config.py selects how a snapshot's vectors are stored:
+
+    None     IndexFlat, full float32 (default, current behaviour)
+    "fp16"   scalar quantizer, 2 bytes/dim
+    "int8"   scalar quantizer, 1 byte/dim (trained per-dimension ranges)
+    "pq"     product quantizer, INDEX_PQ_M bytes/vector
+
+With INDEX_RERANK_K_FACTOR > 0 the compressed index is wrapped in
+IndexRefineFlat: it fetches k * factor candidates from the compressed codes and
+re-scores them exactly against float32 vectors (more memory, better recall).
+
+The compressed index is a drop-in replacement for vs.index: LangChain's FAISS
+wrapper only calls add/search/reconstruct. Changing the mode of an index that
+is already compressed needs `jobs/refresh.py --rebuild`, because the original
+float32 vectors are not kept. `jobs/bench_index.py` measures memory, latency
+and recall@k of each mode against the flat index.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+from config import INDEX_QUANTIZATION, INDEX_PQ_M, INDEX_RERANK_K_FACTOR
+
+logger = logging.getLogger(__name__)
+
+MODES = ("fp16", "int8", "pq")
+_PQ_MIN_TRAIN = 256  # one training vector per centroid at minimum (8-bit codes)
+
+
+def _factory_spec(mode: str, d: int, ntotal: int, pq_m: int) -> str:
+    if mode == "fp16":
+        return "SQfp16"
+    if mode == "int8":
+        return "SQ8"
+    if mode == "pq":
+        if d % pq_m:
+            raise ValueError(f"INDEX_PQ_M={pq_m} must divide the embedding dimension {d}")
+        if ntotal < _PQ_MIN_TRAIN:
+            logger.warning("quantization: %d vectors are too few to train PQ, using int8", ntotal)
+            return "SQ8"
+        return f"PQ{pq_m}x8"
+    raise ValueError(f"unknown quantization mode {mode!r}; expected one of {MODES}")
+
+
+def is_flat(index) -> bool:
+    import faiss
+    return isinstance(index, faiss.IndexFlat)
+
+
+def compress_index(index, mode: str, pq_m: int = INDEX_PQ_M, rerank_k_factor: int = INDEX_RERANK_K_FACTOR):
+    """Return a compressed copy of a flat index (same metric, same row order)."""
+    import faiss
+
+    xb = index.reconstruct_n(0, index.ntotal)
+    spec = _factory_spec(mode, index.d, index.ntotal, pq_m)
+    compressed = faiss.index_factory(index.d, spec, index.metric_type)
+    compressed.train(xb)
+    if rerank_k_factor and rerank_k_factor > 0:
+        # adding through the wrapper fills both the codes and the float32 refine store
+        compressed = faiss.IndexRefineFlat(compressed)
+        compressed.k_factor = float(rerank_k_factor)
+    compressed.add(xb)
+    return compressed
+
+
+def apply_quantization(vs, mode: Optional[str] = INDEX_QUANTIZATION) -> bool:
+    """Replace vs.index with its compressed form if configured and still flat. Returns True if changed."""
+    if not mode or vs.index.ntotal == 0:
+        return False
+    if not is_flat(vs.index):
+        return False
+    before = vs.index.ntotal
+    vs.index = compress_index(vs.index, mode)
+    logger.info("quantization: compressed %d vectors to mode=%s rerank_k_factor=%s", before, mode, INDEX_RERANK_K_FACTOR)
+    return True
+
+
+def index_nbytes(index) -> int:
+    """Serialized size of an index in bytes (what save_local writes for index.faiss)."""
+    import faiss
+    return int(faiss.serialize_index(index).nbytes)
+
+
+__all__ = ["MODES", "apply_quantization", "compress_index", "index_nbytes", "is_flat"]
@@ -1,53 +1,95 @@
 # pip install playwright
 # python -m playwright install
+#
+# Heavy dependencies (langchain_community loaders / FAISS / embeddings, Playwright,
+# tqdm) are imported inside the functions that use them, so importing this module
+# (main.py -q with an existing index) does not pay for loaders or browsers it never
+# touches. jobs/check_import_time.py keeps an eye on that.
+from __future__ import annotations
 
-from typing import List, Sequence
+from typing import TYPE_CHECKING, Iterable, List, Sequence
 import logging
+import os
 import time
 from urllib.parse import urlparse
-from langchain_community.document_loaders import WebBaseLoader, OnlinePDFLoader, PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_ollama import OllamaEmbeddings
-from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain.schema import Document
-from playwright.sync_api import sync_playwright   # NEW
-from loguru import logger
-from tqdm import tqdm
-from config import EMBED_MODEL, INDEX_DIR, ALLOWED
+from config import (
+    EMBED_MODEL, INDEX_DIR, ALLOWED, DEDUP_ENABLED, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, EMBED_BATCH_SIZE,
+    EMBED_PROVIDER, EMBED_SERVICE_URL, INDEX_OUTPUT_DIM, PIPELINE_DOC_BUFFER, PIPELINE_BATCH_BUFFER, PIPELINE_HTML_GROUP,
+    INDEX_DOWNLOADED_PDFS,
+)
 from service.utils import is_allowed_websites
+from service.dedup import ChunkDeduper, dedup_chunks
+from service.chunker import ChunkCache, chunk_document, chunk_documents
+from service.checkpoint import EmbeddingCheckpoint
+from service.pdf_store import pdf_store
+from service.pipeline import background, batched
+from service.instrumentation import StageTimer
+from service.index_registry import HotReloadingStore, current_version, publish_snapshot, read_meta, snapshot_dir, write_meta
+from service.quantization import apply_quantization
+from service.matryoshka import FullVectors, truncate
+from service.matryoshka_retriever import TruncatingEmbeddings
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
 
 logger = logging.getLogger(__name__)
 
-def load_pdf_urls(pdf_urls):
-    docs = []
-    logger.info(f"loading {len(pdf_urls)} PDF URLs")
-    for url in tqdm(pdf_urls or [], desc="Loading PDF URLs"):
+
+def _tqdm(items, **kwargs):
+    from tqdm import tqdm
+    return tqdm(items, **kwargs)
+
+def _load_pdf_url(url, timer: StageTimer | None = None):
+    from langchain_community.document_loaders import OnlinePDFLoader
+    with (timer or StageTimer()).span("pdf_fetch_parse", key=url, table="pdf") as sp:
         try:
-            docs.extend(OnlinePDFLoader(url).load())
+            docs = OnlinePDFLoader(url).load()
         except Exception as e:
             print(f"[warn] PDF load failed: {url} -> {e}")
+            return []
+        sp.items, sp.bytes = len(docs), _text_bytes(docs)
     return docs
 
-def load_local_pdfs(paths):
+def load_pdf_urls(pdf_urls):
     docs = []
-    for p in tqdm(paths or [], desc="Loading local PDFs"):
-        try:
-            cur_elements = PyPDFLoader(p).load()
-            docs.extend(cur_elements)
-            logger.info(f"{len(docs)}")
-            logger.info(f"{len(cur_elements)}")
+    logger.info("loading %d PDF URLs", len(pdf_urls))
+    for url in _tqdm(pdf_urls or [], desc="Loading PDF URLs"):
+        docs.extend(_load_pdf_url(url))
+    return docs
 
+def _load_local_pdf(p, timer: StageTimer | None = None):
+    from langchain_community.document_loaders import PyPDFLoader
+    with (timer or StageTimer()).span("pdf_parse", key=str(p), table="pdf") as sp:
+        try:
+            docs = PyPDFLoader(p).load()
         except Exception as e:
             print(f"[warn] Local PDF load failed: {p} -> {e}")
+            return []
+        sp.items, sp.bytes = len(docs), os.path.getsize(p)
+    name = pdf_store().display_name(p)
+    if name:  # objects/<sha256>.pdf: cite the downloaded file name, keep the path for reference
+        for d in docs:
+            d.metadata.update(source=name, file=str(p))
+    return docs
+
+def load_local_pdfs(paths):
+    docs = []
+    # byte-identical copies (e.g. Foo.pdf and Foo_1.pdf) are parsed and embedded once
+    paths = pdf_store().unique_paths(paths or [])
+    for p in _tqdm(paths, desc="Loading local PDFs"):
+        cur_elements = _load_local_pdf(p)
+        docs.extend(cur_elements)
+        logger.debug("local pdf: %s pages=%d total=%d", p, len(cur_elements), len(docs))
     return docs
 
 
  
 
 def _load_html_basic(urls):
+    from langchain_community.document_loaders import WebBaseLoader
     try:
-        logger.info(f"loading {len(urls)} HTML URLs")
+        logger.info("loading %d HTML URLs", len(urls))
         loader = WebBaseLoader(
             urls,
             header_template={"User-Agent": "Mozilla/5.0"},
@@ -56,7 +98,9 @@ def _load_html_basic(urls):
     except Exception:
         return []
 
-def _expand_and_extract_with_playwright(urls):
+def _expand_and_extract_with_playwright(urls, timer: StageTimer | None = None):
+    from langchain_community.document_loaders import OnlinePDFLoader
+    from playwright.sync_api import sync_playwright
     docs = []
     t0 = time.perf_counter()
     logger.info("playwright: start render: urls=%d", len(urls) if urls else 0)
@@ -87,6 +131,7 @@ def _expand_and_extract_with_playwright(urls):
                 logger.debug("playwright: skip disallowed: %s", url)
                 continue
             t_url = time.perf_counter()
+            n_before = len(docs)
             try:
                 page.goto(url, wait_until="domcontentloaded", timeout=15000)
 
@@ -129,7 +174,7 @@ def _expand_and_extract_with_playwright(urls):
                         if href and href.startswith("http") and is_allowed_websites(href):
                             pdf_docs = OnlinePDFLoader(href).load()
                             docs.extend(pdf_docs)
-                            logger.info(
+                            logger.debug(
                                 "playwright: pdf-fallback ok: url=%s added=%d elapsed_s=%.2f",
                                 url,
                                 len(pdf_docs),
@@ -143,7 +188,7 @@ def _expand_and_extract_with_playwright(urls):
                     before = len(docs)
                     docs.append(Document(page_content=text, metadata={"source": url}))
                     added = len(docs) - before
-                    logger.info(
+                    logger.debug(
                         "playwright: page ok: url=%s text_len=%d docs_added=%d elapsed_s=%.2f",
                         url,
                         len(text),
@@ -158,6 +203,10 @@ def _expand_and_extract_with_playwright(urls):
                 except Exception:
                     elapsed = float('nan')
                 logger.warning("playwright: page fail: url=%s err=%s elapsed_s=%.2f", url, e, elapsed)
+            finally:
+                if timer is not None:
+                    added = docs[n_before:]
+                    timer.add("playwright_render", time.perf_counter() - t_url, len(added), _text_bytes(added), start=t_url, key=url, table="url")
 
     ctx.close()
     browser.close()
@@ -171,22 +220,80 @@ def _expand_and_extract_with_playwright(urls):
     )
     return docs
 
-def load_pages(urls):
+def _text_bytes(docs) -> int:
+    return sum(len(d.page_content.encode("utf-8", "replace")) for d in docs)
+
+def load_pages(urls, timer: StageTimer | None = None):
     # try cheap loader first; if thin, render & expand with Playwright
-    docs = _load_html_basic(urls)
+    if timer is None:
+        docs = _load_html_basic(urls)
+    else:
+        # one URL per loader call (WebBaseLoader fetches sequentially anyway) for per-URL timings
+        docs = []
+        for url in urls:
+            with timer.span("html_fetch", key=url, table="url") as sp:
+                got = _load_html_basic([url])
+                sp.items, sp.bytes = len(got), _text_bytes(got)
+            docs.extend(got)
     if sum(len(d.page_content) for d in docs) >= 600:
         return docs
-    return _expand_and_extract_with_playwright(urls)
+    return _expand_and_extract_with_playwright(urls, timer)
+
+def load_crawled(pages, render_thin: bool = True, timer: StageTimer | None = None):
+    """Documents for crawler pages (service/crawler.py), yielded as the pages arrive.
+
+    PDFs are parsed from the content-addressed store and cited by URL. Pages
+    with under 600 characters of text are probably script-rendered; they are
+    rendered together with Playwright once the stream ends.
+    """
+    thin = []
+    for page in pages:
+        if page.kind == "pdf":
+            docs = _load_local_pdf(page.path, timer)
+            if not docs:
+                continue
+            for d in docs:
+                d.metadata.update(source=page.url, file=page.path)
+            yield from docs
+        elif len(page.text) < 600 and render_thin:
+            thin.append(page.url)
+        elif page.text:
+            yield Document(page_content=page.text, metadata={"source": page.url, "title": page.title})
+    if thin:
+        yield from _expand_and_extract_with_playwright(thin, timer)
 
 def split_docs(docs):
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1200, chunk_overlap=150)
-    return splitter.split_documents(docs)
+    # structure-aware, token-sized chunks; unchanged docs reuse cached splits + chunk IDs
+    return chunk_documents(docs)
+
+def chunk_ids(chunks):
+    return [c.metadata["chunk_id"] for c in chunks]
+
+def new_chunks(vs: FAISS, chunks):
+    """Chunks whose chunk_id is not in the index yet (incremental embedding)."""
+    existing = getattr(vs.docstore, "_dict", {})
+    return [c for c in chunks if c.metadata.get("chunk_id") not in existing]
+
+def dedup_docs(chunks, stats: dict | None = None):
+    """Drop near-duplicate chunks before embedding (no-op when DEDUP_ENABLED is False).
+
+    Records kept/dropped counts into `stats` (if given) as chunks_kept / chunks_dropped.
+    """
+    if DEDUP_ENABLED:
+        kept, counts = dedup_chunks(chunks)
+    else:
+        kept, counts = list(chunks), {"kept": len(chunks), "dropped": 0}
+    logger.info("dedup: kept=%d dropped=%d", counts["kept"], counts["dropped"])
+    if stats is not None:
+        stats["chunks_kept"] = counts["kept"]
+        stats["chunks_dropped"] = counts["dropped"]
+    return kept
 
 def build_index(
     pdf_paths: Sequence[str],
     *,
-    chunk_size: int = 800,
-    chunk_overlap: int = 120,
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
     model_name: str = "all-MiniLM-L6-v2",
     mmr_k: int = 4,
 ):
@@ -195,6 +302,9 @@ def build_index(
     Returns a retriever configured for MMR search. Does NOT touch the persistent Ollama-based index
     used elsewhere (build_or_load_store). This is an optional faster path for experimentation.
     """
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_community.embeddings import SentenceTransformerEmbeddings
+    from langchain_community.vectorstores import FAISS
     docs = []
     for p in pdf_paths or []:
         try:
@@ -205,34 +315,527 @@ def build_index(
     if not docs:
         raise ValueError("No PDF documents loaded — check paths")
 
-    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    chunks = splitter.split_documents(docs)
+    chunks = chunk_documents(docs, cache=None, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
     embed = SentenceTransformerEmbeddings(model_name=model_name)
-    vs = FAISS.from_documents(chunks, embed)
+    vs = FAISS.from_documents(chunks, embed, ids=chunk_ids(chunks))
     return vs.as_retriever(search_type="mmr", search_kwargs={"k": mmr_k})
 
-def build_or_load_store(urls: List[str], pdf_urls: Sequence[str] = (), local_pdf_paths: Sequence[str] = ()):
-    embeddings = OllamaEmbeddings(model=EMBED_MODEL)
-    if INDEX_DIR.exists():
-        vs = FAISS.load_local(str(INDEX_DIR), embeddings, allow_dangerous_deserialization=True)
+def make_embeddings():
+    """Embeddings selected by EMBED_PROVIDER ("ollama" or "service"), truncated to INDEX_OUTPUT_DIM if set."""
+    if EMBED_PROVIDER == "service":
+        from service.service_embeddings import EmbeddingServiceEmbeddings
+        embeddings = EmbeddingServiceEmbeddings()
+    elif EMBED_PROVIDER == "ollama":
+        from langchain_ollama import OllamaEmbeddings
+        embeddings = OllamaEmbeddings(model=EMBED_MODEL)
     else:
-        web_docs = load_pages(urls or [])
-        pdf_web_docs = load_pdf_urls(list(pdf_urls) if pdf_urls else [])
-        pdf_local_docs = load_local_pdfs(list(local_pdf_paths) if local_pdf_paths else [])
-        all_docs = web_docs + pdf_web_docs + pdf_local_docs
-        chunks = split_docs(all_docs)
-        vs = FAISS.from_documents(chunks, embeddings)
-        vs.save_local(str(INDEX_DIR))
+        raise ValueError(f"unknown EMBED_PROVIDER: {EMBED_PROVIDER!r} (expected 'ollama' or 'service')")
+    if INDEX_OUTPUT_DIM:
+        embeddings = TruncatingEmbeddings(embeddings, INDEX_OUTPUT_DIM)
+    return embeddings
+
+class EmbeddingMismatchError(ValueError):
+    """A snapshot was embedded with a different model than the configured embeddings."""
+
+def embedding_signature(embeddings) -> dict:
+    """What produces an embeddings object's vectors; stored in each snapshot's meta.json."""
+    from langchain_ollama import OllamaEmbeddings
+    base = embeddings.base if isinstance(embeddings, TruncatingEmbeddings) else embeddings
+    sig = {"output_dim": embeddings.output_dim if isinstance(embeddings, TruncatingEmbeddings) else None}
+    if isinstance(base, OllamaEmbeddings):
+        sig.update(embed_provider="ollama", embed_model=base.model)
+    elif hasattr(base, "model_name") and hasattr(base, "client"):  # EmbeddingServiceEmbeddings
+        sig.update(embed_provider="service", embed_model=base.model_name(), service_url=base.client.base_url)
+    else:
+        sig.update(embed_provider=type(base).__name__, embed_model=getattr(base, "model", None) or getattr(base, "model_name", None))
+    return sig
+
+def embed_model_id(embeddings) -> str:
+    """Identifies the embedding model (checkpoints are only resumed for the same one)."""
+    sig = embedding_signature(embeddings)
+    return f"{sig['embed_provider']}:{sig['embed_model']}:{sig['output_dim'] or 'full'}"
+
+def embeddings_for_meta(meta: dict):
+    """Embeddings matching a snapshot's meta.json (used to follow a migrated snapshot without a restart)."""
+    if meta.get("embed_provider") == "service":
+        from service.service_embeddings import EmbeddingServiceEmbeddings
+        embeddings = EmbeddingServiceEmbeddings(base_url=meta.get("service_url") or EMBED_SERVICE_URL)
+    elif meta.get("embed_provider") == "ollama":
+        from langchain_ollama import OllamaEmbeddings
+        embeddings = OllamaEmbeddings(model=meta["embed_model"])
+    else:
+        raise ValueError(f"cannot recreate embeddings for provider {meta.get('embed_provider')!r}")
+    if meta.get("output_dim"):
+        embeddings = TruncatingEmbeddings(embeddings, meta["output_dim"])
+    return embeddings
+
+_dim_checked: set = set()  # (version, embed_model_id) of pre-meta.json snapshots that passed the dimension check
+
+def check_embeddings(vs: FAISS, meta: dict | None, embeddings, version: str) -> None:
+    """Raise EmbeddingMismatchError if `embeddings` did not produce the vectors in snapshot `version`."""
+    hint = "run jobs/migrate_embeddings.py (or jobs/refresh.py --rebuild) after changing the embedding model"
+    if meta is None:
+        # snapshot from before meta.json: at least make sure query vectors fit the index
+        key = (version, embed_model_id(embeddings))
+        if key in _dim_checked:
+            return
+        dim = len(embeddings.embed_query("dimension check"))
+        if dim != vs.index.d:
+            raise EmbeddingMismatchError(f"index version {version} has dimension {vs.index.d} but the configured embeddings produce {dim}; {hint}")
+        _dim_checked.add(key)
+        # record the embeddings that passed, so later loads use the meta check instead of a live embed call
+        try:
+            write_meta(snapshot_dir(version, INDEX_DIR), index_meta(vs))
+            logger.info("index: wrote meta.json for version %s", version)
+        except Exception as e:
+            logger.warning("index: could not write meta.json for version %s: %s", version, e)
+        return
+    sig = embedding_signature(embeddings)
+    for key in ("embed_provider", "embed_model", "output_dim"):
+        if sig.get(key) is None and key == "embed_model":
+            logger.warning("index: could not determine the embedding model, skipping the model check")
+            continue
+        if meta.get(key) != sig.get(key):
+            raise EmbeddingMismatchError(
+                f"index version {version} was embedded with {meta.get('embed_provider')}:{meta.get('embed_model')} "
+                f"(output_dim={meta.get('output_dim')}), configured embeddings are {sig.get('embed_provider')}:"
+                f"{sig.get('embed_model')} (output_dim={sig.get('output_dim')}); {hint}"
+            )
+
+def embed_batch_size(embeddings) -> int:
+    """Chunks per embed_documents call; large enough to keep every concurrent service request busy."""
+    per_call = getattr(embeddings, "batch_size", 0) * getattr(embeddings, "max_workers", 0)
+    return max(EMBED_BATCH_SIZE, per_call)
+
+def load_store(embeddings=None, version: str | None = None, check: bool = True):
+    """Load a published FAISS snapshot (the current one by default), or None if nothing is published.
+
+    With check=True the snapshot's meta.json must match the embeddings
+    (EmbeddingMismatchError otherwise), so vectors from two models never mix.
+    """
+    version = version or current_version(INDEX_DIR)
+    if version is None:
+        return None
+    from langchain_community.vectorstores import FAISS
+    embeddings = embeddings or make_embeddings()
+    path = snapshot_dir(version, INDEX_DIR)
+    vs = FAISS.load_local(str(path), embeddings, allow_dangerous_deserialization=True)
+    vs.full_vectors = FullVectors.load(path)  # full-width vectors of a truncated index, if any
+    if check:
+        check_embeddings(vs, read_meta(version, INDEX_DIR), embeddings, version)
     return vs
 
-def refresh_store(vs: FAISS, urls: List[str], pdf_urls: Sequence[str] = (), local_pdf_paths: Sequence[str] = ()):
-    web_docs = load_pages(urls or [])
-    pdf_web_docs = load_pdf_urls(list(pdf_urls) if pdf_urls else [])
-    pdf_local_docs = load_local_pdfs(list(local_pdf_paths) if local_pdf_paths else [])
-    all_docs = web_docs + pdf_web_docs + pdf_local_docs
-    chunks = split_docs(all_docs)
-    logger.info(f"adding {len(chunks)} chunks to index")
-    for chunk in tqdm(chunks, desc="Adding chunks to index"):
-        vs.add_documents([chunk])
-    vs.save_local(str(INDEX_DIR))
+def load_live_store(vs: FAISS | None = None, embeddings=None):
+    """Wrap the current snapshot in a HotReloadingStore for long-running processes.
+
+    Newly published snapshots (e.g. from jobs/refresh.py) are picked up without a
+    restart. A snapshot re-embedded by jobs/migrate_embeddings.py switches the
+    query embeddings to the model recorded in its meta.json.
+    """
+    version = current_version(INDEX_DIR)
+    vs = vs or load_store(embeddings, version)
+    active = [embeddings or vs.embedding_function]
+
+    def _reload(v):
+        try:
+            return load_store(active[0], v)
+        except EmbeddingMismatchError:
+            meta = read_meta(v, INDEX_DIR)
+            if meta is None:
+                raise
+            logger.warning("index: version %s uses %s:%s, switching query embeddings", v, meta.get("embed_provider"), meta.get("embed_model"))
+            active[0] = embeddings_for_meta(meta)
+            return load_store(active[0], v)
+
+    return HotReloadingStore(vs, version, _reload)
+
+def index_meta(vs: FAISS) -> dict:
+    full = getattr(vs, "full_vectors", None)
+    meta = embedding_signature(vs.embedding_function)
+    meta.update(
+        dim=int(vs.index.d),
+        full_dim=int(full.matrix.shape[1]) if full is not None and len(full) else int(vs.index.d),
+        count=int(vs.index.ntotal),
+        created=time.strftime("%Y-%m-%dT%H:%M:%S"),
+    )
+    return meta
+
+def _unwrap(vs):
+    # writes must reach the snapshot itself: HotReloadingStore only proxies attribute reads
+    return vs.get() if isinstance(vs, HotReloadingStore) else vs
+
+def save_store(vs: FAISS) -> str:
+    """Publish vs as a new versioned snapshot (atomic pointer swap); returns the version name.
+
+    A flat index is compressed first when INDEX_QUANTIZATION is set.
+    """
+    vs = _unwrap(vs)
+    apply_quantization(vs)
+    meta = index_meta(vs)
+
+    def _write(tmp):
+        vs.save_local(str(tmp))
+        if getattr(vs, "full_vectors", None) is not None:
+            vs.full_vectors.save(tmp)
+        write_meta(tmp, meta)
+
+    return publish_snapshot(_write, INDEX_DIR)
+
+def embed_stream(
+    vs: FAISS | None,
+    batches: Iterable[List[Document]],
+    embeddings,
+    checkpoint: EmbeddingCheckpoint | None = None,
+    stats: dict | None = None,
+    throttle=None,
+    timer: StageTimer | None = None,
+):
+    """Embed chunk batches as they arrive and add them to vs (created from the first batch when vs is None).
+
+    Chunks already present in `checkpoint` reuse their saved vectors; every
+    freshly embedded batch is recorded into it. throttle(n), if given, is
+    called before embedding each batch of n chunks (e.g. RateLimiter.acquire). With TruncatingEmbeddings the
+    index gets the short vectors while the checkpoint and vs.full_vectors keep
+    full width. Embedding calls ("embed", latency "embed_call") and index writes
+    ("faiss_add") are recorded in timer.
+    """
+    vs = _unwrap(vs)
+    truncating = isinstance(embeddings, TruncatingEmbeddings)
+    timer = timer or StageTimer()
+
+    def _add(vs, batch, full):
+        with timer.span("faiss_add") as sp:
+            sp.items = len(batch)
+            return _add_vectors(vs, batch, full)
+
+    def _add_vectors(vs, batch, full):
+        vectors = truncate(full, embeddings.output_dim) if truncating else full
+        pairs = list(zip([c.page_content for c in batch], vectors))
+        metadatas = [c.metadata for c in batch]
+        if vs is None:
+            from langchain_community.vectorstores import FAISS
+            vs = FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas, ids=chunk_ids(batch))
+        else:
+            vs.add_embeddings(pairs, metadatas=metadatas, ids=chunk_ids(batch))
+        if truncating:
+            if getattr(vs, "full_vectors", None) is None:
+                vs.full_vectors = FullVectors()
+            vs.full_vectors.add(chunk_ids(batch), full)
+        return vs
+
+    resumed = embedded = 0
+    for batch in batches:
+        done = [c for c in batch if checkpoint is not None and c.metadata["chunk_id"] in checkpoint]
+        todo = [c for c in batch if checkpoint is None or c.metadata["chunk_id"] not in checkpoint]
+        if done:
+            vs = _add(vs, done, checkpoint.vectors(chunk_ids(done)))
+            resumed += len(done)
+        if todo:
+            texts = [c.page_content for c in todo]
+            if throttle is not None:
+                with timer.span("embed_throttle"):
+                    throttle(len(texts))
+            t_call = time.perf_counter()
+            vectors = embeddings.embed_documents_full(texts) if truncating else embeddings.embed_documents(texts)
+            elapsed = time.perf_counter() - t_call
+            timer.add("embed", elapsed, len(texts), sum(len(t.encode("utf-8", "replace")) for t in texts), start=t_call)
+            timer.observe("embed_call", elapsed)
+            timer.observe("embed_per_chunk", elapsed / len(texts))
+            vs = _add(vs, todo, vectors)
+            if checkpoint is not None:
+                checkpoint.record(chunk_ids(todo), vectors)
+            embedded += len(todo)
+    if checkpoint is not None:
+        checkpoint.flush()
+
+    logger.info("embedding: resumed=%d embedded=%d", resumed, embedded)
+    if stats is not None:
+        stats["chunks_resumed"] = stats.get("chunks_resumed", 0) + resumed
+        stats["chunks_embedded"] = stats.get("chunks_embedded", 0) + embedded
+    return vs
+
+def embed_chunks(
+    vs: FAISS | None,
+    chunks,
+    embeddings,
+    batch_size: int | None = None,
+    checkpoint: EmbeddingCheckpoint | None = None,
+    stats: dict | None = None,
+    throttle=None,
+):
+    """embed_stream() over an in-memory list of chunks, batch_size chunks per embed call."""
+    batch_size = batch_size or embed_batch_size(embeddings)
+    logger.info("embedding: chunks=%d batch_size=%d", len(chunks), batch_size)
+    batches = _tqdm(batched(chunks, batch_size), total=-(-len(chunks) // batch_size), desc="Embedding chunks")
+    return embed_stream(vs, batches, embeddings, checkpoint=checkpoint, stats=stats, throttle=throttle)
+
+# ---------- streaming ingestion: fetch -> split -> dedup -> embed -> index ----------
+def _count(stats: dict | None, key: str, n: int = 1) -> None:
+    if stats is not None:
+        stats[key] = stats.get(key, 0) + n
+
+def iter_sources(
+    urls: Sequence[str] = (),
+    pdf_urls: Sequence[str] = (),
+    local_pdf_paths: Sequence[str] = (),
+    pages=None,
+    stats: dict | None = None,
+    html_group: int = PIPELINE_HTML_GROUP,
+    timer: StageTimer | None = None,
+):
+    """Documents from every source, loaded lazily: web pages html_group URLs at a time,
+    PDFs one file at a time, then crawler pages (service/crawler.py) if given.
+    Counts docs_web / docs_pdf_web / docs_pdf_local / docs_crawl into stats; per-source timings go to timer."""
+    for group in batched(list(urls or []), html_group):
+        try:
+            docs = load_pages(group, timer)
+        except Exception as e:
+            logger.exception(f"load_pages failed: {e}")
+            continue
+        _count(stats, "docs_web", len(docs))
+        yield from docs
+    for url in pdf_urls or []:
+        docs = _load_pdf_url(url, timer)
+        _count(stats, "docs_pdf_web", len(docs))
+        yield from docs
+    for path in pdf_store().unique_paths(list(local_pdf_paths or [])):
+        docs = _load_local_pdf(path, timer)
+        _count(stats, "docs_pdf_local", len(docs))
+        yield from docs
+    if pages is not None:
+        for doc in load_crawled(pages, timer=timer):
+            _count(stats, "docs_crawl")
+            yield doc
+
+def iter_chunks(
+    docs,
+    deduper: ChunkDeduper | None,
+    cache: ChunkCache | None = None,
+    existing=frozenset(),
+    stats: dict | None = None,
+    timer: StageTimer | None = None,
+    produced: dict | None = None,
+):
+    """Split docs one at a time and yield the chunks that still need embedding:
+    near-duplicates (deduper) and chunk ids already in the index (existing) or already
+    yielded this run (the same document loaded twice) are skipped.
+    produced, if given, collects {source: set(chunk_ids)} of everything the sources split into."""
+    timer = timer or StageTimer()
+    emitted = set()
+    for doc in docs:
+        with timer.span("split") as sp:
+            chunks = chunk_document(doc, cache)
+            sp.items, sp.bytes = len(chunks), len(doc.page_content.encode("utf-8", "replace"))
+        if produced is not None:
+            produced.setdefault(_source(doc), set()).update(c.metadata["chunk_id"] for c in chunks)
+        for chunk in chunks:
+            _count(stats, "chunks_total")
+            if deduper is not None:
+                with timer.span("dedup") as sp:
+                    sp.items = 1
+                    is_new = deduper.add(chunk)
+                if not is_new:
+                    continue
+            cid = chunk.metadata["chunk_id"]
+            if cid in existing or cid in emitted:
+                _count(stats, "chunks_unchanged")
+                continue
+            emitted.add(cid)
+            _count(stats, "chunks_new")
+            yield chunk
+
+def _source(doc) -> str:
+    md = doc.metadata or {}
+    return str(md.get("source") or md.get("url") or "")
+
+def superseded_chunks(vs: FAISS | None, produced: dict) -> List[str]:
+    """Indexed chunk ids of the re-loaded sources in `produced` that those sources no longer split into.
+
+    Chunk ids hash the document content, so a changed page or PDF gets new ids;
+    its old chunks would otherwise stay retrievable next to the new wording.
+    Sources that were not loaded this run (failed fetch, not configured) are left alone.
+    """
+    if vs is None or not produced:
+        return []
+    keep = set().union(*produced.values())
+    return [
+        cid for cid, doc in getattr(vs.docstore, "_dict", {}).items()
+        if cid not in keep and _source(doc) in produced
+    ]
+
+def remove_chunks(vs: FAISS | None, ids: Sequence[str]) -> int:
+    """Delete chunk ids from the index, docstore and full-width vectors; returns how many were removed."""
+    vs = _unwrap(vs)
+    if vs is None:
+        return 0
+    ids = [cid for cid in dict.fromkeys(ids) if cid in getattr(vs.docstore, "_dict", {})]
+    if not ids:
+        return 0
+    try:
+        vs.delete(ids)
+    except Exception as e:
+        # compressed indexes (e.g. IndexRefineFlat) may not support remove_ids: rebuild flat,
+        # save_store() compresses it again
+        logger.info("index: remove_ids unsupported (%s), rebuilding a flat index without %d chunks", e, len(ids))
+        _rebuild_without(vs, ids)
+    full = getattr(vs, "full_vectors", None)
+    if full is not None:
+        full.remove(ids)
+    return len(ids)
+
+def _rebuild_without(vs: FAISS, ids: Sequence[str]) -> None:
+    import faiss
+    import numpy as np
+    drop = set(ids)
+    rows = [i for i in sorted(vs.index_to_docstore_id) if vs.index_to_docstore_id[i] not in drop]
+    index = faiss.IndexFlatIP(vs.index.d) if vs.index.metric_type == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(vs.index.d)
+    if rows:
+        index.add(np.vstack([vs.index.reconstruct(int(i)) for i in rows]).astype(np.float32))
+    vs.index_to_docstore_id = {n: vs.index_to_docstore_id[i] for n, i in enumerate(rows)}
+    vs.index = index
+    vs.docstore.delete(list(drop))
+
+def apply_duplicate_sources(vs: FAISS | None, duplicates: dict) -> int:
+    """Merge ChunkDeduper.duplicates into the indexed chunks' metadata["duplicate_sources"]."""
+    if vs is None:
+        return 0
+    store = getattr(vs.docstore, "_dict", {})
+    updated = 0
+    for chunk_id, refs in duplicates.items():
+        doc = store.get(chunk_id)
+        if doc is None:
+            continue
+        current = doc.metadata.setdefault("duplicate_sources", [])
+        for ref in refs:
+            if ref not in current:
+                current.append(ref)
+                updated += 1
+    return updated
+
+def ingest(
+    vs: FAISS | None,
+    docs,
+    embeddings=None,
+    batch_size: int | None = None,
+    checkpoint: EmbeddingCheckpoint | None = None,
+    stats: dict | None = None,
+    throttle=None,
+    doc_buffer: int = PIPELINE_DOC_BUFFER,
+    batch_buffer: int = PIPELINE_BATCH_BUFFER,
+    timer: StageTimer | None = None,
+    sources: dict | None = None,
+):
+    """Stream docs through split -> dedup -> embed -> index with overlapping stages.
+
+    Loading runs in one thread, splitting + dedup in another and embedding in
+    the caller's; they are connected by bounded queues (doc_buffer documents,
+    batch_buffer chunk batches), so the embedder starts with the first batch
+    and memory does not grow with the corpus. embeddings=None only counts
+    (dry run). Returns vs (None if nothing was indexed).
+
+    Stage timings go to timer; "embed_wait" is time the embedder sat idle
+    waiting for the next batch (i.e. loading/splitting was the bottleneck).
+
+    Afterwards, chunks of the loaded sources that they no longer produce
+    (the source changed) are removed from vs (stats["chunks_removed"]; a dry
+    run only counts them). sources, if given, receives {source: set(chunk_ids)}.
+    """
+    vs = _unwrap(vs)
+    stats = stats if stats is not None else {}
+    timer = timer or StageTimer()
+    batch_size = batch_size or (embed_batch_size(embeddings) if embeddings is not None else EMBED_BATCH_SIZE)
+    existing = set(getattr(vs.docstore, "_dict", {})) if vs is not None else set()
+    deduper = ChunkDeduper(keep_docs=False) if DEDUP_ENABLED else None
+    cache = ChunkCache()
+    t0 = time.perf_counter()
+
+    loaded = background(docs, doc_buffer, name="ingest-load")
+    produced = sources if sources is not None else {}
+    batches = background(
+        batched(iter_chunks(loaded, deduper, cache, existing, stats, timer, produced), batch_size),
+        batch_buffer, name="ingest-split",
+    )
+    try:
+        if embeddings is None:
+            for _ in batches:
+                pass
+        else:
+            waited = timer.timed_iter(_tqdm(batches, desc="Embedding chunks", unit="batch"), "embed_wait")
+            vs = embed_stream(vs, waited, embeddings, checkpoint=checkpoint, stats=stats, throttle=throttle, timer=timer)
+    finally:
+        # stop the upstream stages if embedding failed
+        batches.close()
+        try:
+            loaded.close()
+        except ValueError:  # still being read by a split thread that did not stop in time
+            pass
+
+    cache.save()
+    if deduper is not None:
+        stats["chunks_kept"], stats["chunks_dropped"] = deduper.kept, deduper.dropped
+        stats["duplicate_sources_added"] = apply_duplicate_sources(vs, deduper.duplicates) if embeddings is not None else 0
+    else:
+        stats["chunks_kept"], stats["chunks_dropped"] = stats.get("chunks_total", 0), 0
+    stale = superseded_chunks(vs, produced)
+    stats["chunks_removed"] = remove_chunks(vs, stale) if embeddings is not None else 0
+    stats["chunks_stale"] = len(stale)
+    logger.info(
+        "ingest: chunks=%d kept=%d dropped=%d new=%d unchanged=%d removed=%d cache_hits=%d elapsed_s=%.2f",
+        stats.get("chunks_total", 0), stats["chunks_kept"], stats["chunks_dropped"],
+        stats.get("chunks_new", 0), stats.get("chunks_unchanged", 0), stats["chunks_removed"],
+        cache.hits, time.perf_counter() - t0,
+    )
+    return vs
+
+def build_or_load_store(urls: List[str], pdf_urls: Sequence[str] = (), local_pdf_paths: Sequence[str] = ()):
+    embeddings = make_embeddings()
+    vs = load_store(embeddings)
+    if vs is None:
+        vs = refresh_store(None, urls, pdf_urls, local_pdf_paths, embeddings=embeddings)
+    return vs
+
+def refresh_store(
+    vs: FAISS | None,
+    urls: List[str],
+    pdf_urls: Sequence[str] = (),
+    local_pdf_paths: Sequence[str] = (),
+    stats: dict | None = None,
+    resume: bool = False,
+    embeddings=None,
+    dry_run: bool = False,
+    timer: StageTimer | None = None,
+):
+    """Stream sources through ingest(), embedding chunks that are not indexed yet, and publish the index.
+
+    vs=None builds a new index; a HotReloadingStore (answer_modes) updates and
+    publishes its current snapshot. Progress is checkpointed every
+    CHECKPOINT_EVERY_BATCHES batches; resume=True continues from the last
+    checkpoint instead of starting over. dry_run=True loads, splits and
+    counts (into stats) without embedding or publishing. Per-stage timings
+    (fetch, render, parse, split, dedup, embed, FAISS add/save) go to timer.
+    """
+    vs = _unwrap(vs)
+    timer = timer or StageTimer()
+    if embeddings is None and not dry_run:
+        embeddings = vs.embedding_function if vs is not None else make_embeddings()
+    if INDEX_DOWNLOADED_PDFS:
+        # PDFs jobs/search_first.py stored under data/raw/objects/ (copies of local_pdf_paths are skipped)
+        local_pdf_paths = list(local_pdf_paths or []) + pdf_store().downloaded_paths()
+    docs = iter_sources(urls, pdf_urls, local_pdf_paths, stats=stats, timer=timer)
+    if dry_run:
+        ingest(vs, docs, None, stats=stats, timer=timer)
+        return vs
+
+    checkpoint = EmbeddingCheckpoint(embed_model=embed_model_id(embeddings))
+    if resume:
+        checkpoint.load()
+    else:
+        checkpoint.clear()
+    vs = ingest(vs, docs, embeddings, checkpoint=checkpoint, stats=stats, timer=timer)
+    if vs is None:
+        raise ValueError("No chunks to index — check URLS / PDF paths")
+    with timer.span("faiss_save") as sp:
+        sp.items = int(vs.index.ntotal)
+        save_store(vs)
+    checkpoint.clear()
     return vs
@@ -0,0 +1,70 @@
+"""Token-bucket rate limiting for background jobs.
+
+    limiter = RateLimiter(rate=20)      # 20 units/s, bursts up to 20
+    limiter.acquire(len(batch))         # blocks until the batch fits the budget
+
+    per_host = HostRateLimiter(rate=2)  # one bucket per hostname
+    per_host.acquire("https://www.edmonton.ca/page")
+
+acquire() may take more than `burst` units at once: the bucket goes into debt
+and later callers wait it off, so the long-run average stays at `rate`.
+rate <= 0 disables limiting.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else max(1.0, self.rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: float = 1.0) -> float:
+        """Take n units, sleeping as needed; returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= n
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostRateLimiter:
+    """Independent RateLimiter per host, so a slow host never throttles the others."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, overrides: Optional[Dict[str, float]] = None):
+        self.rate = float(rate)
+        self.burst = burst
+        self.overrides = dict(overrides or {})
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url_or_host: str) -> str:
+        return (urlparse(url_or_host).hostname or url_or_host).lower()
+
+    def limiter(self, url_or_host: str) -> RateLimiter:
+        host = self.host(url_or_host)
+        with self._lock:
+            lim = self._limiters.get(host)
+            if lim is None:
+                lim = self._limiters[host] = RateLimiter(self.overrides.get(host, self.rate), self.burst)
+            return lim
+
+    def acquire(self, url_or_host: str, n: float = 1.0) -> float:
+        return self.limiter(url_or_host).acquire(n)
+
+
+__all__ = ["HostRateLimiter", "RateLimiter"]
@@ -0,0 +1,103 @@
+"""Persistent cache of web search results for jobs/search_first.py.
+
+Entries are keyed by (query, k) and stored as JSON next to
+logs/search_first_results.json:
+
+    {"version": 1, "entries": {"<k>\\t<query>": {"query", "k", "urls", "fetched_at"}}}
+
+    cache = SearchCache(LOGS_DIR / "search_cache.json", ttl_s=7 * 86400)
+    search = cache.wrap(ddg)          # same signature: search(query, k=...)
+    urls = search("backyard housing", k=25)
+    cache.save()
+
+Empty result lists are not cached (ddg() returns [] on errors too), so a
+failed query is retried on the next run.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_age(value: str) -> float:
+    """'90' / '90s' / '30m' / '12h' / '3d' / '1w' -> seconds."""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*", str(value).lower())
+    if not m:
+        raise ValueError(f"invalid age {value!r}; use e.g. 90s, 30m, 12h, 3d")
+    return float(m.group(1)) * _UNITS[m.group(2) or "s"]
+
+
+class SearchCache:
+    def __init__(self, path, ttl_s: float):
+        self.path = Path(path)
+        self.ttl_s = float(ttl_s)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._entries = json.load(f).get("entries", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"[warn] search cache unreadable, starting empty: {self.path} -> {e}")
+
+    @staticmethod
+    def _key(query: str, k: int) -> str:
+        return f"{int(k)}\t{query}"
+
+    def get(self, query: str, k: int, max_age_s: Optional[float] = None) -> Optional[List[str]]:
+        """Cached URLs if younger than max_age_s (default: the TTL), else None."""
+        max_age = self.ttl_s if max_age_s is None else max_age_s
+        with self._lock:
+            entry = self._entries.get(self._key(query, k))
+            if entry is not None and time.time() - entry["fetched_at"] <= max_age:
+                self.hits += 1
+                return list(entry["urls"])
+            self.misses += 1
+            return None
+
+    def put(self, query: str, k: int, urls: List[str]) -> None:
+        if not urls:
+            return
+        with self._lock:
+            self._entries[self._key(query, k)] = {"query": query, "k": int(k), "urls": list(urls), "fetched_at": time.time()}
+
+    def wrap(self, search_fn: Callable[..., List[str]], max_age_s: Optional[float] = None) -> Callable[..., List[str]]:
+        """search_fn(query, k=...) that answers from the cache and stores fresh results."""
+        def _search(query: str, k: int = 20) -> List[str]:
+            urls = self.get(query, k, max_age_s)
+            if urls is None:
+                urls = search_fn(query, k=k)
+                self.put(query, k, urls)
+            return urls
+        return _search
+
+    def save(self) -> None:
+        """Write the cache atomically, dropping entries past the TTL."""
+        now = time.time()
+        with self._lock:
+            entries = {key: e for key, e in self._entries.items() if now - e["fetched_at"] <= self.ttl_s}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "entries": entries}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+__all__ = ["SearchCache", "parse_age"]
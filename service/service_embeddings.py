@@ -0,0 +1,94 @@
+"""LangChain Embeddings backed by the local embedding service (service/embedding_gen_service.py).
+
+Large inputs are split into batches of `batch_size` texts which are sent
+concurrently (`max_workers` requests in flight) over one keep-alive session
+whose connection pool matches the worker count. Responses use the raw binary
+format (service/embedding_codec.py) and fall back to JSON if the server
+answers with JSON.
+
+    from service.service_embeddings import EmbeddingServiceEmbeddings
+    emb = EmbeddingServiceEmbeddings()            # EMBED_SERVICE_URL
+    vectors = emb.embed_documents(texts)
+    q = emb.embed_query("Can I build a garden suite?")
+
+Selected for the index with EMBED_PROVIDER = "service" in config.py (see rag_store.make_embeddings).
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Sequence
+
+import numpy as np
+import requests
+from langchain_core.embeddings import Embeddings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import EMBED_SERVICE_BATCH_SIZE, EMBED_SERVICE_URL, EMBED_SERVICE_WORKERS
+from service.embedding_client import EmbeddingClient
+
+
+def pooled_session(pool_size: int, retries: int = 3) -> requests.Session:
+    """Keep-alive session with pool_size connections per host; retries connection errors and 502/503/504."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=None,  # /embed is a POST but idempotent
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class EmbeddingServiceEmbeddings(Embeddings):
+    def __init__(
+        self,
+        base_url: str = EMBED_SERVICE_URL,
+        batch_size: int = EMBED_SERVICE_BATCH_SIZE,
+        max_workers: int = EMBED_SERVICE_WORKERS,
+        fmt: str = "raw",
+        timeout: float = 120.0,
+    ):
+        self.batch_size = max(1, int(batch_size))
+        self.max_workers = max(1, int(max_workers))
+        self.client = EmbeddingClient(base_url, fmt=fmt, session=pooled_session(self.max_workers), timeout=timeout)
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="embed-client")
+        self._model_name = None
+
+    def model_name(self):
+        """Model path reported by the service's GET /config (None if unreachable)."""
+        if self._model_name is None:
+            try:
+                r = self.client.session.get(f"{self.client.base_url}/config", timeout=10)
+                r.raise_for_status()
+                self._model_name = r.json().get("model_path")
+            except Exception:
+                return None
+        return self._model_name
+
+    def embed_array(self, texts: Sequence[str], embedding_type: str = "documents") -> np.ndarray:
+        """(len(texts), dim) float32 array; batches are requested concurrently and kept in input order."""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self.client.embed(batches[0], embedding_type)
+        parts = list(self._pool.map(lambda b: self.client.embed(b, embedding_type), batches))
+        return np.vstack(parts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts, "documents").tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text], "query")[0].tolist()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+        self.client.session.close()
+
+
+__all__ = ["EmbeddingServiceEmbeddings", "pooled_session"]
@@ -0,0 +1,225 @@
+"""Term mining for jobs/search_first.py --mine.
+
+    miner = TermMiner(glossary_terms)
+    counts = miner.mine_html(html)                       # Counter({"rear lane": 3, "Garden Suite": 2, ...})
+    per_page, totals, doc_freq = mine_pages([(url, html), ...])   # process pool for many pages
+
+Two kinds of terms are counted per page:
+
+- glossary terms: literal phrases, matched case-insensitively in a single pass
+  (pyahocorasick automaton if installed, otherwise one precompiled alternation).
+  All-caps codes such as zone names ("RSM") must match case-sensitively.
+- capitalized phrases: runs of Capitalized Words; every bigram and trigram in
+  a run is counted. This pattern is case-sensitive on purpose.
+
+HTML is reduced to text with selectolax or lxml when available, falling back
+to BeautifulSoup's html.parser.
+"""
+from __future__ import annotations
+
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Lane / pathway / vehicle-access phrases found in bylaw and guide pages
+ACCESS_TERMS = ("abutting lane", "rear lane", "back lane", "pathway", "vehicle access")
+
+_CAPITALIZED_RUN = re.compile(r"\b[A-Z][a-z]+(?: [A-Z][a-z]+)+\b")
+_WS = re.compile(r"\s+")
+
+try:
+    import ahocorasick  # pyahocorasick, optional
+except ImportError:
+    ahocorasick = None
+
+
+# ---------- HTML -> text ----------
+def _text_selectolax(html: str) -> str:
+    from selectolax.parser import HTMLParser
+    tree = HTMLParser(html)
+    for node in tree.css("script, style, noscript"):
+        node.decompose()
+    root = tree.body or tree.root
+    return root.text(separator=" ") if root is not None else ""
+
+
+def _text_lxml(html: str) -> str:
+    import lxml.html
+    doc = lxml.html.fromstring(html)
+    for node in doc.xpath("//script|//style|//noscript"):
+        node.drop_tree()
+    return " ".join(doc.itertext())
+
+
+def _text_bs4(html: str) -> str:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    for node in soup(["script", "style", "noscript"]):
+        node.decompose()
+    return soup.get_text(" ", strip=True)
+
+
+def _pick_parser():
+    for mod, fn in (("selectolax.parser", _text_selectolax), ("lxml.html", _text_lxml)):
+        try:
+            __import__(mod)
+            return fn
+        except ImportError:
+            continue
+    return _text_bs4
+
+
+_html_text = _pick_parser()
+
+
+def html_to_text(html: str) -> str:
+    if not html or not html.strip():
+        return ""
+    try:
+        text = _html_text(html)
+    except Exception:
+        text = _text_bs4(html)
+    return _WS.sub(" ", text).strip()
+
+
+# ---------- matching ----------
+def _clean_term(term: str) -> str:
+    return _WS.sub(" ", term.replace('"', "")).strip()
+
+
+class TermMiner:
+    def __init__(self, terms: Iterable[str] = ACCESS_TERMS, capitalized: bool = True):
+        cleaned = {_clean_term(t) for t in terms if _clean_term(t)}
+        self.case_sensitive = sorted(t for t in cleaned if t.isupper())
+        self.case_insensitive = sorted({t.lower() for t in cleaned if not t.isupper()})
+        self.capitalized = capitalized
+        self._automaton = None
+        self._pattern = None
+        if ahocorasick is not None and (self.case_sensitive or self.case_insensitive):
+            A = ahocorasick.Automaton()
+            for t in self.case_insensitive:
+                A.add_word(t, (t, False))
+            for t in self.case_sensitive:
+                A.add_word(t.lower(), (t, True))
+            A.make_automaton()
+            self._automaton = A
+        if self.case_sensitive or self.case_insensitive:
+            # also the fallback for texts whose lower() changes length (offsets would not line up)
+            # one pass: longest alternatives first so "rear lane" wins over "lane"
+            alt = lambda ts: "|".join(re.escape(t) for t in sorted(ts, key=len, reverse=True))
+            parts = []
+            if self.case_sensitive:
+                parts.append(rf"\b(?P<cs>{alt(self.case_sensitive)})\b")
+            if self.case_insensitive:
+                parts.append(rf"(?i:\b(?P<ci>{alt(self.case_insensitive)})\b)")
+            self._pattern = re.compile("|".join(parts))
+
+    def _glossary(self, text: str, counts: Counter) -> None:
+        lower = text.lower() if self._automaton is not None else None
+        if lower is not None and len(lower) == len(text):
+            n = len(text)
+            hits = []
+            for end, (term, case_sensitive) in self._automaton.iter(lower):
+                start = end - len(term) + 1
+                # word boundaries, as \b would enforce
+                if (start > 0 and lower[start - 1].isalnum()) or (end + 1 < n and lower[end + 1].isalnum()):
+                    continue
+                if case_sensitive and text[start:end + 1] != term:
+                    continue
+                hits.append((start, -len(term), term))
+            # leftmost-longest, non-overlapping: same result as the regex alternation
+            pos = 0
+            for start, neg_len, term in sorted(hits):
+                if start >= pos:
+                    counts[term] += 1
+                    pos = start - neg_len
+        elif self._pattern is not None:
+            for m in self._pattern.finditer(text):
+                counts[m.group("cs") if m.lastgroup == "cs" else m.group(0).lower()] += 1
+
+    def _phrases(self, text: str, counts: Counter) -> None:
+        for m in _CAPITALIZED_RUN.finditer(text):
+            words = m.group(0).split(" ")
+            for n in (2, 3):
+                for i in range(len(words) - n + 1):
+                    counts[" ".join(words[i:i + n])] += 1
+
+    def mine_text(self, text: str) -> Counter:
+        counts: Counter = Counter()
+        self._glossary(text, counts)
+        if self.capitalized:
+            self._phrases(text, counts)
+        return counts
+
+    def mine_html(self, html: str) -> Counter:
+        return self.mine_text(html_to_text(html))
+
+
+# ---------- process pool ----------
+_worker_miner: Optional[TermMiner] = None
+
+
+def _init_worker(terms: Sequence[str]) -> None:
+    global _worker_miner
+    _worker_miner = TermMiner(terms)
+
+
+def _mine_one(html: str) -> Counter:
+    return _worker_miner.mine_html(html)
+
+
+def make_pool(terms: Sequence[str] = ACCESS_TERMS, processes: Optional[int] = None) -> ProcessPoolExecutor:
+    """Process pool whose workers each hold a compiled TermMiner; submit(mine_html_in_pool, html)."""
+    return ProcessPoolExecutor(max_workers=processes or os.cpu_count() or 1, initializer=_init_worker, initargs=(list(terms),))
+
+
+mine_html_in_pool = _mine_one
+
+
+def mine_pages(
+    pages: Sequence[Tuple[str, str]],
+    terms: Sequence[str] = ACCESS_TERMS,
+    processes: Optional[int] = None,
+) -> Tuple[Dict[str, Counter], Counter, Counter]:
+    """Mine (url, html) pages; returns (per-page counts, total counts, number of pages containing each term).
+
+    processes=0 (or fewer than 4 pages) mines in this process.
+    """
+    pages = list(pages)
+    if processes == 0 or len(pages) < 4:
+        miner = TermMiner(terms)
+        results = [miner.mine_html(html) for _, html in pages]
+    else:
+        with make_pool(terms, processes) as pool:
+            results = list(pool.map(_mine_one, [html for _, html in pages], chunksize=max(1, len(pages) // 32)))
+    per_page = {url: counts for (url, _), counts in zip(pages, results)}
+    totals, doc_freq = aggregate(per_page.values())
+    return per_page, totals, doc_freq
+
+
+def aggregate(counters: Iterable[Counter]) -> Tuple[Counter, Counter]:
+    totals: Counter = Counter()
+    doc_freq: Counter = Counter()
+    for c in counters:
+        totals.update(c)
+        doc_freq.update(c.keys())
+    return totals, doc_freq
+
+
+def top_terms(counts: Counter, n: int = 100) -> List[str]:
+    """Most frequent terms (ties alphabetical)."""
+    return [t for t, _ in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:n]]
+
+
+__all__ = [
+    "ACCESS_TERMS",
+    "TermMiner",
+    "aggregate",
+    "html_to_text",
+    "make_pool",
+    "mine_html_in_pool",
+    "mine_pages",
+    "top_terms",
+]
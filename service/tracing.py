@@ -0,0 +1,328 @@
+"""Per-question latency tracing for the QA path (main.py, answer_modes, qa_chain, lcel_qa_chain).
+
+    with trace_question(q, mode="rag") as tr:
+        with span("normalize"):
+            q_norm = normalize_question(q)
+        out = qa.invoke({"query": q_norm}, config={"callbacks": callbacks()})
+    print(latency_report())        # p50 / p95 / p99 per stage over this process's questions
+
+Spans:
+
+- explicit: span("normalize"), span("refresh"), and inside the retrievers
+  span("embed_query"), span("faiss_search"), span("rescore") (two-stage only).
+  span() is a no-op outside trace_question, so library code can always call it.
+- from LangChain callbacks (callbacks()): "retrieve" (retriever run), "llm"
+  (model call), "ttft" (llm start -> first streamed token), "generation"
+  (first token -> end) and "prompt_assembly" (retriever end -> llm start).
+
+Every finished question is written as one JSON line to logs/traces.jsonl
+(logging_helper.get_json_logger) and, when TRACE_EXPORT_PATH is set, as
+OTLP/JSON ({"resourceSpans": ...}, one trace per line) that an OpenTelemetry
+collector's file receiver or otel-desktop-viewer can import. No OpenTelemetry
+package is needed.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import TRACE_ENABLED, TRACE_EXPORT_PATH
+from service.instrumentation import percentiles
+from service.logging_helper import get_json_logger
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "yeg-backyard-rag"
+# stages in pipeline order, for reports
+STAGES = (
+    "normalize", "retrieve", "embed_query", "faiss_search", "rescore", "prompt_assembly",
+    "ttft", "generation", "llm", "qa", "refresh", "total",
+)
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attrs", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], start_ns: Optional[int] = None, **attrs):
+        self.name = name
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attrs: Dict[str, Any] = attrs
+        self.error: Optional[str] = None
+
+    @property
+    def ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class Trace:
+    def __init__(self, question: str, mode: str, **attrs):
+        self.trace_id = _new_id(16)
+        self.root = Span("total", None, question=question, mode=mode, **attrs)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def record(self, name: str, start_ns: int, end_ns: int, parent_id: Optional[str] = None, **attrs) -> Span:
+        # callbacks fire in the caller's context, so the enclosing span() (e.g. "qa") becomes the parent
+        sp = Span(name, parent_id or _parent.get() or self.root.span_id, start_ns, **attrs)
+        sp.end_ns = end_ns
+        self.add(sp)
+        return sp
+
+    def durations(self) -> Dict[str, float]:
+        """Total milliseconds per span name (repeated stages, e.g. a retried qa call, are summed)."""
+        out: Dict[str, float] = {}
+        for sp in self.spans + [self.root]:
+            out[sp.name] = round(out.get(sp.name, 0.0) + sp.ms, 2)
+        return out
+
+    def callbacks(self) -> List[BaseCallbackHandler]:
+        return [TracingCallbackHandler(self)]
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("qa_trace", default=None)
+_parent: ContextVar[Optional[str]] = ContextVar("qa_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """Time a block as a child of the current span; does nothing outside trace_question()."""
+    tr = _trace.get()
+    if tr is None:
+        yield None
+        return
+    sp = Span(name, _parent.get() or tr.root.span_id, **attrs)
+    token = _parent.set(sp.span_id)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _parent.reset(token)
+        sp.end_ns = time.time_ns()
+        tr.add(sp)
+
+
+def callbacks() -> List[BaseCallbackHandler]:
+    """LangChain callback handlers for the current trace (pass as config={"callbacks": callbacks()})."""
+    tr = _trace.get()
+    return tr.callbacks() if tr is not None else []
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain retriever / LLM callbacks into spans of one Trace."""
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self._starts: Dict[UUID, int] = {}
+        self._first_token: Dict[UUID, int] = {}
+        self._tokens: Dict[UUID, int] = {}
+        self._last_retriever_end: Optional[int] = None
+
+    # retriever
+    def on_retriever_start(self, serialized, query, *, run_id: UUID, **kwargs) -> None:
+        self._starts[run_id] = time.time_ns()
+
+    def on_retriever_end(self, documents, *, run_id: UUID, **kwargs) -> None:
+        start = self._starts.pop(run_id, None)
+        if start is None:
+            return
+        end = time.time_ns()
+        self.trace.record("retrieve", start, end, docs=len(documents))
+        self._last_retriever_end = end
+
+    def on_retriever_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            self.trace.record("retrieve", start, time.time_ns(), error=str(error))
+
+    # llm
+    def _llm_start(self, run_id: UUID) -> None:
+        now = time.time_ns()
+        self._starts[run_id] = now
+        if self._last_retriever_end is not None:
+            self.trace.record("prompt_assembly", self._last_retriever_end, now)
+            self._last_retriever_end = None
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs) -> None:
+        self._llm_start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self._llm_start(run_id)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs) -> None:
+        self._first_token.setdefault(run_id, time.time_ns())
+        self._tokens[run_id] = self._tokens.get(run_id, 0) + 1
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        start = self._starts.pop(run_id, None)
+        if start is None:
+            return
+        end = time.time_ns()
+        first = self._first_token.pop(run_id, None)
+        tokens = self._tokens.pop(run_id, 0)
+        self.trace.record("llm", start, end, streamed_tokens=tokens)
+        if first is not None:
+            self.trace.record("ttft", start, first)
+            self.trace.record("generation", first, end, streamed_tokens=tokens)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            self.trace.record("llm", start, time.time_ns(), error=str(error))
+
+
+# ---------- aggregation + export ----------
+class LatencyStats:
+    """Per-stage millisecond samples across questions, for p50 / p95 / p99."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = {}
+
+    def add(self, durations: Dict[str, float]) -> None:
+        with self._lock:
+            for name, ms in durations.items():
+                self._samples.setdefault(name, []).append(ms)
+
+    def report(self) -> Dict[str, dict]:
+        with self._lock:
+            samples = {k: list(v) for k, v in self._samples.items()}
+        order = {name: i for i, name in enumerate(STAGES)}
+        return {
+            name: percentiles(samples[name], qs=(50, 95, 99))
+            for name in sorted(samples, key=lambda n: (order.get(n, len(order)), n))
+        }
+
+
+STATS = LatencyStats()
+_trace_log = None
+_export_lock = threading.Lock()
+
+
+def _otlp_value(v) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def to_otlp(tr: Trace) -> dict:
+    """The trace in OTLP/JSON (ExportTraceServiceRequest) form."""
+    spans = []
+    for sp in [tr.root] + tr.spans:
+        item = {
+            "traceId": tr.trace_id,
+            "spanId": sp.span_id,
+            "name": sp.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(sp.start_ns),
+            "endTimeUnixNano": str(sp.end_ns or sp.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in sp.attrs.items()],
+            "status": {"code": 2, "message": sp.error} if sp.error else {"code": 1},
+        }
+        if sp.parent_id:
+            item["parentSpanId"] = sp.parent_id
+        spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+
+def _finish(tr: Trace) -> None:
+    global _trace_log
+    durations = tr.durations()
+    STATS.add(durations)
+    if _trace_log is None:
+        _trace_log = get_json_logger("traces")
+    _trace_log.info({
+        "event": "qa_trace",
+        "trace_id": tr.trace_id,
+        "mode": tr.root.attrs.get("mode"),
+        "question": tr.root.attrs.get("question"),
+        "error": tr.root.error,
+        "ms": durations,
+    })
+    logger.info("trace %s: %s", tr.trace_id[:8], " ".join(f"{k}={v:.0f}ms" for k, v in durations.items()))
+    if TRACE_EXPORT_PATH:
+        line = json.dumps(to_otlp(tr))
+        with _export_lock, open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def trace_question(question: str, mode: str, **attrs) -> Iterator[Optional[Trace]]:
+    """Trace one question end to end (the root span is "total")."""
+    if not TRACE_ENABLED:
+        yield None
+        return
+    tr = Trace(question, mode, **attrs)
+    t_token, p_token = _trace.set(tr), _parent.set(tr.root.span_id)
+    try:
+        yield tr
+    except BaseException as e:
+        tr.root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _trace.reset(t_token)
+        _parent.reset(p_token)
+        tr.root.end_ns = time.time_ns()
+        try:
+            _finish(tr)
+        except Exception as e:
+            logger.warning("tracing: could not record trace: %s", e)
+
+
+def latency_report(stats: LatencyStats = STATS) -> str:
+    """Table of count / p50 / p95 / p99 (ms) per stage."""
+    rows = stats.report()
+    if not rows:
+        return "no traced questions"
+    lines = [f"{'stage':<16} {'n':>4} {'p50':>9} {'p95':>9} {'p99':>9}"]
+    for name, p in rows.items():
+        lines.append(f"{name:<16} {p['count']:>4} {p['p50']:>9.1f} {p['p95']:>9.1f} {p['p99']:>9.1f}")
+    return "\n".join(lines)
+
+
+__all__ = [
+    "STATS",
+    "LatencyStats",
+    "Trace",
+    "TracingCallbackHandler",
+    "callbacks",
+    "current_trace",
+    "latency_report",
+    "span",
+    "to_otlp",
+    "trace_question",
+]
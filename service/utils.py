@@ -15,10 +15,15 @@ def _unique_sources(source_documents) -> List[Tuple[str, str]]:
     for d in source_documents or []:
         src = d.metadata.get("source") or d.metadata.get("url") or "unknown"
         page = d.metadata.get("page") or d.metadata.get("pdf_page") or None
-        key = (src, page)
-        if src and key not in seen:
-            ordered.append(key)
-            seen.add(key)
+        # near-duplicate chunks dropped at ingest keep their citations here (see service/dedup.py)
+        refs = [(src, page)] + [
+            (r.get("source") or "unknown", r.get("page") or None)
+            for r in d.metadata.get("duplicate_sources") or []
+        ]
+        for key in refs:
+            if key[0] and key not in seen:
+                ordered.append(key)
+                seen.add(key)
     return ordered
 
 def format_citations(source_documents) -> str:
@@ -48,49 +53,18 @@ def is_allowed_websites(url: str) -> bool:
     except Exception:
         return not ALLOWED
 
-def download_pdf(url: str, out_dir: str | None = None, filename: str | None = None, timeout: int = 30) -> str | None:
+def fetch_pdf(url: str, out_dir: str | None = None, filename: str | None = None, timeout: int = 30) -> tuple[str | None, bool]:
     r"""
-    Download a PDF to data\raw\ (Windows-friendly).
-    - Auto-creates the folder
-    - Derives a safe filename from the URL (or use `filename`)
-    - Warns if response doesn't look like a PDF
-    - De-duplicates by appending _1, _2, ...
+    Download a PDF into the content-addressed store under data\raw\ (see service/pdf_store.py).
+    - Streams to disk while hashing (sha256)
+    - Identical bytes already stored -> nothing written, existing path returned
+    - Unchanged URL (ETag / Last-Modified) -> 304, nothing transferred
 
-    Returns: absolute file path as string or None if failed
+    Returns: (absolute file path or None if failed, True if the content is new)
     """
-    if out_dir is None:
-        out_dir = "data/raw"
-    Path(out_dir).mkdir(parents=True, exist_ok=True)
-
-    try:
-        # derive filename
-        if not filename:
-            name = os.path.basename(urlparse(url).path) or "download.pdf"
-            if not name.lower().endswith(".pdf"):
-                name = (name or "download") + ".pdf"
-            name = re.sub(r"[^A-Za-z0-9._-]+", "_", name)  # sanitize
-        else:
-            name = filename if filename.lower().endswith(".pdf") else filename + ".pdf"
+    from service.pdf_store import pdf_store
+    return pdf_store(out_dir).fetch(url, timeout=timeout, name=filename)
 
-        dest = Path(out_dir) / name
-        base, ext = os.path.splitext(dest.name)
-        i = 1
-        while dest.exists():
-            dest = dest.with_name(f"{base}_{i}{ext}")
-            i += 1
-
-        headers = {"User-Agent": os.getenv("USER_AGENT", "YEGGardenSuite-RAG/1.0")}
-        with requests.get(url, headers=headers, stream=True, timeout=timeout) as r:
-            r.raise_for_status()
-            ct = r.headers.get("Content-Type", "")
-            if ("pdf" not in ct.lower()) and (not PDF_URL_RE.search(url.lower())):
-                print(f"[warn] Response may not be a PDF (Content-Type: {ct})")
-            with open(dest, "wb") as f:
-                for chunk in r.iter_content(chunk_size=65536):
-                    if chunk:
-                        f.write(chunk)
-
-        return str(dest.resolve())
-    except Exception as e:
-        print(f"[error] Failed to download PDF from {url}: {e}")
-        return None
+def download_pdf(url: str, out_dir: str | None = None, filename: str | None = None, timeout: int = 30) -> str | None:
+    """fetch_pdf() without the is_new flag. Returns absolute file path as string or None if failed"""
+    return fetch_pdf(url, out_dir, filename, timeout)[0]